@@ -0,0 +1,57 @@
+import math
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from immulogger.authutils.authutils import create_access_token
+from immulogger.database.immudb import ImmudbConfirmer
+from immulogger.database.pool import ImmudbConfirmerPool
+from immulogger.database.userprovider import HardcodedUserProvider
+from immulogger.serviceprovider import getServiceProvider
+from immulogger.database.memorybackend import InMemoryStorage
+
+
+def memoryUrl() -> str:
+    # A fresh in-memory immudb for every call
+    return f"memory://bench-{uuid.uuid4()}"
+
+
+def createMemoryConfirmer() -> ImmudbConfirmer:
+    confirmer = ImmudbConfirmer(memoryUrl(), "immudb", "immudb", None)
+    with confirmer as client:
+        client.createTables()
+    return confirmer
+
+
+def createMemoryPool(size: int) -> Tuple[ImmudbConfirmerPool, InMemoryStorage]:
+    pool = ImmudbConfirmerPool(memoryUrl(), "immudb", "immudb", None, size)
+    with pool.session() as client:
+        client.createTables()
+    return pool, pool.sessions[0].client.storage
+
+
+def setupMemoryApp(poolSize: int = 4, latency: float = 0) -> InMemoryStorage:
+    # Points the application's service provider at an in-memory immudb shared by every pooled session
+    provider = getServiceProvider()
+    provider.immudbConfirmer, storage = createMemoryPool(poolSize)
+    provider.userProvider = HardcodedUserProvider()
+    provider.userProvider.populateDefaults()
+    provider.executor = ThreadPoolExecutor(max_workers = poolSize, thread_name_prefix = "immudb")
+    provider.stopIngestQueue()
+    provider.startIngestQueue()
+    provider.startGroupCommitter()
+    storage.latency = latency
+    return storage
+
+
+def authorizationHeaders(scopes: List[str]) -> dict:
+    token = create_access_token(data = {"sub": "admin", "scopes": scopes})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def percentile(values: List[float], percent: float) -> float:
+    if(len(values) == 0):
+        return 0
+    ordered = sorted(values)
+    index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
@@ -0,0 +1,89 @@
+import asyncio
+import json
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlencode
+
+
+class AsgiResponse:
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in headers}
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class AsgiClient:
+    """Calls an ASGI app in process, so benchmarks measure the app and not a network stack."""
+
+    def __init__(self, app, headers: Optional[Dict[str, str]] = None):
+        self.app = app
+        self.headers = dict(headers) if headers else dict()
+
+    async def request(self, method: str, path: str, params = None, json_body = None, body: Union[bytes, Iterable[bytes]] = b"", headers: Optional[Dict[str, str]] = None) -> AsgiResponse:
+        allHeaders = dict(self.headers)
+        if(headers):
+            allHeaders.update(headers)
+        if(json_body is not None):
+            body = json.dumps(json_body).encode("utf-8")
+            allHeaders["content-type"] = "application/json"
+        # An iterable body is sent piece by piece like a chunked upload
+        if(type(body) == bytes):
+            allHeaders["content-length"] = str(len(body))
+            pieces = iter([body])
+        else:
+            pieces = iter(body)
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode("utf-8"),
+            "root_path": "",
+            "query_string": urlencode(params or {}, doseq = True).encode("utf-8"),
+            "headers": [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in allHeaders.items()] + [(b"host", b"benchmark")],
+            "client": ("127.0.0.1", 1),
+            "server": ("benchmark", 80),
+        }
+        bodySent = False
+        nextPiece = next(pieces, b"")
+        disconnected = asyncio.Event()
+        status = 0
+        responseHeaders = []
+        chunks = []
+
+        async def receive():
+            nonlocal bodySent, nextPiece
+            if(not bodySent):
+                piece = nextPiece
+                nextPiece = next(pieces, None)
+                bodySent = nextPiece is None
+                return {"type": "http.request", "body": piece, "more_body": not bodySent}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status, responseHeaders
+            if(message["type"] == "http.response.start"):
+                status = message["status"]
+                responseHeaders = message.get("headers", [])
+            elif(message["type"] == "http.response.body"):
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            disconnected.set()
+        return AsgiResponse(status, responseHeaders, b"".join(chunks))
+
+    async def get(self, path: str, params = None, **kwargs) -> AsgiResponse:
+        return await self.request("GET", path, params = params, **kwargs)
+
+    async def put(self, path: str, json_body = None, **kwargs) -> AsgiResponse:
+        return await self.request("PUT", path, json_body = json_body, **kwargs)
+
+    async def post(self, path: str, json_body = None, **kwargs) -> AsgiResponse:
+        return await self.request("POST", path, json_body = json_body, **kwargs)
@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import time
+
+from immulogger.database.asyncconfirmer import AsyncImmudbConfirmer
+from immulogger.main import app
+from . import authorizationHeaders, percentile, setupMemoryApp
+from .asgiclient import AsgiClient
+
+
+async def _runInline(self, function, *args, **kwargs):
+    # Previous behaviour: blocking immudb calls made directly on the event loop
+    return function(*args, **kwargs)
+
+
+async def send(client: AsgiClient, index: int, scheduledAt: float, latencies: dict):
+    if(index % 2 == 0):
+        response = await client.put("/api/v1/log/create", {"logContent": f"log {index}", "tags": ["bench"]})
+        kind = "write"
+    else:
+        response = await client.get("/api/v1/log/get", {"limit": 10, "tags": ["bench"]})
+        kind = "read"
+    assert response.status == 200, response.body
+    # Measured from the moment the request was due, so time spent waiting for a stalled loop counts
+    latencies[kind].append(time.perf_counter() - scheduledAt)
+
+
+async def runLoad(rate: float, total: int):
+    client = AsgiClient(app, authorizationHeaders(["SEND_LOGS", "READ_LOGS"]))
+    latencies = {"write": [], "read": []}
+    started = time.perf_counter()
+    tasks = []
+    for index in range(0, total):
+        scheduledAt = started + index / rate
+        delay = scheduledAt - time.perf_counter()
+        if(delay > 0):
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(client, index, scheduledAt, latencies)))
+    await asyncio.gather(*tasks)
+    return latencies, time.perf_counter() - started
+
+
+def report(mode: str, latencies: dict, elapsed: float):
+    allLatencies = latencies["write"] + latencies["read"]
+    print(f"{mode:<9} requests={len(allLatencies):>5} throughput={len(allLatencies) / elapsed:>7.1f}/s "
+          f"p50={percentile(allLatencies, 50) * 1000:>8.1f}ms p95={percentile(allLatencies, 95) * 1000:>8.1f}ms "
+          f"p99={percentile(allLatencies, 99) * 1000:>8.1f}ms "
+          f"(write p99={percentile(latencies['write'], 99) * 1000:.1f}ms read p99={percentile(latencies['read'], 99) * 1000:.1f}ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Open-loop mixed read/write load against the app with a backend immudb")
+    parser.add_argument("--rate", type = float, default = 250, help = "requests per second offered")
+    parser.add_argument("--requests", type = int, default = 1000)
+    parser.add_argument("--pool", type = int, default = 8)
+    parser.add_argument("--latency", type = float, default = 0.002, help = "simulated immudb round trip in seconds")
+    args = parser.parse_args()
+
+    offLoopRun = AsyncImmudbConfirmer.run
+    for mode in ["blocking", "executor"]:
+        setupMemoryApp(args.pool, args.latency)
+        AsyncImmudbConfirmer.run = _runInline if mode == "blocking" else offLoopRun
+        latencies, elapsed = asyncio.run(runLoad(args.rate, args.requests))
+        report(mode, latencies, elapsed)
+    AsyncImmudbConfirmer.run = offLoopRun
+
+
+if __name__ == "__main__":
+    main()
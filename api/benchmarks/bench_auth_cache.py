@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import time
+
+from immulogger.authutils.authutils import token_cache
+from immulogger.database.userprovider import CachedUserProvider, ImmudbUserProvider
+from immulogger.main import app
+from immulogger.serviceprovider import getServiceProvider
+from . import authorizationHeaders, setupMemoryApp
+from .asgiclient import AsgiClient
+
+
+async def runRequests(clients: int, requestsPerClient: int):
+    client = AsgiClient(app, authorizationHeaders(["READ_LOGS"]))
+
+    async def produce():
+        for index in range(0, requestsPerClient):
+            response = await client.get("/api/v1/log/count")
+            assert response.status == 200, response.body
+
+    started = time.perf_counter()
+    await asyncio.gather(*[produce() for _ in range(0, clients)])
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Authenticated requests with and without the user cache in front of immudb")
+    parser.add_argument("--clients", type = int, default = 16)
+    parser.add_argument("--requests", type = int, default = 50, help = "requests per client")
+    parser.add_argument("--latency", type = float, default = 0.002, help = "simulated immudb round trip in seconds")
+    args = parser.parse_args()
+
+    total = args.clients * args.requests
+    for label, cached in [("uncached", False), ("cached", True)]:
+        storage = setupMemoryApp(4, 0)
+        provider = getServiceProvider()
+        userProvider = ImmudbUserProvider(provider.immudbConfirmer)
+        userProvider.populateDefaults()
+        provider.userProvider = CachedUserProvider(userProvider) if cached else userProvider
+        storage.latency = args.latency
+        storage.calls.clear()
+        elapsed = asyncio.run(runRequests(args.clients, args.requests))
+        userLookups = storage.calls["verifiedGet"]
+        print(f"{label:<9} requests/s={total / elapsed:>7.0f} userLookups={userLookups:>5} immudbCalls={sum(storage.calls.values()):>5}")
+    print(f"token cache hits={token_cache.hits} misses={token_cache.misses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import time
+
+from immulogger.database.immudb import ImmudbConfirmer
+from immulogger.database.querybuilder import logsBatchTemplate
+
+
+class LegacyInsertBuilder:
+    # Previous InsertWithParamsQueryBuilder: every row is appended to one growing string
+    def __init__(self, table: str, *fields):
+        self.constructing = f"INSERT INTO {table} ({','.join(fields)})"
+        self.hasRows = False
+
+    def VALUES(self, index: int, *params):
+        paramList = ["@" + param + str(index) for param in params]
+        if(self.hasRows):
+            self.constructing = self.constructing + f", ({','.join(paramList)})"
+        else:
+            self.constructing = self.constructing + f" VALUES({','.join(paramList)})"
+        self.hasRows = True
+
+    def build(self):
+        return self.constructing + ";"
+
+
+def legacyPrepare(entries):
+    # Previous prepareLogEntries: string concatenation per row and a full parameter dict copy per tagged log
+    params = dict()
+    confirmations = dict()
+    logsInsert = LegacyInsertBuilder("LOGS", "log", "uniqueidentifier", "createdate")
+    tagsInsert = LegacyInsertBuilder("TAGS", "uniqueidentifier", "tag")
+    lastTagsIndex = 0
+    for index in range(0, len(entries)):
+        content, timeReceived, tags = entries[index]
+        identifier = ImmudbConfirmer.generateIdentifier(content)
+        params[f"log{index}"] = content
+        params[f"uniqueidentifier{index}"] = identifier
+        params[f"createdate{index}"] = timeReceived
+        logsInsert.VALUES(index, "log", "uniqueidentifier", "createdate")
+        confirmations[identifier.encode("utf-8")] = ImmudbConfirmer.makeSha256(content.encode("utf-8"))
+        if(len(tags) > 0):
+            additionalParams = dict()
+            for tagIndex, tag in enumerate(list(set(tags))):
+                additionalParams[f"tag{lastTagsIndex + tagIndex}"] = tag
+                additionalParams[f"taguniqueidentifier{lastTagsIndex + tagIndex}"] = identifier
+                tagsInsert.VALUES(lastTagsIndex + tagIndex, "taguniqueidentifier", "tag")
+            lastTagsIndex += len(set(tags))
+            params = {**params, **additionalParams}
+    queries = ["BEGIN TRANSACTION", logsInsert.build()]
+    if(lastTagsIndex > 0):
+        queries.append(tagsInsert.build())
+    queries.append("COMMIT")
+    return "\n".join(queries), params
+
+
+def cpuPerBatch(prepare, logs: int, tags, chunkSize: int, repeat: int) -> float:
+    entries = [(f"log {index}", 0, tags) for index in range(0, logs)]
+    started = time.process_time()
+    for _ in range(0, repeat):
+        for start in range(0, logs, chunkSize):
+            prepare(entries[start:start + chunkSize])
+    return (time.process_time() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "CPU time to build the SQL and parameters of a 10k-log batch, before and after the linear compiler")
+    parser.add_argument("--logs", type = int, default = 10000)
+    parser.add_argument("--repeat", type = int, default = 3)
+    args = parser.parse_args()
+
+    for tagCount in [0, 1, 4]:
+        tags = [f"tag{index}" for index in range(0, tagCount)]
+        # Chunks as processLogsRequest cuts them, then the whole batch in one statement to show the growth
+        for label, chunkSize in [("chunked", ImmudbConfirmer.chunkSize(tags)), ("one statement", args.logs)]:
+            legacy = cpuPerBatch(legacyPrepare, args.logs, tags, chunkSize, args.repeat)
+            logsBatchTemplate.cache_clear()
+            cold = cpuPerBatch(ImmudbConfirmer.prepareLogEntries, args.logs, tags, chunkSize, 1)
+            compiled = cpuPerBatch(ImmudbConfirmer.prepareLogEntries, args.logs, tags, chunkSize, args.repeat)
+            print(f"tags={tagCount} {label:<14} legacy={legacy * 1000:>8.1f}ms compiled cold={cold * 1000:>8.1f}ms cached={compiled * 1000:>8.1f}ms speedup={legacy / compiled:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import argparse
+import time
+
+from immulogger.routers.models.logmodel import AddLogsRequest
+from . import createMemoryPool
+
+
+def run(label: str, logsCount: int, tags, latency: float, parallelism: int):
+    pool, storage = createMemoryPool(max(1, parallelism))
+    pool.batchParallelism = max(1, parallelism)
+    storage.latency = latency
+    request = AddLogsRequest(logs = [f"log {index}" for index in range(0, logsCount)], tags = tags)
+    started = time.perf_counter()
+    if(parallelism == 0):
+        # Previous behaviour: chunks built and sent one after another on a single session
+        with pool.session() as client:
+            client.processLogsRequest(request)
+    else:
+        identifiers, failedChunks = pool.processLogsRequest(request)
+        assert failedChunks == []
+    elapsed = time.perf_counter() - started
+    print(f"{label:<16} logs={logsCount:>6} time={elapsed * 1000:>8.1f}ms logs/s={logsCount / elapsed:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "One /log/batchcreate request, sequential chunks versus the pipelined pool path")
+    parser.add_argument("--logs", type = int, default = 10240)
+    parser.add_argument("--latency", type = float, default = 0.005, help = "simulated immudb round trip in seconds")
+    args = parser.parse_args()
+
+    run("sequential", args.logs, ["a", "b", "c"], args.latency, 0)
+    for parallelism in [1, 2, 4]:
+        run(f"pipelined x{parallelism}", args.logs, ["a", "b", "c"], args.latency, parallelism)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import random
+import time
+
+from immulogger.database import logcodec
+from . import createMemoryConfirmer
+
+FRAMES = ["handlers/orders.py", "services/payment.py", "db/session.py", "clients/http.py", "workers/retry.py"]
+
+
+def stackTrace(rnd: random.Random, length: int) -> str:
+    # Verbose Python traceback with varying line numbers and ids, cut at length
+    lines = [f"ERROR request {rnd.randrange(10 ** 9):x} failed", "Traceback (most recent call last):"]
+    while(sum(len(line) + 1 for line in lines) < length):
+        frame = rnd.choice(FRAMES)
+        lines.append(f'  File "/srv/app/{frame}", line {rnd.randrange(1, 900)}, in {frame.split("/")[0]}_{rnd.randrange(40)}')
+        lines.append(f"    result = self.{frame.split('/')[1][0:-3]}.call(order_id={rnd.randrange(10 ** 6)}, retries={rnd.randrange(5)})")
+    lines.append("ConnectionRefusedError: [Errno 111] Connection refused")
+    return "\n".join(lines)[-length:]
+
+
+def run(mode: str, logs, chunkSize: int, reads: int, pageSize: int):
+    logcodec.compression = mode
+    confirmer = createMemoryConfirmer()
+    with confirmer as client:
+        started = time.perf_counter()
+        for start in range(0, len(logs), chunkSize):
+            client.processLogEntries([(content, 0, ["trace"]) for content in logs[start:start + chunkSize]])
+        writeTime = time.perf_counter() - started
+        stored = sum(len(row[0]) for row in client.client.sqlQuery("SELECT log FROM LOGS", {}))
+        results = dict()
+        for verify in [False, True]:
+            started = time.perf_counter()
+            for _ in range(0, reads):
+                client.getLastLogs(pageSize, verify)
+            results[verify] = reads * pageSize / (time.perf_counter() - started)
+    return len(logs) / writeTime, stored, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Write and read throughput of raw and zlib-compressed log storage")
+    parser.add_argument("--logs", type = int, default = 5000)
+    parser.add_argument("--size", type = int, default = 3500, help = "characters per log, raw storage needs at most 4096")
+    parser.add_argument("--chunk", type = int, default = 512)
+    parser.add_argument("--reads", type = int, default = 20)
+    parser.add_argument("--page", type = int, default = 100)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    logs = [stackTrace(rnd, args.size) for _ in range(0, args.logs)]
+    for mode in ["none", "zlib"]:
+        writes, stored, reads = run(mode, logs, args.chunk, args.reads, args.page)
+        print(f"{mode:<5} write={writes:>8.0f} logs/s stored={stored / len(logs):>6.0f} chars/log read={reads[False]:>8.0f} logs/s read+verify={reads[True]:>8.0f} logs/s")
+    # Logs only the compressed mode can store
+    rnd = random.Random(7)
+    largeLogs = [stackTrace(rnd, args.size * 4) for _ in range(0, args.logs // 4)]
+    fitting = sum(1 for content in largeLogs if logcodec.fitsStorage(content))
+    print(f"zlib  {fitting}/{len(largeLogs)} logs of {args.size * 4} characters fit in {logcodec.STORED_LOG_LENGTH}")
+
+
+if __name__ == "__main__":
+    main()
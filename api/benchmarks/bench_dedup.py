@@ -0,0 +1,51 @@
+import argparse
+import random
+import time
+
+from immulogger.database import logcodec
+from . import createMemoryConfirmer
+
+
+def storedCharacters(client) -> int:
+    tables = [("LOGS", "SELECT log, uniqueidentifier FROM LOGS"), ("CONTENTS", "SELECT log, sha FROM CONTENTS")]
+    return sum(len(row[0]) + len(row[1]) for _, query in tables for row in client.client.sqlQuery(query, {}))
+
+
+def run(dedup: bool, logs, chunkSize: int, reads: int, pageSize: int):
+    logcodec.dedup = dedup
+    confirmer = createMemoryConfirmer()
+    with confirmer as client:
+        started = time.perf_counter()
+        for start in range(0, len(logs), chunkSize):
+            client.processLogEntries([(content, 0, []) for content in logs[start:start + chunkSize]])
+        writeTime = time.perf_counter() - started
+        contents = len(client.client.sqlQuery("SELECT sha FROM CONTENTS", {}))
+        started = time.perf_counter()
+        for _ in range(0, reads):
+            client.getLastLogs(pageSize, True)
+        readTime = time.perf_counter() - started
+        return len(logs) / writeTime, storedCharacters(client), contents, reads * pageSize / readTime
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Stored size and throughput of repetitive logs with and without LOG_DEDUP")
+    parser.add_argument("--logs", type = int, default = 20000)
+    parser.add_argument("--distinct", type = int, default = 50, help = "distinct health-check and retry lines")
+    parser.add_argument("--unique", type = float, default = 0.05, help = "share of logs that never repeat")
+    parser.add_argument("--chunk", type = int, default = 512)
+    parser.add_argument("--reads", type = int, default = 20)
+    parser.add_argument("--page", type = int, default = 100)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    # Health checks and retry loops repeat the same lines, the retries with their stack trace
+    repeated = [f"GET /health/{index} 200 upstream=payments-{index % 7} latency_budget=250ms" for index in range(0, args.distinct // 2)]
+    repeated.extend(f'retry {index % 3} of charge: ConnectionRefusedError: [Errno 111] Connection refused\n  File "/srv/app/clients/payments.py", line {100 + index}, in charge\n    response = self.session.post(self.url, json = payload, timeout = 2.5)\n  File "/srv/app/workers/retry.py", line 41, in run' for index in range(0, args.distinct - len(repeated)))
+    logs = [f"request {rnd.randrange(10 ** 12):x} failed: upstream timeout after 3 retries" if rnd.random() < args.unique else rnd.choice(repeated) for _ in range(0, args.logs)]
+    for dedup in [False, True]:
+        writes, stored, contents, reads = run(dedup, logs, args.chunk, args.reads, args.page)
+        print(f"dedup={str(dedup):<5} write={writes:>8.0f} logs/s stored={stored / len(logs):>6.1f} chars/log contents={contents:>6} read+verify={reads:>8.0f} logs/s")
+
+
+if __name__ == "__main__":
+    main()
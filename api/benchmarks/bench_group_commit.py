@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import time
+
+from immulogger.main import app
+from immulogger.serviceprovider import getServiceProvider
+from . import authorizationHeaders, setupMemoryApp
+from .asgiclient import AsgiClient
+
+
+async def runClients(clients: int, requestsPerClient: int):
+    client = AsgiClient(app, authorizationHeaders(["SEND_LOGS"]))
+
+    async def produce(clientIndex: int):
+        for index in range(0, requestsPerClient):
+            response = await client.put("/api/v1/log/create", {"logContent": f"log {clientIndex} {index}", "tags": ["bench"]})
+            assert response.status == 200, response.body
+
+    started = time.perf_counter()
+    await asyncio.gather(*[produce(clientIndex) for clientIndex in range(0, clients)])
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Single-log /log/create with waitForIdentifier=true, requests/s versus immudb transactions/s")
+    parser.add_argument("--clients", type = int, default = 64, help = "concurrent producers, each waits for its identifier")
+    parser.add_argument("--requests", type = int, default = 20, help = "requests per producer")
+    parser.add_argument("--pool", type = int, default = 4)
+    parser.add_argument("--latency", type = float, default = 0.002, help = "simulated immudb round trip in seconds")
+    args = parser.parse_args()
+
+    total = args.clients * args.requests
+    for label, maxWait, maxSize in [("no grouping", 0, 1), ("wait=1ms", 0.001, 256), ("wait=2ms", 0.002, 256), ("wait=5ms", 0.005, 256)]:
+        storage = setupMemoryApp(args.pool, args.latency)
+        groupCommitter = getServiceProvider().groupCommitter
+        groupCommitter.maxWait = maxWait
+        groupCommitter.maxSize = maxSize
+        storage.calls.clear()
+        elapsed = asyncio.run(runClients(args.clients, args.requests))
+        transactions = storage.calls["sqlExec"]
+        print(f"{label:<12} requests/s={total / elapsed:>8.0f} transactions/s={transactions / elapsed:>7.0f} logs/transaction={total / max(1, transactions):>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from immulogger.database.ingestqueue import IngestQueue
+from immulogger.routers.models.logmodel import AddLogRequest
+from . import createMemoryPool
+
+
+def perRequest(requests: int, senders: int, latency: float):
+    # Previous behaviour: every fire-and-forget request becomes its own TX on a pooled session
+    pool, storage = createMemoryPool(senders)
+    storage.latency = latency
+    storage.calls.clear()
+
+    def send(index: int):
+        with pool.session() as client:
+            client.processLogRequest(AddLogRequest(logContent = f"log {index}", tags = ["x"]))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = senders) as executor:
+        list(executor.map(send, range(0, requests)))
+    return time.perf_counter() - started, storage.calls["sqlExec"]
+
+
+def queued(requests: int, senders: int, latency: float, maxBatchLines: int, maxLinger: float):
+    pool, storage = createMemoryPool(senders)
+    storage.latency = latency
+    storage.calls.clear()
+    ingestQueue = IngestQueue(pool, maxBatchLines = maxBatchLines, maxLinger = maxLinger)
+    ingestQueue.start()
+
+    def send(index: int):
+        ingestQueue.put([f"log {index}"], ["x"], int(time.time() * 1000))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = senders) as executor:
+        list(executor.map(send, range(0, requests)))
+    # Stopping drains the queue, so the time covers the last commit
+    ingestQueue.stop()
+    return time.perf_counter() - started, storage.calls["sqlExec"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Fire-and-forget ingestion, one TX per request versus the ingest queue")
+    parser.add_argument("--requests", type = int, default = 2000)
+    parser.add_argument("--senders", type = int, default = 4)
+    parser.add_argument("--latency", type = float, default = 0.002, help = "Seconds added to every immudb call")
+    parser.add_argument("--linger", type = float, default = 0.05)
+    args = parser.parse_args()
+
+    elapsed, transactions = perRequest(args.requests, args.senders, args.latency)
+    print(f"{'per request':<20} logs/s={args.requests / elapsed:>9.0f} transactions={transactions:>6}")
+    for maxBatchLines in [64, 256, 1024]:
+        elapsed, transactions = queued(args.requests, args.senders, args.latency, maxBatchLines, args.linger)
+        print(f"{f'queue lines={maxBatchLines}':<20} logs/s={args.requests / elapsed:>9.0f} transactions={transactions:>6}")
+
+
+if __name__ == "__main__":
+    main()
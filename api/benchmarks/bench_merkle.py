@@ -0,0 +1,53 @@
+import argparse
+import random
+import time
+
+from immulogger.database import merkle
+from immulogger.routers.models.logmodel import AddLogsRequest
+from . import createMemoryConfirmer
+
+
+def run(mode: str, logs: int, verifies: int, pageSize: int, latency: float):
+    merkle.confirmationMode = mode
+    confirmer = createMemoryConfirmer()
+    with confirmer as client:
+        storage = client.client.storage
+        storage.latency = latency
+        keysBefore = len(storage.kv)
+        started = time.perf_counter()
+        identifiers = client.processLogsRequest(AddLogsRequest(logs = [f"log line {index}" for index in range(0, logs)]))
+        writeTime = time.perf_counter() - started
+        kvEntries = len(storage.kv) - keysBefore
+        kvBytes = sum(len(key) + len(history[-1][1]) for key, history in storage.kv.items())
+
+        rnd = random.Random(7)
+        picked = [rnd.randrange(logs) for _ in range(0, verifies)]
+        client.verifiedCache.clear()
+        started = time.perf_counter()
+        for index in picked:
+            assert client.verifyLogContent(f"log line {index}", identifiers[index])
+        singleTime = time.perf_counter() - started
+
+        client.verifiedCache.clear()
+        started = time.perf_counter()
+        for start in range(0, logs, pageSize):
+            assert all(client.verifyBatch([(identifiers[index], client.makeStrSha256(f"log line {index}".encode("utf-8"))) for index in range(start, min(logs, start + pageSize))]))
+        batchTime = time.perf_counter() - started
+    return logs / writeTime, kvEntries, kvBytes, verifies / singleTime, logs / batchTime
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Confirmation writes and verification with one KV entry per log or one Merkle root per TX")
+    parser.add_argument("--logs", type = int, default = 10240)
+    parser.add_argument("--verifies", type = int, default = 500, help = "single /log/verify calls on random logs")
+    parser.add_argument("--page", type = int, default = 100, help = "logs per verifyBatch call")
+    parser.add_argument("--latency", type = float, default = 0, help = "simulated immudb round trip in seconds")
+    args = parser.parse_args()
+
+    for mode in ["entry", "merkle"]:
+        writes, kvEntries, kvBytes, single, batch = run(mode, args.logs, args.verifies, args.page, args.latency)
+        print(f"{mode:<6} write={writes:>8.0f} logs/s kv entries={kvEntries:>6} kv bytes={kvBytes:>8} verify={single:>7.0f}/s verifyBatch={batch:>8.0f} logs/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import os
+import time
+from typing import List, Union
+
+from pydantic import BaseModel, conlist
+
+from immulogger.database.immudb import ImmudbConfirmer
+from immulogger.database.preprocess import LogDigester, digestLogs
+from immulogger.routers.models.logmodel import AddLogBody, AddLogsRequest, logConstraint
+
+
+class LegacyAddLogsRequest(BaseModel):
+    # Previous item order, every plain string first failed as AddLogBody
+    logs: conlist(item_type = Union[AddLogBody, logConstraint], min_items = 1, max_items = 10240)
+
+
+def legacyDigest(contents: List[str]):
+    # Previous prepareLogEntries: generateIdentifier hashes the content for the suffix, the confirmation hashes it again
+    return [(ImmudbConfirmer.generateIdentifier(content), ImmudbConfirmer.makeSha256(content.encode("utf-8"))) for content in contents]
+
+
+def timed(function, repeat: int):
+    # Wall time and CPU time of this process per call, the latter is what the API process spends
+    started = time.perf_counter()
+    startedCpu = time.process_time()
+    for _ in range(0, repeat):
+        function()
+    return (time.perf_counter() - started) / repeat, (time.process_time() - startedCpu) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Logs per second per core of /log/batchcreate preprocessing: validation, hashing and identifiers")
+    parser.add_argument("--logs", type = int, default = 10240)
+    parser.add_argument("--size", type = int, default = 120, help = "characters per log")
+    parser.add_argument("--workers", type = int, nargs = "+", default = [2, 4])
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    logs = [(f"2024-05-01T12:00:00Z INFO request {index} served " * 8)[0:args.size] for index in range(0, args.logs)]
+    chunkSize = ImmudbConfirmer.chunkSize([])
+    chunks = [logs[start:start + chunkSize] for start in range(0, len(logs), chunkSize)]
+    cores = os.cpu_count() or 1
+    print(f"{args.logs} logs of {args.size} characters, {cores} cores")
+
+    def report(label: str, times, coresUsed: int):
+        elapsed, cpu = times
+        print(f"{label:<28} {elapsed * 1000:>8.1f}ms {args.logs / elapsed:>10.0f} logs/s {args.logs / elapsed / coresUsed:>10.0f} logs/s/core  api process cpu {cpu * 1000:>6.1f}ms")
+
+    report("validate legacy union", timed(lambda: LegacyAddLogsRequest(logs = logs), args.repeat), 1)
+    report("validate strings first", timed(lambda: AddLogsRequest(logs = logs), args.repeat), 1)
+    report("digest legacy", timed(lambda: [legacyDigest(chunk) for chunk in chunks], args.repeat), 1)
+    report("digest inline", timed(lambda: [digestLogs(chunk) for chunk in chunks], args.repeat), 1)
+    for workers in args.workers:
+        digester = LogDigester(workers, 0)
+        # Worker start-up is paid once per process lifetime, not per batch
+        list(digester.digestChunks(chunks))
+        report(f"digest {workers} processes", timed(lambda: list(digester.digestChunks(chunks)), args.repeat), min(workers, cores))
+        digester.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import asyncio
+import time
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from immulogger.routers.models.logmodel import LogRecord, LogResponse, LogsResponse
+
+RESPONSE_FIELD = create_response_field(name = "Response_getLogs", type_ = LogsResponse)
+
+
+def rows(count: int):
+    # Rows as _formatLogs gets them from immudb plus their tags
+    return [(f"2024-05-01T12:00:00Z INFO request {index} served in {index % 97}ms path=/api/v1/orders", f"{index:036d}abcdef0123", 1714564800000 + index, ["api", "orders"]) for index in range(0, count)]
+
+
+def legacyPage(result) -> bytes:
+    # Previous path: a LogResponse per row, a LogsResponse, then FastAPI validating and encoding it through response_model
+    logs = [LogResponse(log = item[0], uniqueidentifier = item[1], createdate = item[2], tags = item[3], verified = True) for item in result]
+    content = asyncio.run(serialize_response(field = RESPONSE_FIELD, response_content = LogsResponse(logs = logs, nextCursor = "cursor"), is_coroutine = False))
+    return JSONResponse(content).body
+
+
+def leanPage(result) -> bytes:
+    logs = [LogRecord(item[0], item[1], item[2], item[3], True) for item in result]
+    return ORJSONResponse({"logs": logs, "nextCursor": "cursor"}).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Rows per second from immudb rows to the /log/get response body")
+    parser.add_argument("--rows", type = int, nargs = "+", default = [100, 1000, 5000])
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    for count in args.rows:
+        result = rows(count)
+        assert LogsResponse.parse_raw(leanPage(result)) == LogsResponse.parse_raw(legacyPage(result))
+        timings = dict()
+        for label, render in [("legacy", legacyPage), ("lean", leanPage)]:
+            started = time.perf_counter()
+            for _ in range(0, args.repeat):
+                render(result)
+            timings[label] = (time.perf_counter() - started) / args.repeat
+        print(f"rows={count:>6} legacy={count / timings['legacy']:>10.0f} rows/s lean={count / timings['lean']:>10.0f} rows/s speedup={timings['legacy'] / timings['lean']:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from immulogger.main import app
+from . import authorizationHeaders, setupMemoryApp
+from .asgiclient import AsgiClient
+
+
+def logLine(index: int, size: int) -> str:
+    return (f"2024-05-01T12:00:00Z INFO request {index} served " * (size // 40 + 1))[0:size]
+
+
+def batchRequest(client: AsgiClient, logs: int, size: int, tags):
+    # The whole JSON body exists before the request starts, as it does for a client of /batchcreate
+    body = json.dumps({"logs": [logLine(index, size) for index in range(0, logs)], "tags": tags}).encode("utf-8")
+    return client.request("PUT", "/api/v1/log/batchcreate", body = body, headers = {"content-type": "application/json"})
+
+
+def streamRequest(client: AsgiClient, logs: int, size: int, tags, pieceLines: int = 64):
+    def pieces():
+        for start in range(0, logs, pieceLines):
+            yield "".join(json.dumps(logLine(index, size)) + "\n" for index in range(start, min(logs, start + pieceLines))).encode("utf-8")
+    return client.request("PUT", "/api/v1/log/streamcreate", params = {"tags": tags}, body = pieces(), headers = {"content-type": "application/x-ndjson"})
+
+
+def run(label: str, request, logs: int):
+    started = time.perf_counter()
+    response = asyncio.run(request())
+    elapsed = time.perf_counter() - started
+    assert response.status == 200, response.body
+    # What is still allocated after the request is what the in-memory immudb keeps, the rest was held by the request
+    tracemalloc.start()
+    asyncio.run(request())
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<14} {logs / elapsed:>9.0f} logs/s  request peak memory {(peak - retained) / 1024 / 1024:>8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Throughput and peak memory of /log/batchcreate and /log/streamcreate")
+    parser.add_argument("--logs", type = int, default = 10240)
+    parser.add_argument("--size", type = int, default = 1000, help = "characters per log")
+    parser.add_argument("--tags", nargs = "*", default = ["bench"])
+    args = parser.parse_args()
+
+    setupMemoryApp()
+    client = AsgiClient(app, authorizationHeaders(["SEND_LOGS"]))
+    print(f"{args.logs} logs of {args.size} characters")
+    if(args.logs <= 10240):
+        run("batchcreate", lambda: batchRequest(client, args.logs, args.size, args.tags), args.logs)
+    run("streamcreate", lambda: streamRequest(client, args.logs, args.size, args.tags), args.logs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import time
+
+from immulogger.routers.models.logmodel import AddLogsRequest
+from . import createMemoryConfirmer
+
+
+def populate(confirmer, logsCount: int):
+    with confirmer as client:
+        half = int(logsCount / 2)
+        client.processLogsRequest(AddLogsRequest(logs = [f"log {index}" for index in range(0, half)], tags = ["a", "b"]))
+        client.processLogsRequest(AddLogsRequest(logs = [f"log {index}" for index in range(half, logsCount)], tags = ["a"]))
+
+
+def perRowRoundTrips(confirmer, limit: int, tagsFilter) -> int:
+    # Replays the previous access pattern: one page query plus one getTags per row
+    backend = confirmer.client
+    backend.resetCounters()
+    hasNext = True
+    lastId = 0
+    while hasNext:
+        if(limit >= 1):
+            hasNext = False
+        additionalParams, query = confirmer._createLogQuery(lastId, limit, tagsFilter)
+        result = backend.sqlQuery(query, additionalParams)
+        if(len(result) == 0):
+            break
+        lastId = result[-1][3]
+        for item in result:
+            confirmer.getTags(item[1])
+    return backend.roundTrips
+
+
+def measure(confirmer, label: str, limit: int, tagsFilter):
+    backend = confirmer.client
+    legacy = perRowRoundTrips(confirmer, limit, tagsFilter)
+    backend.resetCounters()
+    started = time.perf_counter()
+    with confirmer as client:
+        result = client.getLastLogs(limit, False, tagsFilter)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<24} rows={len(result):>6} roundTrips={backend.roundTrips:>6} perRowTags={legacy:>6} time={elapsed * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Counts immudb round trips made by getLastLogs")
+    parser.add_argument("--logs", type = int, default = 5000)
+    args = parser.parse_args()
+
+    confirmer = createMemoryConfirmer()
+    populate(confirmer, args.logs)
+    measure(confirmer, "all logs", -1, [])
+    measure(confirmer, "limit=1000", 1000, [])
+    measure(confirmer, "all logs, tags=[a, b]", -1, ["a", "b"])
+
+
+if __name__ == "__main__":
+    main()
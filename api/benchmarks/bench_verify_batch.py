@@ -0,0 +1,42 @@
+import argparse
+import time
+
+from immulogger.routers.models.logmodel import AddLogsRequest
+from . import createMemoryConfirmer
+
+
+def measure(label: str, confirmer, verify, items):
+    backend = confirmer.client
+    backend.resetCounters()
+    started = time.perf_counter()
+    verified = verify(items)
+    elapsed = time.perf_counter() - started
+    assert all(verified)
+    print(f"{label:<18} items={len(items):>5} roundTrips={backend.roundTrips:>5} time={elapsed * 1000:>8.1f}ms items/s={len(items) / elapsed:>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Verifying a page of logs, one verifiedGet per item versus verifyBatch")
+    parser.add_argument("--logs", type = int, default = 1000)
+    parser.add_argument("--latency", type = float, default = 0.002, help = "simulated immudb round trip in seconds")
+    args = parser.parse_args()
+
+    confirmer = createMemoryConfirmer()
+    with confirmer as client:
+        identifiers = client.processLogsRequest(AddLogsRequest(logs = [f"log {index}" for index in range(0, args.logs)], tags = ["a"]))
+        # A few more TXs on top, so proofs have to span some history
+        for index in range(0, 10):
+            client.processLogsRequest(AddLogsRequest(logs = [f"later {index}"]))
+        items = [(identifier, client.makeStrSha256(f"log {index}".encode("utf-8"))) for index, identifier in enumerate(identifiers)]
+        client.client.storage.latency = args.latency
+        perItem = lambda batch: [client.verifyLogSha(sha, identifier) for identifier, sha in batch]
+        for label, verify in [("per item", perItem), ("verifyBatch", client.verifyBatch)]:
+            client.verifiedCache.clear()
+            measure(label, client, verify, items)
+            # Same identifiers again, answered by the verified cache
+            measure(f"{label} again", client, verify, items)
+        print(f"verified cache hits={client.verifiedCache.hits} misses={client.verifiedCache.misses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlencode
+
+from immulogger.main import app
+from immulogger.routers.models.logmodel import AddLogsRequest
+from immulogger.serviceprovider import getServiceProvider
+from . import authorizationHeaders, percentile, setupMemoryApp
+from .asgiclient import AsgiClient, AsgiResponse
+
+SEED_LOGS = 5000
+SEED_TAGS = ["alpha", "beta", "gamma", "delta"]
+BATCH_SIZES = [10, 100, 1000]
+BATCH_TAG_COUNTS = [0, 4]
+
+
+class Scenario:
+    def __init__(self, name: str, scopes: List[str], call: Callable[[AsgiClient, int], Awaitable[AsgiResponse]], requests: Optional[int] = None, logsPerRequest: int = 0):
+        self.name = name
+        self.scopes = scopes
+        self.call = call
+        self.requests = requests
+        self.logsPerRequest = logsPerRequest
+
+
+def batchScenario(batchSize: int, tagCount: int, requests: int) -> Scenario:
+    tags = [f"tag{index}" for index in range(0, tagCount)]
+
+    def call(client: AsgiClient, index: int):
+        logs = [f"batch {index} log {logIndex}" for logIndex in range(0, batchSize)]
+        return client.put("/api/v1/log/batchcreate", {"logs": logs, "tags": tags, "waitForIdentifier": True})
+
+    # Keeps the number of logs per scenario roughly constant, so big batches do not dominate the run
+    count = max(5, requests * 10 // batchSize)
+    return Scenario(f"batchcreate_{batchSize}x{tagCount}tags", ["SEND_LOGS"], call, count, batchSize)
+
+
+def getScenario(name: str, params: dict, requests: int) -> Scenario:
+    return Scenario(name, ["READ_LOGS"], lambda client, index: client.get("/api/v1/log/get", params), requests)
+
+
+def login(client: AsgiClient, index: int):
+    body = urlencode({"username": "admin", "password": "admin", "scope": "READ_LOGS"}).encode("utf-8")
+    return client.request("POST", "/api/v1/auth/token", body = body, headers = {"content-type": "application/x-www-form-urlencoded"})
+
+
+def buildScenarios(requests: int, readRequests: int, authRequests: int) -> List[Scenario]:
+    scenarios = [
+        Scenario("create", ["SEND_LOGS"], lambda client, index: client.put("/api/v1/log/create", {"logContent": f"create {index}", "tags": ["bench"], "waitForIdentifier": True}), logsPerRequest = 1),
+        Scenario("create_nowait", ["SEND_LOGS"], lambda client, index: client.put("/api/v1/log/create", {"logContent": f"nowait {index}", "tags": ["bench"]}), logsPerRequest = 1),
+    ]
+    for batchSize in BATCH_SIZES:
+        for tagCount in BATCH_TAG_COUNTS:
+            scenarios.append(batchScenario(batchSize, tagCount, requests))
+    scenarios += [
+        getScenario("get_100", {"limit": 100}, readRequests),
+        getScenario("get_100_verify", {"limit": 100, "verify": True}, readRequests),
+        getScenario("get_100_tag", {"limit": 100, "tags": ["alpha"]}, readRequests),
+        getScenario("get_100_tag_verify", {"limit": 100, "verify": True, "tags": ["alpha"]}, readRequests),
+        getScenario("get_1000", {"limit": 1000}, readRequests),
+        Scenario("count", ["READ_LOGS"], lambda client, index: client.get("/api/v1/log/count"), readRequests),
+        # bcrypt makes every login expensive on purpose, so this one runs fewer requests
+        Scenario("auth_token", [], login, authRequests),
+    ]
+    return scenarios
+
+
+def seed(logs: int):
+    pool = getServiceProvider().immudbConfirmer
+    chunk = 500
+    for start in range(0, logs, chunk):
+        contents = [f"seed {index}" for index in range(start, min(logs, start + chunk))]
+        pool.processLogsRequest(AddLogsRequest(logs = contents, tags = [SEED_TAGS[(start // chunk) % len(SEED_TAGS)]], waitForIdentifier = True))
+
+
+async def measure(scenario: Scenario, requests: int, concurrency: int) -> dict:
+    client = AsgiClient(app, authorizationHeaders(scenario.scopes))
+    latencies = []
+    nextIndex = 0
+
+    async def worker():
+        nonlocal nextIndex
+        while(nextIndex < requests):
+            index = nextIndex
+            nextIndex += 1
+            started = time.perf_counter()
+            response = await scenario.call(client, index)
+            latencies.append(time.perf_counter() - started)
+            assert response.status == 200, f"{scenario.name}: {response.status} {response.body[:200]}"
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(0, concurrency)])
+    elapsed = time.perf_counter() - started
+    result = {
+        "requests": requests,
+        "seconds": round(elapsed, 4),
+        "throughput": round(requests / elapsed, 2),
+        "p50": round(percentile(latencies, 50) * 1000, 3),
+        "p95": round(percentile(latencies, 95) * 1000, 3),
+        "p99": round(percentile(latencies, 99) * 1000, 3),
+    }
+    if(scenario.logsPerRequest):
+        result["logsPerSecond"] = round(requests * scenario.logsPerRequest / elapsed, 2)
+    return result
+
+
+async def runSuite(scenarios: List[Scenario], requests: int, concurrency: int) -> Dict[str, dict]:
+    results = dict()
+    for scenario in scenarios:
+        count = scenario.requests or requests
+        # One unmeasured request warms up routes, caches and the token
+        await scenario.call(AsgiClient(app, authorizationHeaders(scenario.scopes)), -1)
+        results[scenario.name] = await measure(scenario, count, concurrency)
+        printResult(scenario.name, results[scenario.name])
+    return results
+
+
+def printResult(name: str, result: dict):
+    print(f"{name:<26} req/s={result['throughput']:>9.1f} p50={result['p50']:>8.2f}ms p95={result['p95']:>8.2f}ms p99={result['p99']:>8.2f}ms")
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    # A scenario regresses when its throughput falls, or its p95 grows, by more than tolerance
+    regressions = []
+    print(f"\n{'scenario':<26} {'req/s':>9} {'baseline':>9} {'change':>8} {'p95 change':>11}")
+    for name, result in results.items():
+        if(name not in baseline):
+            print(f"{name:<26} {result['throughput']:>9.1f} {'-':>9}")
+            continue
+        base = baseline[name]
+        throughputChange = (result["throughput"] - base["throughput"]) / base["throughput"]
+        p95Change = (result["p95"] - base["p95"]) / base["p95"] if base["p95"] > 0 else 0
+        regressed = throughputChange < -tolerance or p95Change > tolerance
+        if(regressed):
+            regressions.append(name)
+        marker = "  REGRESSION" if regressed else ""
+        print(f"{name:<26} {result['throughput']:>9.1f} {base['throughput']:>9.1f} {throughputChange * 100:>7.1f}% {p95Change * 100:>10.1f}%{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "End to end benchmark suite for ingestion, listing, verification and auth, run in process on the in-memory backend")
+    parser.add_argument("--requests", type = int, default = 200, help = "requests per scenario")
+    parser.add_argument("--read-requests", type = int, default = 50, help = "requests per /log/get and /log/count scenario")
+    parser.add_argument("--auth-requests", type = int, default = 20, help = "requests for the bcrypt bound /auth/token scenario")
+    parser.add_argument("--concurrency", type = int, default = 8)
+    parser.add_argument("--pool", type = int, default = 4)
+    parser.add_argument("--latency", type = float, default = 0.001, help = "simulated immudb round trip in seconds")
+    parser.add_argument("--only", nargs = "*", default = None, help = "run only scenarios starting with one of these names")
+    parser.add_argument("--output", default = None, help = "write results as JSON to this file")
+    parser.add_argument("--baseline", default = None, help = "JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type = float, default = 0.1, help = "allowed relative slowdown before a scenario counts as a regression")
+    args = parser.parse_args()
+
+    storage = setupMemoryApp(args.pool, 0)
+    seed(SEED_LOGS)
+    storage.latency = args.latency
+
+    scenarios = buildScenarios(args.requests, args.read_requests, args.auth_requests)
+    if(args.only):
+        scenarios = [scenario for scenario in scenarios if any(scenario.name.startswith(prefix) for prefix in args.only)]
+    results = asyncio.run(runSuite(scenarios, args.requests, args.concurrency))
+    getServiceProvider().stopIngestQueue()
+
+    report = {
+        "config": {"requests": args.requests, "readRequests": args.read_requests, "authRequests": args.auth_requests, "concurrency": args.concurrency, "pool": args.pool, "latency": args.latency, "seedLogs": SEED_LOGS},
+        "python": platform.python_version(),
+        "time": int(time.time()),
+        "results": results,
+    }
+    if(args.output):
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent = 2)
+    if(args.baseline):
+        with open(args.baseline, "r") as baselineFile:
+            baseline = json.load(baselineFile)
+        if(baseline.get("config") != report["config"]):
+            print(f"\nwarning: baseline was recorded with {baseline.get('config')}")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if(len(regressions) > 0):
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
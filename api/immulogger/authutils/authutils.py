@@ -1,10 +1,14 @@
 
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm, SecurityScopes
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from ..config.config import SECRET_KEY
+from ..config.config import SECRET_KEY, TOKEN_CACHE_SIZE
+from ..metrics import CACHE_LOOKUPS
 from enum import Enum
 
 
@@ -51,3 +55,34 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+
+class TokenCache:
+    # Memoizes jwt.decode per token until the token expires, an invalid token is decoded (and rejected) every time
+    def __init__(self, maxSize: int = 4096):
+        self.maxSize = maxSize
+        self.tokens = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token: str) -> dict:
+        with self.lock:
+            cached = self.tokens.get(token)
+            if(cached is not None and cached[1] > time.time()):
+                self.tokens.move_to_end(token)
+                self.hits += 1
+                CACHE_LOOKUPS.labels("token", "hit").inc()
+                return cached[0]
+            self.misses += 1
+            CACHE_LOOKUPS.labels("token", "miss").inc()
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        expires = payload.get("exp")
+        if(expires is not None and self.maxSize > 0):
+            with self.lock:
+                self.tokens[token] = (payload, float(expires))
+                self.tokens.move_to_end(token)
+                while(len(self.tokens) > self.maxSize):
+                    self.tokens.popitem(last = False)
+        return payload
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
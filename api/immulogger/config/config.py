@@ -1,4 +1,5 @@
 import os
+import socket
 
 
 IMMUDB_HOST = os.environ.get("IMMUDB_HOST", "localhost")
@@ -6,7 +7,53 @@ IMMUDB_PORT = int(os.environ.get("IMMUDB_PORT", "3322"))
 IMMUDB_LOGIN = os.environ.get("IMMUDB_LOGIN", "immudb")
 IMMUDB_PASSWORD = os.environ.get("IMMUDB_PASSWORD", "immudb")
 IMMUDB_KEY_PATH = os.environ.get("IMMUDB_PUBKEYPATH", None)
+# "memory" runs against an in-process fake of immudb, nothing survives a restart
+IMMUDB_BACKEND = os.environ.get("IMMUDB_BACKEND", "immudb")
+IMMUDB_MEMORY_LATENCY = float(os.environ.get("IMMUDB_MEMORY_LATENCY", "0"))
+IMMUDB_POOL_SIZE = int(os.environ.get("IMMUDB_POOL_SIZE", "4"))
+IMMUDB_SESSION_TTL = int(os.environ.get("IMMUDB_SESSION_TTL", str(30 * 60)))
+IMMUDB_POOL_TIMEOUT = float(os.environ.get("IMMUDB_POOL_TIMEOUT", "30"))
+IMMUDB_HEALTHCHECK_INTERVAL = float(os.environ.get("IMMUDB_HEALTHCHECK_INTERVAL", "60"))
+IMMUDB_BATCH_PARALLELISM = int(os.environ.get("IMMUDB_BATCH_PARALLELISM", "2"))
+VERIFIED_CACHE_SIZE = int(os.environ.get("VERIFIED_CACHE_SIZE", "65536"))
+LOG_COUNTS_RECONCILE_INTERVAL = float(os.environ.get("LOG_COUNTS_RECONCILE_INTERVAL", "60"))
+LOG_COUNTS_MAX_TAGS = int(os.environ.get("LOG_COUNTS_MAX_TAGS", "1024"))
+# Log ids held by the search index over all tokens, 8 bytes each, past it searches scan LOGS
+SEARCH_INDEX_MAX_POSTINGS = int(os.environ.get("SEARCH_INDEX_MAX_POSTINGS", "16777216"))
+SEARCH_INDEX_REFRESH_INTERVAL = float(os.environ.get("SEARCH_INDEX_REFRESH_INTERVAL", "1"))
+# "zlib" compresses log content before it is stored, "none" stores it as sent
+LOG_COMPRESSION = os.environ.get("LOG_COMPRESSION", "none").lower()
+LOG_COMPRESSION_MIN_SIZE = int(os.environ.get("LOG_COMPRESSION_MIN_SIZE", "256"))
+LOG_MAX_LENGTH = int(os.environ.get("LOG_MAX_LENGTH", "65536" if LOG_COMPRESSION != "none" else "4096"))
+# Stores every distinct content once in CONTENTS, logs reference it by SHA256
+LOG_DEDUP = os.environ.get("LOG_DEDUP", "false").lower() == "true"
+LOG_DEDUP_CACHE_SIZE = int(os.environ.get("LOG_DEDUP_CACHE_SIZE", "65536"))
+# "entry" writes one confirmation per log, "merkle" one Merkle root per TX of logs
+CONFIRMATION_MODE = os.environ.get("CONFIRMATION_MODE", "entry").lower()
+# Worker processes hashing /log/batchcreate batches of at least PREPROCESS_MIN_LOGS logs, 0 hashes in the request thread
+PREPROCESS_WORKERS = int(os.environ.get("PREPROCESS_WORKERS", "0"))
+PREPROCESS_MIN_LOGS = int(os.environ.get("PREPROCESS_MIN_LOGS", "2048"))
+IMMUDB_WORKERS = int(os.environ.get("IMMUDB_WORKERS", str(IMMUDB_POOL_SIZE)))
+# {hostname} gives every replica its own spool on a shared volume
+INGEST_SPOOL_PATH = os.environ.get("INGEST_SPOOL_PATH", None)
+if(INGEST_SPOOL_PATH):
+    INGEST_SPOOL_PATH = INGEST_SPOOL_PATH.replace("{hostname}", socket.gethostname())
+INGEST_SPOOL_FSYNC = os.environ.get("INGEST_SPOOL_FSYNC", "false").lower() == "true"
+INGEST_MAX_BATCH_LINES = int(os.environ.get("INGEST_MAX_BATCH_LINES", "1024"))
+INGEST_MAX_LINGER = float(os.environ.get("INGEST_MAX_LINGER", "0.05"))
+INGEST_MAX_PENDING_LOGS = int(os.environ.get("INGEST_MAX_PENDING_LOGS", "100000"))
+INGEST_SPOOL_COMPACT_BYTES = int(os.environ.get("INGEST_SPOOL_COMPACT_BYTES", str(64 * 1024 * 1024)))
+GROUP_COMMIT_MAX_WAIT = float(os.environ.get("GROUP_COMMIT_MAX_WAIT", "0.002"))
+GROUP_COMMIT_MAX_SIZE = int(os.environ.get("GROUP_COMMIT_MAX_SIZE", "256"))
+# Seconds, SQL slower than this is printed with its statement, 0 disables the log
+SLOW_QUERY_THRESHOLD = float(os.environ.get("SLOW_QUERY_THRESHOLD", "1"))
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "true").lower() == "true"
+TRACING_OTEL = os.environ.get("TRACING_OTEL", "false").lower() == "true"
+
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "1024"))
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "4096"))
 
 SECRET_KEY = os.environ.get("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
 
-IMMUDB_URL = f"{IMMUDB_HOST}:{IMMUDB_PORT}"
\ No newline at end of file
+IMMUDB_URL = f"{IMMUDB_HOST}:{IMMUDB_PORT}" if IMMUDB_BACKEND != "memory" else "memory://default"
\ No newline at end of file
@@ -0,0 +1,27 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import Executor
+from typing import Callable
+
+from .pool import ImmudbConfirmerPool
+
+
+class AsyncImmudbConfirmer:
+    # Runs blocking immudb work on a bounded executor, so a slow call never stalls the event loop
+    def __init__(self, pool: ImmudbConfirmerPool, executor: Executor):
+        self.pool = pool
+        self.executor = executor
+
+    async def run(self, function: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # The copied context carries the request's tracing spans into the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, function, *args, **kwargs))
+
+    def _callInSession(self, method: str, args, kwargs):
+        with self.pool.session() as client:
+            return getattr(client, method)(*args, **kwargs)
+
+    async def call(self, method: str, *args, **kwargs):
+        return await self.run(self._callInSession, method, args, kwargs)
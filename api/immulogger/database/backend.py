@@ -0,0 +1,80 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+import ecdsa
+from immudb import ImmudbClient
+from immudb.rootService import RootService
+
+from ..metrics import timeBackendCalls
+
+MEMORY_SCHEME = "memory://"
+
+
+class StorageBackend(ABC):
+    # The part of ImmudbClient that ImmudbConfirmer and ImmudbUserProvider rely on
+    verifyingKey = None
+
+    @property
+    @abstractmethod
+    def stub(self):
+        # Raw gRPC calls: CurrentState and VerifiableTxById
+        pass
+
+    @abstractmethod
+    def login(self, username, password, database = b"defaultdb"):
+        pass
+
+    @abstractmethod
+    def logout(self):
+        pass
+
+    @abstractmethod
+    def healthCheck(self):
+        pass
+
+    @abstractmethod
+    def sqlExec(self, stmt, params = {}, noWait = False):
+        pass
+
+    @abstractmethod
+    def sqlQuery(self, query, params = {}):
+        pass
+
+    @abstractmethod
+    def setAll(self, kv: Dict[bytes, bytes]):
+        pass
+
+    @abstractmethod
+    def verifiedSet(self, key: bytes, value: bytes):
+        pass
+
+    @abstractmethod
+    def verifiedGet(self, key: bytes):
+        pass
+
+    @abstractmethod
+    def verifiedGetAt(self, key: bytes, atTx: int):
+        pass
+
+    @abstractmethod
+    def getAllValues(self, keys: List[bytes]):
+        pass
+
+
+class ImmudbClientBackend(ImmudbClient, StorageBackend):
+    def loadKey(self, kfile: str):
+        super().loadKey(kfile)
+        # Kept reachable, batched proofs check the server signature too
+        if(kfile is None):
+            self.verifyingKey = None
+        else:
+            with open(kfile) as keyFile:
+                self.verifyingKey = ecdsa.VerifyingKey.from_pem(keyFile.read())
+
+
+def createBackend(url: str, rootService: RootService, keyPath: str = None) -> StorageBackend:
+    # memory://<name> selects the in-process backend, sessions with the same name share one storage
+    if(url.startswith(MEMORY_SCHEME)):
+        from .memorybackend import InMemoryBackend, getMemoryStorage
+        return timeBackendCalls(InMemoryBackend(getMemoryStorage(url[len(MEMORY_SCHEME):]), rootService))
+    return timeBackendCalls(ImmudbClientBackend(url, rs = rootService, publicKeyFile = keyPath))
@@ -0,0 +1,35 @@
+import base64
+import binascii
+import json
+from typing import Optional, Tuple
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encodeCursor(lastId: int, lastCreated: int = 0) -> Optional[str]:
+    # lastCreated is the createdate of the last row of a from/to read, those are ordered by it
+    if(lastId < 1):
+        return None
+    position = {"lastId": lastId}
+    if(lastCreated > 0):
+        position["createdate"] = lastCreated
+    jsoned = json.dumps(position, separators=(",", ":"))
+    return base64.urlsafe_b64encode(jsoned.encode("utf-8")).decode("utf-8").rstrip("=")
+
+
+def decodeCursor(cursor: Optional[str]) -> Tuple[int, int]:
+    # (lastId, lastCreated), lastCreated is 0 for cursors of reads without a range
+    if(not cursor):
+        return 0, 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        decoded = json.loads(base64.urlsafe_b64decode(padded.encode("utf-8")))
+        lastId = decoded["lastId"]
+        lastCreated = decoded.get("createdate", 0)
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError) as e:
+        raise InvalidCursor(f"Invalid cursor {cursor}") from e
+    if(type(lastId) != int or lastId < 1 or type(lastCreated) != int or lastCreated < 0):
+        raise InvalidCursor(f"Invalid cursor {cursor}")
+    return lastId, lastCreated
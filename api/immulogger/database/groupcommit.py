@@ -0,0 +1,57 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+from .asyncconfirmer import AsyncImmudbConfirmer
+from .immudb import ImmudbConfirmer
+
+
+class GroupCommitter:
+    # Coalesces concurrent single-log writes: the first log of a group waits up to maxWait for others
+    # to join, then the whole group goes to immudb as one processLogEntries TX.
+    # Each caller gets the identifier of its own log, or the exception of the whole group.
+    def __init__(self, confirmer: AsyncImmudbConfirmer, maxWait: float = 0.002, maxSize: int = 256):
+        self.confirmer = confirmer
+        self.maxWait = maxWait
+        self.maxSize = max(1, maxSize)
+        self.pending: List[Tuple[Tuple[str, int, List[str]], asyncio.Future]] = []
+        self.pendingLines = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.groups = 0
+
+    async def submit(self, content: str, timeReceived: int, tags: List[str]) -> str:
+        loop = asyncio.get_running_loop()
+        lines = ImmudbConfirmer.linesForEntry(tags)
+        if(self.pendingLines + lines > ImmudbConfirmer.MAX_LINES_PER_TX):
+            self._flush()
+        future = loop.create_future()
+        self.pending.append(((content, timeReceived, tags), future))
+        self.pendingLines += lines
+        if(len(self.pending) >= self.maxSize or self.maxWait <= 0):
+            self._flush()
+        elif(self.timer is None):
+            self.timer = loop.call_later(self.maxWait, self._flush)
+        return await future
+
+    def _flush(self):
+        if(self.timer is not None):
+            self.timer.cancel()
+            self.timer = None
+        if(len(self.pending) == 0):
+            return
+        group = self.pending
+        self.pending = []
+        self.pendingLines = 0
+        self.groups += 1
+        asyncio.ensure_future(self._commit(group))
+
+    async def _commit(self, group: List[Tuple[Tuple[str, int, List[str]], asyncio.Future]]):
+        try:
+            identifiers = await self.confirmer.call("processLogEntries", [entry for entry, _ in group])
+        except Exception as e:
+            for _, future in group:
+                if(not future.done()):
+                    future.set_exception(e)
+            return
+        for identifier, (_, future) in zip(identifiers, group):
+            if(not future.done()):
+                future.set_result(identifier)
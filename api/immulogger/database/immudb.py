@@ -1,40 +1,83 @@
 import binascii
-from typing import List, Union
-from immudb import ImmudbClient
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, List, Tuple, Union
+from immudb import htree, store
+from immudb.constants import PLAIN_VALUE_PREFIX, SET_KEY_PREFIX
+from immudb.exceptions import VerificationException
+from immudb.grpc import schema_pb2
+from immudb.rootService import RootService, State
 import hashlib
 import time
 import uuid
-from ..routers.models.logmodel import AddLogRequest, AddLogsRequest, AddLogBody, LogResponse
-from .querybuilder import BatchQueryBuilder, ComparisionOperator, InsertQueryState, InsertWithParamsQueryBuilder, LogQueryBuilder
+from ..metrics import IMMUDB_CALL_LATENCY, IMMUDB_LOGINS
+from ..tracing import span
+from ..routers.models.logmodel import AddLogRequest, AddLogsRequest, AddLogBody, LogRecord
+from .querybuilder import BatchQueryBuilder, ComparisionOperator, InsertQueryState, InsertWithParamsQueryBuilder, LogQueryBuilder, logsBatchTemplate
+from .backend import createBackend
+from . import logcodec
+from . import merkle
+from .knowncontents import KnownContents
+from .logcodec import decodeLog, encodeLog, referenceLog, referencedSha
+from .logcounters import LogCounters
+from .preprocess import digestLogs
+from .searchindex import SearchIndex, SearchQuery
+from .verifiedcache import VerifiedCache
 from .conditionbuilder import ConditionBuilder, Condition, ANDCondition, EmptyCondition, ORCondition
 
 
+@dataclass
+class PreparedLogs:
+    query: str
+    params: dict
+    confirmations: Dict[bytes, bytes]
+    identifiers: List[str]
+    # Logs per tag in this TX, for the in-memory counters
+    tagCounts: Dict[str, int] = field(default_factory = dict)
+    # SHA256 hex of contents this TX writes to CONTENTS
+    contents: List[str] = field(default_factory = list)
+
+
 class ImmudbConfirmer:
-    def __init__(self, url: str, username: str, password: str, keyPath: Union[str, None]):
+    # Rows fetched per page when walking the whole table
+    PAGE_SIZE = 256
+    # Identifiers resolved by one tags query
+    TAGS_BATCH_SIZE = 256
+    # Rows (logs + tags) one SQL transaction may insert
+    MAX_LINES_PER_TX = 1024
+
+    def __init__(self, url: str, username: str, password: str, keyPath: Union[str, None], verifiedCache: VerifiedCache = None, searchIndex: SearchIndex = None, logCounters: LogCounters = None, knownContents: KnownContents = None):
         self.username = username
         self.password = password
         self.url = url
         self.keyPath = keyPath
-        self.client = ImmudbClient(self.url, publicKeyFile=self.keyPath)
+        # Held here too, so batched proofs can check against and advance the same verified state
+        self.rootService = RootService()
+        self.client = createBackend(self.url, self.rootService, self.keyPath)
+        self.verifiedCache = verifiedCache if verifiedCache is not None else VerifiedCache()
+        self.searchIndex = searchIndex if searchIndex is not None else SearchIndex()
+        self.logCounters = logCounters if logCounters is not None else LogCounters()
+        self.knownContents = knownContents if knownContents is not None else KnownContents()
         self.logged = False
         self.lastLogged = 0
 
     def __enter__(self):
-        now = time.time()
-        if(now > self.lastLogged + 30 * 60):
-            self.login()
+        self.ensureLogged()
         return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
         
         pass
 
-    def generateIdentifier(self, logData: str):
-        shaFrom = self.makeStrSha256(logData.encode("utf-8"))
+    @classmethod
+    def generateIdentifier(cls, logData: str):
+        shaFrom = cls.makeStrSha256(logData.encode("utf-8"))
         return str(uuid.uuid4()) + shaFrom[0:10]
 
     def login(self):
         self.client.login(self.username, self.password)
+        IMMUDB_LOGINS.inc()
         self.lastLogged = time.time()
         self.logged = True
 
@@ -42,6 +85,23 @@ class ImmudbConfirmer:
         self.client.logout()
         self.logged = False
 
+    def ensureLogged(self, sessionTTL: int = 30 * 60):
+        if(not self.logged or time.time() > self.lastLogged + sessionTTL):
+            self.login()
+
+    def isHealthy(self) -> bool:
+        try:
+            self.client.healthCheck()
+            return True
+        except Exception as e:
+            return False
+
+    @contextmanager
+    def session(self):
+        # Same interface as ImmudbConfirmerPool.session, for callers holding a single confirmer
+        with self as client:
+            yield client
+
     def cryptoSet(self, key: str, value: bytes):
         what = self.client.verifiedSet(key.encode("utf-8"), value)
         return what
@@ -49,30 +109,181 @@ class ImmudbConfirmer:
     def getVerified(self, id: str) -> bytes:
         return self.client.verifiedGet(id.encode("utf-8"))
 
+    def _cachedSha(self, identifier: str) -> Union[bytes, None]:
+        cached = self.verifiedCache.get(identifier)
+        if(cached is None):
+            return None
+        sha, txId = cached
+        if(txId <= self.rootService.get().txId):
+            # Every state this session trusts was reached through verified proofs, which cover all earlier TXs
+            return sha
+        if(merkle.parseMerkleIdentifier(identifier) is not None):
+            # Leaves are not KV entries of the TX, the tree is proven again
+            return None
+        # Proven by another session at a TX this one has not reached yet, one TX proof brings it there
+        entries = self.verifiedTxEntries(txId)
+        if(entries.get(SET_KEY_PREFIX + identifier.encode("utf-8")) != self.makeSha256(PLAIN_VALUE_PREFIX + sha)):
+            raise VerificationException
+        return sha
+
+    def getVerifiedSha(self, identifier: str) -> bytes:
+        sha = self._cachedSha(identifier)
+        if(sha is not None):
+            return sha
+        merkleLeaf = merkle.parseMerkleIdentifier(identifier)
+        if(merkleLeaf is not None):
+            return self._getVerifiedLeafSha(*merkleLeaf)
+        verified = self.getVerified(identifier)
+        if(verified.verified != True):
+            raise VerificationException
+        self.verifiedCache.put(identifier, verified.value, verified.id)
+        return verified.value
+
+    def _cacheLeaves(self, batchId: str, shas: List[bytes]):
+        # Logs of one TX are usually read together, a proven tree serves all of them.
+        # The root was proven at or below the state this session trusts now
+        txId = self.rootService.get().txId
+        for index, sha in enumerate(shas):
+            self.verifiedCache.put(merkle.merkleIdentifier(batchId, index, sha.hex()), sha, txId)
+
+    def _getVerifiedLeafSha(self, batchId: str, index: int) -> bytes:
+        # Proves the root like any confirmation, then the leaf through its inclusion path
+        root = self.getVerifiedSha(merkle.rootKey(batchId))
+        leavesKey = merkle.leavesKey(batchId).encode("utf-8")
+        stored = self.client.getAllValues([leavesKey])
+        if(leavesKey not in stored):
+            raise VerificationException
+        shas = merkle.splitLeaves(stored[leavesKey].value)
+        if(index >= len(shas) or merkle.rootFromPath(shas[index], index, len(shas), merkle.inclusionPath(shas, index)) != root):
+            raise VerificationException
+        self._cacheLeaves(batchId, shas)
+        return shas[index]
+
     def verifyLogContent(self, log: str, logIdentifier: str) -> bool:
         try:
-            verifiedSha = self.getVerified(logIdentifier)
+            verifiedSha = self.getVerifiedSha(logIdentifier)
             toSha = log.encode("utf-8")
             shaFrom = self.makeSha256(toSha)
-            return shaFrom == verifiedSha.value and verifiedSha.verified == True
+            return shaFrom == verifiedSha
         except Exception as e:
             return False
 
     def verifyLogSha(self, logSHA: str, logIdentifier: str) -> bool:
         try:
-            verifiedSha = self.getVerified(logIdentifier)
-            strigified = binascii.hexlify(verifiedSha.value).decode("utf-8")
-            return logSHA == strigified and verifiedSha.verified == True
+            verifiedSha = self.getVerifiedSha(logIdentifier)
+            strigified = binascii.hexlify(verifiedSha).decode("utf-8")
+            return logSHA == strigified
         except Exception as e:
             return False
 
+    def verifiedTxEntries(self, txId: int) -> Dict[bytes, bytes]:
+        # Proves the whole TX once: dual proof between it and the held state, then its entries are hashed
+        # back to the proven Alh. Returns the hashed value of every key written by the TX.
+        state = self.rootService.get()
+        with IMMUDB_CALL_LATENCY.labels("verifiableTxById").time(), span("verifiableTxById"):
+            vtx = self.client.stub.VerifiableTxById(schema_pb2.VerifiableTxRequest(tx = txId, proveSinceTx = state.txId))
+        dualProof = htree.DualProofFrom(vtx.dualProof)
+        if(state.txId <= vtx.tx.metadata.id):
+            sourceId, sourceAlh = state.txId, store.DigestFrom(state.txHash)
+            targetId, targetAlh = vtx.tx.metadata.id, dualProof.targetTxMetadata.alh()
+            txAlh = targetAlh
+        else:
+            sourceId, sourceAlh = vtx.tx.metadata.id, dualProof.sourceTxMetadata.alh()
+            targetId, targetAlh = state.txId, store.DigestFrom(state.txHash)
+            txAlh = sourceAlh
+        if(not store.VerifyDualProof(dualProof, sourceId, targetId, sourceAlh, targetAlh)):
+            raise VerificationException
+        tx = store.TxFrom(vtx.tx)
+        if(tx.ID != txId or tx.Alh != txAlh):
+            raise VerificationException
+        newState = State(db = state.db, txId = targetId, txHash = targetAlh, publicKey = vtx.signature.publicKey, signature = vtx.signature.signature)
+        if(self.client.verifyingKey is not None):
+            newState.Verify(self.client.verifyingKey)
+        self.rootService.set(newState)
+        return {entry.key: entry.hValue for entry in tx.entries}
+
+    def verifyBatch(self, items: List[Tuple[str, str]]) -> List[bool]:
+        # items are (identifier, expected SHA256 hex of the content). One GetAll for the stored confirmations,
+        # then one proof per distinct TX they were written in, instead of one verifiedGet per identifier.
+        # Logs confirmed through a Merkle root need their root proven, then every tree is checked once
+        merkleLeaves = {identifier: merkle.parseMerkleIdentifier(identifier) for identifier, _ in items}
+        cachedLeaves = dict()
+        for identifier, leaf in merkleLeaves.items():
+            try:
+                sha = self._cachedSha(identifier) if leaf is not None else None
+            except Exception as e:
+                sha = None
+            if(sha is not None):
+                cachedLeaves[identifier.encode("utf-8")] = binascii.hexlify(sha).decode("utf-8")
+        keys = [merkle.rootKey(leaf[0]) if leaf is not None else identifier for identifier, leaf in merkleLeaves.items() if identifier.encode("utf-8") not in cachedLeaves]
+        provenSha = self._provenConfirmations(keys)
+        provenSha.update(self._provenLeaves({identifier: leaf for identifier, leaf in merkleLeaves.items() if leaf is not None and identifier.encode("utf-8") not in cachedLeaves}, provenSha))
+        provenSha.update(cachedLeaves)
+        return [provenSha.get(identifier.encode("utf-8")) == logSHA for identifier, logSHA in items]
+
+    def _provenLeaves(self, merkleLeaves: Dict[str, Tuple[str, int]], provenSha: Dict[bytes, str]) -> Dict[bytes, str]:
+        # One GetAll for the leaves of every tree with a proven root. A tree counts when its leaves give that root
+        batchIds = list({batchId for batchId, _ in merkleLeaves.values() if merkle.rootKey(batchId).encode("utf-8") in provenSha})
+        stored = dict()
+        for chunk in self._chunks([merkle.leavesKey(batchId).encode("utf-8") for batchId in batchIds], self.MAX_LINES_PER_TX):
+            stored.update(self.client.getAllValues(chunk))
+        shasByBatch = dict()
+        for batchId in batchIds:
+            element = stored.get(merkle.leavesKey(batchId).encode("utf-8"))
+            if(element is None):
+                continue
+            shas = merkle.splitLeaves(element.value)
+            if(binascii.hexlify(merkle.merkleRoot(shas)).decode("utf-8") == provenSha[merkle.rootKey(batchId).encode("utf-8")]):
+                shasByBatch[batchId] = shas
+                self._cacheLeaves(batchId, shas)
+        provenLeaves = dict()
+        for identifier, (batchId, index) in merkleLeaves.items():
+            shas = shasByBatch.get(batchId)
+            if(shas is not None and index < len(shas)):
+                provenLeaves[identifier.encode("utf-8")] = binascii.hexlify(shas[index]).decode("utf-8")
+        return provenLeaves
+
+    def _provenConfirmations(self, identifiers: List[str]) -> Dict[bytes, str]:
+        # Key -> SHA256 hex of every confirmation that could be proven
+        provenSha = dict()
+        for identifier in identifiers:
+            key = identifier.encode("utf-8")
+            if(key in provenSha):
+                continue
+            try:
+                sha = self._cachedSha(identifier)
+            except Exception as e:
+                sha = None
+            if(sha is not None):
+                provenSha[key] = binascii.hexlify(sha).decode("utf-8")
+        keys = list({identifier.encode("utf-8") for identifier in identifiers} - set(provenSha))
+        stored = dict()
+        for chunk in self._chunks(keys, self.MAX_LINES_PER_TX):
+            stored.update(self.client.getAllValues(chunk))
+        keysByTx = dict()
+        for key, element in stored.items():
+            keysByTx.setdefault(element.tx, []).append(key)
+        for txId, txKeys in keysByTx.items():
+            try:
+                entries = self.verifiedTxEntries(txId)
+            except Exception as e:
+                continue
+            for key in txKeys:
+                value = stored[key].value
+                if(entries.get(SET_KEY_PREFIX + key) == self.makeSha256(PLAIN_VALUE_PREFIX + value)):
+                    provenSha[key] = binascii.hexlify(value).decode("utf-8")
+                    self.verifiedCache.put(key.decode("utf-8"), value, txId)
+        return provenSha
+
 
-    def makeSha256(self, fromWhat: bytes):
+    @staticmethod
+    def makeSha256(fromWhat: bytes):
         builder = hashlib.sha256()
         builder.update(fromWhat)
         return builder.digest()
 
-    def makeStrSha256(self, fromWhat: bytes):
+    @staticmethod
+    def makeStrSha256(fromWhat: bytes):
         builder = hashlib.sha256()
         builder.update(fromWhat)
         return builder.hexdigest()
@@ -82,7 +293,8 @@ class ImmudbConfirmer:
         loghash = self.makeSha256(log.encode("utf-8"))
         return self.cryptoSet(id, loghash)
 
-    def getQueriesForAddingTags(self, startsFrom: int, logId: str, tags: List[str], insertQuery: InsertWithParamsQueryBuilder = None):
+    @staticmethod
+    def getQueriesForAddingTags(startsFrom: int, logId: str, tags: List[str], insertQuery: InsertWithParamsQueryBuilder = None):
         if(not insertQuery):
             insertQuery = InsertWithParamsQueryBuilder()
         additionalParams = dict()
@@ -92,17 +304,18 @@ class ImmudbConfirmer:
         lastIndex = 0
         for index in range(0, len(tags)):
             tagParam = f"tag{index + startsFrom}"
-            uniqueParam = f"uniqueidentifier{index + startsFrom}"
+            # Must not share names with the LOGS insert parameters of the same batch
+            uniqueParam = f"taguniqueidentifier{index + startsFrom}"
             additionalParams[tagParam] = tags[index]
             additionalParams[uniqueParam] = logId
-            insertQuery.VALUES(index + startsFrom, "uniqueidentifier", "tag")
+            insertQuery.VALUES(index + startsFrom, "taguniqueidentifier", "tag")
             lastIndex = index
         return lastIndex + startsFrom + 1, additionalParams, insertQuery
         
 
     def addLog(self, identifier: str, content: str, timeReceived: int, tags: List[str]):
         params = {
-            "log0": content,
+            "log0": encodeLog(content),
             "uniqueidentifier0": identifier,
             "createdate0": timeReceived
         }
@@ -114,41 +327,89 @@ class ImmudbConfirmer:
             params = {**params, **additionalParams}
             batchQuery.addQuery(tagsQueries.build())
 
-        return self.client.sqlExec(batchQuery.build(), params)
+        self.logCounters.begin()
+        try:
+            result = self.client.sqlExec(batchQuery.build(), params)
+        except Exception:
+            self.logCounters.end()
+            raise
+        self.logCounters.end(1, {tag: 1 for tag in set(tags)})
+        self.searchIndex.notify()
+        return result
 
     def processLogs(self, logs: List[Union[AddLogBody, str]], timeReceived: int, tags: List[str]):
+        return self.processLogEntries([(item, timeReceived, tags) for item in logs])
+
+    def processLogEntries(self, entries: List[Tuple[Union[AddLogBody, str], int, List[str]]]):
+        return self.submitPreparedLogs(self.prepareLogEntries(entries, self.knownContents))
+
+    @classmethod
+    def prepareLogEntries(cls, entries: List[Tuple[Union[AddLogBody, str], int, List[str]]], knownContents: KnownContents = None, digests: List[Tuple[str, bytes]] = None) -> PreparedLogs:
+        # Every entry carries its own receive time and tags, so logs of many requests can share one TX.
+        # Needs no session, the next TX can be built while the previous one is in flight.
+        # One pass fills the parameters, the statement text comes from the template cache.
+        # digests are digestLogs of the contents when the caller computed them already, e.g. on worker processes
         params = dict()
         identifiers = []
         confirmations = dict()
-        batchQueryBuilder = BatchQueryBuilder()
-        logsInsertQueryBuilder = InsertWithParamsQueryBuilder()
-        tagsInsertQueryBuilder = InsertWithParamsQueryBuilder()
-        logsInsertQueryBuilder.INSERT("LOGS", "log", "uniqueidentifier", "createdate")
-        lastTagsIndex = 0
-        for index in range(0, len(logs)):
-            item = logs[index]
-            if(type(item) == AddLogBody):
-                content = item.logContent
-            else:
-                content = item
-            params[f"log{index}"] = content
-            identifier = self.generateIdentifier(content)
+        tagRows = 0
+        tagCounts = dict()
+        # In merkle mode the TX gets one root over the SHA256 of its logs and identifiers name their leaf
+        batchId = merkle.newBatchId() if merkle.confirmationMode == "merkle" else None
+        contents = [item.logContent if type(item) == AddLogBody else item for item, _, _ in entries]
+        if(digests is None):
+            digests = digestLogs(contents, batchId is None)
+        newContents = dict()
+        for index in range(0, len(entries)):
+            _, timeReceived, tags = entries[index]
+            content = contents[index]
+            identifier, sha = digests[index]
+            if(batchId is not None):
+                identifier = merkle.merkleIdentifier(batchId, index, sha.hex())
             identifiers.append(identifier)
+            # Stored possibly compressed or as a reference, the confirmation is over the content as sent.
+            # Logs not longer than a reference stay inline
+            stored = encodeLog(content)
+            if(logcodec.dedup and len(stored) > logcodec.REFERENCE_LENGTH):
+                shaHex = sha.hex()
+                params[f"log{index}"] = referenceLog(shaHex)
+                if(shaHex not in newContents and (knownContents is None or shaHex not in knownContents)):
+                    params[f"contentsha{len(newContents)}"] = shaHex
+                    params[f"contentlog{len(newContents)}"] = stored
+                    newContents[shaHex] = True
+            else:
+                params[f"log{index}"] = stored
             params[f"uniqueidentifier{index}"] = identifier
             params[f"createdate{index}"] = timeReceived
-            logsInsertQueryBuilder.VALUES(index, "log", "uniqueidentifier", "createdate")
-            confirmations[identifier.encode("utf-8")] = self.makeSha256(content.encode("utf-8"))
-            if(len(tags) > 0):
-                lastTagsIndex, additionalParams, tagsQueries = self.getQueriesForAddingTags(lastTagsIndex, identifier, tags, tagsInsertQueryBuilder)
-                params = {**params, **additionalParams}
-        
-        batchQueryBuilder.addQuery(logsInsertQueryBuilder.build())
-        if(len(tags) > 0):
-            batchQueryBuilder.addQuery(tagsInsertQueryBuilder.build())
-
-        self.client.sqlExec(batchQueryBuilder.build(), params)
-        self.client.setAll(confirmations)
-        return identifiers
+            confirmations[identifier.encode("utf-8")] = sha
+            for tag in list(set(tags)):
+                # Must not share names with the LOGS insert parameters of the same batch
+                params[f"tag{tagRows}"] = tag
+                params[f"taguniqueidentifier{tagRows}"] = identifier
+                tagRows += 1
+                tagCounts[tag] = tagCounts.get(tag, 0) + 1
+        if(batchId is not None and len(confirmations) > 0):
+            shas = list(confirmations.values())
+            confirmations = {merkle.rootKey(batchId).encode("utf-8"): merkle.merkleRoot(shas), merkle.leavesKey(batchId).encode("utf-8"): b"".join(shas)}
+        return PreparedLogs(logsBatchTemplate(len(entries), tagRows, len(newContents)), params, confirmations, identifiers, tagCounts, list(newContents.keys()))
+
+    def submitPreparedLogs(self, prepared: PreparedLogs) -> List[str]:
+        self.logCounters.begin()
+        try:
+            self.client.sqlExec(prepared.query, prepared.params)
+        except Exception:
+            self.logCounters.end()
+            raise
+        self.logCounters.end(len(prepared.identifiers), prepared.tagCounts)
+        self.searchIndex.notify()
+        self.knownContents.addAll(prepared.contents)
+        self.client.setAll(prepared.confirmations)
+        return prepared.identifiers
+
+    @classmethod
+    def linesForEntry(cls, tags: List[str]) -> int:
+        # With dedup every log may bring its content row
+        return 1 + len(set(tags)) + (1 if logcodec.dedup else 0)
 
     def processLogRequest(self, newLog: AddLogRequest):
         result = self.processLogs([newLog.logContent], int(time.time() * 1000), newLog.tags)
@@ -161,11 +422,14 @@ class ImmudbConfirmer:
         for i in range(0, len(lst), n):
             yield lst[i:i + n]
 
-    def processLogsRequest(self, newLogs: AddLogsRequest):
+    @classmethod
+    def chunkSize(cls, tags: List[str]) -> int:
         # Internal constraint of immudb. max 512 lines in one TX.
+        return int(cls.MAX_LINES_PER_TX / cls.linesForEntry(tags))
+
+    def processLogsRequest(self, newLogs: AddLogsRequest):
         allIdentifiers = []
-        chunks = int(1024 / (len(newLogs.tags) + 1))
-        for chunk in self._chunks(newLogs.logs, chunks):
+        for chunk in self._chunks(newLogs.logs, self.chunkSize(newLogs.tags)):
             allIdentifiers.extend(self.processLogs(chunk, int(time.time() * 1000), newLogs.tags))
         return allIdentifiers
 
@@ -173,82 +437,215 @@ class ImmudbConfirmer:
         result = self.client.sqlQuery("SELECT tag FROM TAGS WHERE uniqueidentifier=@identifier", {"identifier": identifier})
         return [item[0] for item in result]        
 
-    def _createLogQuery(self, lastId: int, limit: int, tagsFilter: List[str]):
+    def getTagsForIdentifiers(self, identifiers: List[str]) -> Dict[str, List[str]]:
+        tagsByIdentifier = {identifier: [] for identifier in identifiers}
+        with span("tagsQuery"):
+            for chunk in self._chunks(list(tagsByIdentifier.keys()), self.TAGS_BATCH_SIZE):
+                params = dict()
+                conditionBuilder = ConditionBuilder()
+                for index in range(0, len(chunk)):
+                    identifierParam = f"identifier{index}"
+                    params[identifierParam] = chunk[index]
+                    conditionBuilder.OR(Condition("uniqueidentifier", ComparisionOperator.eq, f"@{identifierParam}"))
+                query = LogQueryBuilder().SELECT("uniqueidentifier", "tag").FROM("TAGS").WHERE_CONDITION(conditionBuilder.build()).build()
+                for item in self.client.sqlQuery(query, params):
+                    tagsByIdentifier[item[0]].append(item[1])
+        return tagsByIdentifier
+
+    def _createLogQuery(self, lastId: int, limit: int, tagsFilter: List[str], createdFrom: int = 0, createdTo: int = 0, lastCreated: int = 0):
         builder = LogQueryBuilder()
-        builder = builder.SELECT("log", "uniqueidentifier", "createdate", "id").FROM("LOGS")
+        builder = builder.SELECT("LOGS.log", "LOGS.uniqueidentifier", "LOGS.createdate", "LOGS.id").FROM("LOGS")
         query = ""
         additionalParams = dict()
         conditionBuilder = ConditionBuilder()
 
-        if(len(tagsFilter) > 0):
-            builder.JOIN("TAGS", "LOGS.uniqueidentifier", "TAGS.uniqueidentifier")
-            for index in range(0, len(tagsFilter)):
-                tagIdentifier = f"tag{index}"
-                additionalParams[tagIdentifier] = tagsFilter[index]
-                conditionBuilder.OR(Condition("TAGS.tag", ComparisionOperator.eq, f"@{tagIdentifier}"))
+        # One TAGS join per requested tag, so only logs carrying all of them come back. (uniqueidentifier, tag)
+        # is the TAGS primary key, every join matches at most once and LIMIT counts distinct logs
+        for index, tag in enumerate(dict.fromkeys(tagsFilter)):
+            alias = f"tags{index}"
+            tagIdentifier = f"tag{index}"
+            builder.JOIN(f"TAGS AS {alias}", "LOGS.uniqueidentifier", f"{alias}.uniqueidentifier")
+            additionalParams[tagIdentifier] = tag
+            conditionBuilder.AND(Condition(f"{alias}.tag", ComparisionOperator.eq, f"@{tagIdentifier}"))
+        # Milliseconds, from inclusive and to exclusive. A range is read in createdate order, so immudb scans the
+        # createdate index between its bounds instead of every newer row of the id order
+        ranged = createdFrom > 0 or createdTo > 0
+        if(createdFrom > 0):
+            additionalParams["createdfrom"] = createdFrom
+            conditionBuilder.LEFT_AND(Condition("LOGS.createdate", ComparisionOperator.ge, "@createdfrom"))
+        if(createdTo > 0):
+            additionalParams["createdto"] = createdTo
+            conditionBuilder.LEFT_AND(Condition("LOGS.createdate", ComparisionOperator.lt, "@createdto"))
+        if(ranged and lastId > 0):
+            # The index holds (createdate, id), rows of the cursor's createdate continue below its id
+            additionalParams["lastcreated"] = lastCreated
+            conditionBuilder.LEFT_AND(ORCondition(Condition("LOGS.createdate", ComparisionOperator.lt, "@lastcreated"), Condition("LOGS.id", ComparisionOperator.lt, lastId)))
+            conditionBuilder.LEFT_AND(Condition("LOGS.createdate", ComparisionOperator.le, "@lastcreated"))
+        elif(lastId > 0):
+            conditionBuilder.LEFT_AND(Condition("LOGS.id", ComparisionOperator.lt, lastId))
+        builded = conditionBuilder.build()
+        if(not type(builded) == EmptyCondition):
+            builder.WHERE_CONDITION(builded)
+        builder.ORDER_BY("LOGS.createdate" if ranged else "LOGS.id", "DESC")
         if(limit >= 1):
-            builded = conditionBuilder.build()
-            if(not type(builded) == EmptyCondition):
-                builder.WHERE_CONDITION(conditionBuilder.build())
-            builder.ORDER_BY("id", "DESC")
             builder.LIMIT(limit)
         else:
-            if(lastId > 0):
-                conditionBuilder.LEFT_AND(Condition("id", ComparisionOperator.lt, lastId))
-            builded = conditionBuilder.build()
-            if(not type(builded) == EmptyCondition):
-                builder.WHERE_CONDITION(conditionBuilder.build())
-                
-            builder.ORDER_BY("id", "DESC")
-            builder.LIMIT(256)
+            builder.LIMIT(self.PAGE_SIZE)
         query = builder.build()
         return additionalParams, query
 
-    def getLastLogs(self, limit: int, verify: bool = False, tagsFilter: List[str] = []):
-        formattedResult = []
-        hasNext = True
-        lastId = 0
-        while hasNext:
-            if(limit >= 1):
-                hasNext = False
-            additionalParams, query = self._createLogQuery(lastId, limit, tagsFilter)
-            result = self.client.sqlQuery(query, additionalParams)
+    def readContents(self, stored: List[str]) -> List[str]:
+        return [decodeLog(value) for value in self.resolveReferences(stored)]
+
+    def resolveReferences(self, stored: List[str]) -> List[str]:
+        # Logs.log values with references replaced by their Contents.log, one CONTENTS query per TAGS_BATCH_SIZE of them
+        references = [referencedSha(value) for value in stored]
+        shas = list(dict.fromkeys(sha for sha in references if sha is not None))
+        referenced = dict()
+        if(len(shas) > 0):
+            with span("contentsQuery"):
+                for chunk in self._chunks(shas, self.TAGS_BATCH_SIZE):
+                    params = dict()
+                    conditionBuilder = ConditionBuilder()
+                    for index in range(0, len(chunk)):
+                        params[f"sha{index}"] = chunk[index]
+                        conditionBuilder.OR(Condition("sha", ComparisionOperator.eq, f"@sha{index}"))
+                    query = LogQueryBuilder().SELECT("sha", "log").FROM("CONTENTS").WHERE_CONDITION(conditionBuilder.build()).build()
+                    for sha, content in self.client.sqlQuery(query, params):
+                        referenced[sha] = content
+        # A reference without its content is a log sent with the marker while dedup was off, it reads back as sent
+        return [referenced.get(sha, value) if sha is not None else value for value, sha in zip(stored, references)]
+
+    def _formatLogs(self, result: list, verify: bool) -> List[LogRecord]:
+        # One tags query per page instead of one per row, rows already match the tags filter
+        tagsByIdentifier = self.getTagsForIdentifiers([item[1] for item in result])
+        contents = self.readContents([item[0] for item in result])
+        formattedResult = [
+            LogRecord(content, item[1], item[2], tagsByIdentifier[item[1]], False)
+            for item, content in zip(result, contents)
+        ]
+        if(verify and len(formattedResult) > 0):
+            with span("verify"):
+                verified = self.verifyBatch([(log.uniqueidentifier, self.makeStrSha256(log.log.encode("utf-8"))) for log in formattedResult])
+            for log, logVerified in zip(formattedResult, verified):
+                log.verified = logVerified
+        return formattedResult
 
-            distinctWorkaroundDict = dict()
+    def iterLogPages(self, limit: int, verify: bool = False, tagsFilter: List[str] = [], lastId: int = 0, pageSize: int = 0, createdFrom: int = 0, createdTo: int = 0, lastCreated: int = 0):
+        # Walks LOGS from newest to oldest starting below lastId, by createdate then id when a range is given.
+        # Yields (logs, lastId, lastCreated, hasNext) for every page, where lastId and lastCreated are the cursor of
+        # the last scanned row and hasNext tells if rows below it may still match.
+        if(pageSize < 1):
+            pageSize = self.PAGE_SIZE
+        remaining = limit
+        while True:
+            pageLimit = pageSize
+            if(limit >= 1):
+                pageLimit = min(pageSize, remaining)
+            additionalParams, query = self._createLogQuery(lastId, pageLimit, tagsFilter, createdFrom, createdTo, lastCreated)
+            with span("logQuery"):
+                result = self.client.sqlQuery(query, additionalParams)
             if(len(result) == 0):
-                hasNext = False
-                continue
+                return
             lastId = result[-1][3]
-            for item in result:
-                verified = False
-                if(verify):
-                    verified = self.verifyLogContent(item[0], item[1])
-
-                # I couldn't find possibility to fetch tags in one query. Strange behaviour of GROUP BY and select
-                # DISTINCT not implemented in SQL Querys
-                identifier = item[1]
-                tags = self.getTags(identifier)
-                if(len(tagsFilter) > 0):
-                    if(all(tag in tags for tag in tagsFilter)):
-                        if(distinctWorkaroundDict.get(identifier, False) == False):
-                            distinctWorkaroundDict[identifier] = True
-                            formattedResult.append(
-                                LogResponse(log = item[0], uniqueidentifier = identifier, createdate = item[2], tags = tags, verified = verified)
-                            )
-                else:
-                    formattedResult.append(
-                        LogResponse(log = item[0], uniqueidentifier = identifier, createdate = item[2], tags = tags, verified = verified)
-                    )
-
+            # Only ranged reads are ordered by createdate, their cursors carry it
+            lastCreated = result[-1][2] if(createdFrom > 0 or createdTo > 0) else 0
+            remaining = remaining - len(result)
+            hasNext = len(result) == pageLimit
+            yield self._formatLogs(result, verify), lastId, lastCreated, hasNext
+            if(not hasNext or (limit >= 1 and remaining <= 0)):
+                return
+
+    def getLogsPage(self, limit: int, verify: bool = False, tagsFilter: List[str] = [], lastId: int = 0, createdFrom: int = 0, createdTo: int = 0, lastCreated: int = 0):
+        # Returns logs, the id to continue from, 0 when there is nothing more to read, and its createdate
+        formattedResult = []
+        nextLastId = 0
+        nextLastCreated = 0
+        pageSize = limit if limit >= 1 else self.PAGE_SIZE
+        for logs, pageLastId, pageLastCreated, hasNext in self.iterLogPages(limit, verify, tagsFilter, lastId, pageSize, createdFrom, createdTo, lastCreated):
+            formattedResult.extend(logs)
+            nextLastId, nextLastCreated = (pageLastId, pageLastCreated) if hasNext else (0, 0)
+        return formattedResult, nextLastId, nextLastCreated
+
+    def _getLogsByIds(self, ids: List[int]) -> list:
+        # One query per TAGS_BATCH_SIZE ids, every id nests one more OR condition
+        rows = []
+        for chunk in self._chunks(list(ids), self.TAGS_BATCH_SIZE):
+            params = dict()
+            conditionBuilder = ConditionBuilder()
+            for index in range(0, len(chunk)):
+                params[f"id{index}"] = chunk[index]
+                conditionBuilder.OR(Condition("id", ComparisionOperator.eq, f"@id{index}"))
+            query = LogQueryBuilder().SELECT("log", "uniqueidentifier", "createdate", "id").FROM("LOGS").WHERE_CONDITION(conditionBuilder.build()).build()
+            rows.extend(self.client.sqlQuery(query, params))
+        return sorted(rows, key = lambda row: row[3], reverse = True)
+
+    def searchLogsPage(self, query: SearchQuery, limit: int, verify: bool = False, lastId: int = 0):
+        # Logs above the last indexed id, all of them while the index is built or after it was dropped, are read
+        # from LOGS and matched here. Older ones come from the local index candidates. The returned rows and their
+        # verification come from immudb. Returns logs and the id to continue from, 0 when there is nothing more to read
+        coveredId = self.searchIndex.lastIndexedId
+        found = []
+        if(lastId == 0 or lastId > coveredId + 1):
+            with span("searchScan"):
+                found = self._scanLogs(query, limit, coveredId, lastId)
+        candidates = self.searchIndex.candidates(query.tokens(), min(lastId, coveredId + 1) if lastId > 0 else coveredId + 1)
+        while(len(found) < limit):
+            # Terms match every candidate, phrases are checked on the content so candidates go in pages
+            batch = list(islice(candidates, self.PAGE_SIZE if query.needsContent() else limit - len(found)))
+            if(len(batch) == 0):
+                return self._formatLogs(found, verify), 0
+            rows = self._getLogsByIds(batch)
+            if(query.needsContent()):
+                rows = [row for row, content in zip(rows, self.readContents([row[0] for row in rows])) if query.matches(content)]
+            found.extend(rows)
+        found = found[0:limit]
+        return self._formatLogs(found, verify), found[-1][3]
+
+    def _scanLogs(self, query: SearchQuery, limit: int, aboveId: int, belowId: int) -> list:
+        # Rows with aboveId < id < belowId (no upper bound when belowId is 0) holding the query, newest first
+        found = []
+        while(len(found) < limit):
+            params = {"aboveid": aboveId}
+            conditionBuilder = ConditionBuilder()
+            conditionBuilder.AND(Condition("id", ComparisionOperator.gt, "@aboveid"))
+            if(belowId > 0):
+                params["belowid"] = belowId
+                conditionBuilder.AND(Condition("id", ComparisionOperator.lt, "@belowid"))
+            sqlQuery = LogQueryBuilder().SELECT("log", "uniqueidentifier", "createdate", "id").FROM("LOGS").WHERE_CONDITION(conditionBuilder.build()).ORDER_BY("id", "DESC").LIMIT(self.PAGE_SIZE).build()
+            rows = self.client.sqlQuery(sqlQuery, params)
+            found.extend(row for row, content in zip(rows, self.readContents([row[0] for row in rows])) if query.matches(content))
+            if(len(rows) < self.PAGE_SIZE):
+                break
+            belowId = rows[-1][3]
+        return found
+
+    def getLastLogs(self, limit: int, verify: bool = False, tagsFilter: List[str] = [], createdFrom: int = 0, createdTo: int = 0):
+        formattedResult, _, _ = self.getLogsPage(limit, verify, tagsFilter, 0, createdFrom, createdTo)
         return formattedResult
 
     def getLogCount(self):
+        total, _ = self.logCounters.get(self)
+        return total
+
+    def getLogCounts(self, tags: List[str]) -> Tuple[int, Dict[str, int]]:
+        # Served from memory, the table is only read when the counters are loaded or checked
+        return self.logCounters.get(self, tags)
+
+    def countLogsInTable(self) -> int:
         toRet = self.client.sqlQuery("SELECT COUNT() FROM LOGS")
         if(len(toRet) > 0 and len(toRet[0]) > 0):
             return toRet[0][0]
         else:
             return -1
 
+    def countTagInTable(self, tag: str) -> int:
+        toRet = self.client.sqlQuery("SELECT COUNT() FROM TAGS WHERE tag=@tag", {"tag": tag})
+        if(len(toRet) > 0 and len(toRet[0]) > 0):
+            return toRet[0][0]
+        else:
+            return 0
+
     # Move to external migration
     def createTables(self):
         self.client.sqlExec("""CREATE TABLE IF NOT EXISTS Logs(
@@ -270,6 +667,18 @@ class ImmudbConfirmer:
             tag VARCHAR[64] NOT NULL,
             PRIMARY KEY (uniqueidentifier, tag)
         )""")
+        # Distinct log contents when LOG_DEDUP is on, Logs.log then holds a reference to them
+        self.client.sqlExec("""
+        CREATE TABLE IF NOT EXISTS Contents(
+            sha VARCHAR[64] NOT NULL,
+            log VARCHAR[4096] NOT NULL,
+            PRIMARY KEY (sha)
+        )""")
+        # Own try, the block above stops at the first index that already exists
+        try:
+            self.client.sqlExec("""CREATE INDEX ON Logs(createdate);""")
+        except:
+            pass
 
 
 
@@ -0,0 +1,258 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from itertools import chain
+from typing import Deque, Dict, Iterator, List, Optional
+
+from .immudb import ImmudbConfirmer
+from .pool import ImmudbConfirmerPool
+from ..metrics import INGEST_DROPPED_BATCHES, INGEST_DROPPED_LOGS, INGEST_REJECTED_LOGS, INGEST_REQUEUED_BATCHES
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+@dataclass
+class PendingLog:
+    sequence: int
+    content: str
+    timeReceived: int
+    tags: List[str]
+    lines: int
+    enqueuedAt: float
+
+
+class IngestQueue:
+    # Write-behind queue for logs nobody waits for. Every accepted request is appended to the spool
+    # before it is acknowledged, a single flusher groups pending logs of many requests into one
+    # immudb TX and marks the spool record as acked once all of its logs are committed.
+    # Delivery is at-least-once: a record that was only partially committed before a crash is replayed whole.
+    # At most maxPendingLogs logs wait, put raises IngestQueueFull beyond that. A batch failing maxAttempts times
+    # goes back to the front of the queue and the flusher pauses, doubling the pause up to maxRetryDelay.
+    # Once the spool is over spoolCompactBytes it is rewritten with only the logs not committed yet.
+    def __init__(self, pool: ImmudbConfirmerPool, spoolPath: Optional[str] = None, maxBatchLines: int = ImmudbConfirmer.MAX_LINES_PER_TX, maxLinger: float = 0.05, fsync: bool = False, maxAttempts: int = 3, retryDelay: float = 1, maxPendingLogs: int = 100000, spoolCompactBytes: int = 64 * 1024 * 1024, maxRetryDelay: float = 30):
+        self.pool = pool
+        self.spoolPath = spoolPath
+        self.maxBatchLines = max(1, min(maxBatchLines, ImmudbConfirmer.MAX_LINES_PER_TX))
+        self.maxLinger = maxLinger
+        self.fsync = fsync
+        self.maxAttempts = maxAttempts
+        self.retryDelay = retryDelay
+        self.maxPendingLogs = maxPendingLogs
+        self.spoolCompactBytes = spoolCompactBytes
+        self.maxRetryDelay = maxRetryDelay
+        self.pending: Deque[PendingLog] = deque()
+        self.pendingLines = 0
+        # Taken from pending by the flusher and not committed yet
+        self.committing: List[PendingLog] = []
+        # spool sequence -> logs of that record not committed yet
+        self.outstanding: Dict[int, int] = dict()
+        self.failures = 0
+        self.resumeAt = 0
+        self.sequence = 0
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.spool = None
+        self.committedBatches = 0
+        self.committedLogs = 0
+        self.droppedBatches = 0
+        self.droppedLogs = 0
+        self.requeuedBatches = 0
+        self.rejectedLogs = 0
+        self.compactions = 0
+
+    def start(self):
+        if(self.running):
+            return
+        if(self.spoolPath):
+            os.makedirs(os.path.dirname(os.path.abspath(self.spoolPath)), exist_ok = True)
+            self._replaySpool()
+            self.spool = open(self.spoolPath, "a", encoding="utf-8")
+        self.running = True
+        self.thread = threading.Thread(target = self._run, name = "immulogger-ingest", daemon = True)
+        self.thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if(self.thread):
+            self.thread.join(timeout)
+            self.thread = None
+        if(self.spool):
+            self.spool.close()
+            self.spool = None
+
+    def put(self, logs: List[str], tags: List[str], timeReceived: int) -> int:
+        if(len(logs) == 0):
+            return 0
+        with self.condition:
+            if(not self.running):
+                raise RuntimeError("Ingest queue is not running")
+            # A request bigger than the bound still gets in when nothing waits, so it is never refused for good
+            if(len(self.pending) > 0 and len(self.pending) + len(logs) > self.maxPendingLogs):
+                self.rejectedLogs += len(logs)
+                INGEST_REJECTED_LOGS.inc(len(logs))
+                raise IngestQueueFull(f"{len(self.pending)} logs are already waiting for immudb")
+            self.sequence += 1
+            record = {"seq": self.sequence, "time": timeReceived, "tags": tags, "logs": logs}
+            self._writeSpool(record)
+            self._enqueue(record)
+            self.condition.notify()
+            return self.sequence
+
+    def depth(self) -> int:
+        with self.condition:
+            return len(self.pending)
+
+    def _enqueue(self, record: dict):
+        now = time.monotonic()
+        lines = ImmudbConfirmer.linesForEntry(record["tags"])
+        self.outstanding[record["seq"]] = len(record["logs"])
+        for content in record["logs"]:
+            self.pending.append(PendingLog(record["seq"], content, record["time"], record["tags"], lines, now))
+        self.pendingLines += lines * len(record["logs"])
+
+    def _writeSpool(self, record: dict):
+        if(not self.spool):
+            return
+        self.spool.write(json.dumps(record) + "\n")
+        self.spool.flush()
+        if(self.fsync):
+            os.fsync(self.spool.fileno())
+
+    def _readSpool(self) -> Iterator[dict]:
+        with open(self.spoolPath, "r", encoding="utf-8") as spool:
+            for line in spool:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn last line of a crashed write, the request was never acknowledged
+                    continue
+                yield record
+
+    def _rewriteSpool(self, records: Iterator[dict]):
+        temporaryPath = self.spoolPath + ".tmp"
+        with open(temporaryPath, "w", encoding="utf-8") as spool:
+            for record in records:
+                spool.write(json.dumps(record) + "\n")
+            spool.flush()
+            os.fsync(spool.fileno())
+        os.replace(temporaryPath, self.spoolPath)
+
+    def _replaySpool(self):
+        # Two passes, only acked sequence numbers are held while records stream from the old spool into the compacted one
+        if(not os.path.exists(self.spoolPath)):
+            return
+        acked = {record["ack"] for record in self._readSpool() if "ack" in record}
+
+        def unacked() -> Iterator[dict]:
+            for record in self._readSpool():
+                if("ack" not in record and record["seq"] not in acked):
+                    self._enqueue(record)
+                    self.sequence = max(self.sequence, record["seq"])
+                    yield record
+        self._rewriteSpool(unacked())
+
+    def _compactSpool(self):
+        # Every record below the oldest outstanding sequence is acked, so the spool is rewritten from the logs
+        # still in memory: partially committed records keep only their uncommitted logs
+        records: Dict[int, dict] = dict()
+        for entry in chain(self.committing, self.pending):
+            record = records.get(entry.sequence)
+            if(record is None):
+                record = records[entry.sequence] = {"seq": entry.sequence, "time": entry.timeReceived, "tags": entry.tags, "logs": []}
+            record["logs"].append(entry.content)
+        self.spool.close()
+        self._rewriteSpool(records[sequence] for sequence in sorted(records))
+        self.spool = open(self.spoolPath, "a", encoding="utf-8")
+        self.compactions += 1
+
+    def _nextBatch(self) -> Optional[List[PendingLog]]:
+        with self.condition:
+            while(self.running and len(self.pending) == 0):
+                self.condition.wait()
+            if(len(self.pending) == 0):
+                return None
+            # Paused after a batch was put back, a stop flushes right away
+            while(self.running):
+                remaining = self.resumeAt - time.monotonic()
+                if(remaining <= 0):
+                    break
+                self.condition.wait(remaining)
+            # Linger from the oldest pending log, a full batch or a stop flushes right away
+            while(self.running and self.pendingLines < self.maxBatchLines):
+                remaining = self.pending[0].enqueuedAt + self.maxLinger - time.monotonic()
+                if(remaining <= 0):
+                    break
+                self.condition.wait(remaining)
+            batch = []
+            lines = 0
+            while(len(self.pending) > 0 and (len(batch) == 0 or lines + self.pending[0].lines <= self.maxBatchLines)):
+                entry = self.pending.popleft()
+                lines += entry.lines
+                batch.append(entry)
+            self.pendingLines -= lines
+            self.committing = batch
+            return batch
+
+    def _run(self):
+        while(True):
+            batch = self._nextBatch()
+            if(batch is None):
+                return
+            self._commit(batch)
+
+    def _commit(self, batch: List[PendingLog]):
+        for attempt in range(0, self.maxAttempts):
+            try:
+                with self.pool.session() as client:
+                    client.processLogEntries([(entry.content, entry.timeReceived, entry.tags) for entry in batch])
+            except Exception as e:
+                print(f"Ingest batch of {len(batch)} logs failed (attempt {attempt + 1}/{self.maxAttempts})", e)
+                if(attempt + 1 < self.maxAttempts):
+                    time.sleep(self.retryDelay)
+                continue
+            # Outside the try, a spool error after the commit must not commit the batch again
+            self._ack(batch)
+            return
+        with self.condition:
+            self.committing = []
+            if(self.running):
+                self.failures += 1
+                self.resumeAt = time.monotonic() + min(self.retryDelay * 2 ** self.failures, self.maxRetryDelay)
+                self.pending.extendleft(reversed(batch))
+                self.pendingLines += sum(entry.lines for entry in batch)
+                self.requeuedBatches += 1
+                INGEST_REQUEUED_BATCHES.inc()
+                print(f"Ingest batch of {len(batch)} logs put back, next try in {self.resumeAt - time.monotonic():.1f}s")
+                return
+            # Stopping, left unacked in the spool and the next start replays it. Without a spool the logs are lost
+            self.droppedBatches += 1
+            self.droppedLogs += len(batch)
+        INGEST_DROPPED_BATCHES.inc()
+        INGEST_DROPPED_LOGS.inc(len(batch))
+        print(f"Ingest batch of {len(batch)} logs dropped on stop" + (" until restart" if self.spool else ", no spool to replay it from"))
+
+    def _ack(self, batch: List[PendingLog]):
+        with self.condition:
+            self.committing = []
+            self.failures = 0
+            self.committedBatches += 1
+            self.committedLogs += len(batch)
+            for entry in batch:
+                self.outstanding[entry.sequence] -= 1
+                if(self.outstanding[entry.sequence] == 0):
+                    del self.outstanding[entry.sequence]
+                    self._writeSpool({"ack": entry.sequence})
+            if(self.spool and len(self.outstanding) == 0):
+                # Everything is in immudb, start the spool over
+                self.spool.truncate(0)
+                self.spool.seek(0)
+            elif(self.spool and self.spool.tell() > self.spoolCompactBytes):
+                self._compactSpool()
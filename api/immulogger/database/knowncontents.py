@@ -0,0 +1,36 @@
+import threading
+from collections import OrderedDict
+from typing import List
+
+
+class KnownContents:
+    # LRU of SHA256 hex of log contents already stored in CONTENTS. Logs with one of them only get a reference row,
+    # others write their content in the same TX. Contents are never removed, so a known one stays known
+    def __init__(self, maxSize: int = 65536):
+        self.maxSize = maxSize
+        self.entries: "OrderedDict[str, None]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, sha: str) -> bool:
+        with self.lock:
+            if(sha not in self.entries):
+                return False
+            self.entries.move_to_end(sha)
+            return True
+
+    def addAll(self, shas: List[str]):
+        if(self.maxSize < 1):
+            return
+        with self.lock:
+            for sha in shas:
+                self.entries[sha] = None
+                self.entries.move_to_end(sha)
+            while(len(self.entries) > self.maxSize):
+                self.entries.popitem(last = False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,59 @@
+import base64
+import binascii
+import zlib
+from typing import Optional
+
+from ..config.config import LOG_COMPRESSION, LOG_COMPRESSION_MIN_SIZE, LOG_DEDUP
+
+# Size of the Logs.log column, what is stored has to fit in it
+STORED_LOG_LENGTH = 4096
+# Stored values starting with it may be encoded, the next character names the codec. Sent logs may only start with it
+# while neither compression nor dedup is on, rows written then are read back as they were sent
+CODEC_MARKER = "\x01"
+ZLIB_CODEC = "z"
+# The content is in CONTENTS under the SHA256 hex that follows
+REFERENCE_CODEC = "s"
+REFERENCE_LENGTH = 2 + 64
+
+compression = LOG_COMPRESSION
+compressionMinSize = LOG_COMPRESSION_MIN_SIZE
+dedup = LOG_DEDUP
+
+
+def encodingEnabled() -> bool:
+    return compression == "zlib" or dedup
+
+
+def encodeLog(content: str) -> str:
+    # Value for the Logs.log column. Logs that do not get shorter are stored as sent, so raw logs always fit
+    if(compression != "zlib" or len(content) < compressionMinSize):
+        return content
+    encoded = CODEC_MARKER + ZLIB_CODEC + base64.b64encode(zlib.compress(content.encode("utf-8"))).decode("ascii")
+    if(len(encoded) >= len(content)):
+        return content
+    return encoded
+
+
+def referenceLog(sha: str) -> str:
+    return CODEC_MARKER + REFERENCE_CODEC + sha
+
+
+def referencedSha(stored: str) -> Optional[str]:
+    if(stored.startswith(CODEC_MARKER + REFERENCE_CODEC)):
+        return stored[2:]
+    return None
+
+
+def decodeLog(stored: str) -> str:
+    # Plain content of a Logs.log or Contents.log value, whatever mode it was written with. References have to be resolved first.
+    # A value that does not decode is returned as stored, it is a log sent with the marker while encoding was off
+    if(not stored.startswith(CODEC_MARKER + ZLIB_CODEC)):
+        return stored
+    try:
+        return zlib.decompress(base64.b64decode(stored[2:], validate = True)).decode("utf-8")
+    except (binascii.Error, zlib.error, UnicodeDecodeError):
+        return stored
+
+
+def fitsStorage(content: str) -> bool:
+    return len(content) <= STORED_LOG_LENGTH or len(encodeLog(content)) <= STORED_LOG_LENGTH
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class LogCounters:
+    # Total logs and logs per tag, kept in memory and bumped by every commit of this process.
+    # Tags are tracked once asked for. Every reconcileInterval seconds the numbers are checked against
+    # COUNT() queries, which also picks up logs written by other replicas. A check only replaces the numbers
+    # when no commit of this process ran while it was querying, otherwise it is retried retryDelay seconds later,
+    # so reads during sustained ingest do not query on every call.
+    # At most maxTags tags are tracked, the least recently asked for is forgotten first, which also bounds the
+    # COUNT() queries of one check. Loads and checks run one at a time under loadLock.
+    def __init__(self, reconcileInterval: float = 60, retryDelay: float = 1, maxTags: int = 1024):
+        self.reconcileInterval = reconcileInterval
+        self.retryDelay = retryDelay
+        self.maxTags = maxTags
+        self.total: Optional[int] = None
+        self.tags: OrderedDict[str, int] = OrderedDict()
+        self.inFlight = 0
+        self.generation = 0
+        self.lastReconciled = 0
+        self.lock = threading.Lock()
+        self.loadLock = threading.Lock()
+        self.reconciles = 0
+        self.drifts = 0
+
+    def begin(self):
+        with self.lock:
+            self.inFlight += 1
+
+    def end(self, logs: int = 0, tagCounts: Dict[str, int] = {}):
+        # logs is 0 when the commit failed
+        with self.lock:
+            self.inFlight -= 1
+            if(logs == 0):
+                return
+            self.generation += 1
+            if(self.total is not None):
+                self.total += logs
+            for tag, count in tagCounts.items():
+                if(tag in self.tags):
+                    self.tags[tag] += count
+
+    def _stableSince(self, generation: int) -> bool:
+        return self.inFlight == 0 and self.generation == generation
+
+    def _retrySoon(self):
+        # Next check after retryDelay instead of reconcileInterval
+        self.lastReconciled = time.time() - self.reconcileInterval + min(self.retryDelay, self.reconcileInterval)
+
+    def _reconcileDue(self) -> bool:
+        return self.total is None or time.time() > self.lastReconciled + self.reconcileInterval
+
+    def get(self, confirmer, tags: List[str] = []) -> Tuple[int, Dict[str, int]]:
+        if(self.total is None):
+            # Concurrent first calls wait for one load instead of each running it
+            with self.loadLock:
+                if(self.total is None):
+                    self.reconcile(confirmer)
+        elif(self._reconcileDue() and self.loadLock.acquire(blocking = False)):
+            # A check already running elsewhere is not waited for, the numbers in memory are served meanwhile
+            try:
+                if(self._reconcileDue()):
+                    self.reconcile(confirmer)
+            finally:
+                self.loadLock.release()
+        counts = dict()
+        missing = []
+        with self.lock:
+            for tag in tags:
+                if(tag in self.tags):
+                    self.tags.move_to_end(tag)
+                    counts[tag] = self.tags[tag]
+                else:
+                    missing.append(tag)
+        if(len(missing) > 0):
+            with self.loadLock:
+                counts.update(self._load(confirmer, missing))
+        with self.lock:
+            return self.total, {tag: counts[tag] for tag in tags}
+
+    def reconcile(self, confirmer):
+        # Callers hold loadLock
+        with self.lock:
+            generation = self.generation
+            stable = self.inFlight == 0
+            tags = list(self.tags.keys())
+        total = confirmer.countLogsInTable()
+        tagCounts = {tag: confirmer.countTagInTable(tag) for tag in tags}
+        with self.lock:
+            stable = stable and self._stableSince(generation)
+            if(not stable and self.total is not None):
+                self._retrySoon()
+                return
+            # Tags forgotten while the queries ran stay forgotten
+            tagCounts = {tag: count for tag, count in tagCounts.items() if tag in self.tags}
+            if(self.total is not None and (self.total != total or any(self.tags[tag] != count for tag, count in tagCounts.items()))):
+                self.drifts += 1
+            self.total = total
+            self.tags.update(tagCounts)
+            self.reconciles += 1
+            # Numbers taken while commits were running may be off, so the first load is checked again soon
+            if(stable):
+                self.lastReconciled = time.time()
+            else:
+                self._retrySoon()
+
+    def _load(self, confirmer, tags: List[str]) -> Dict[str, int]:
+        # Callers hold loadLock, tags loaded by the call that held it before are not queried again
+        with self.lock:
+            generation = self.generation
+            stable = self.inFlight == 0
+            known = {tag: self.tags[tag] for tag in tags if tag in self.tags}
+        tagCounts = {tag: confirmer.countTagInTable(tag) for tag in tags if tag not in known}
+        with self.lock:
+            for tag, count in tagCounts.items():
+                self.tags[tag] = count
+            while(len(self.tags) > self.maxTags):
+                self.tags.popitem(last = False)
+            if(not (stable and self._stableSince(generation))):
+                self._retrySoon()
+        tagCounts.update(known)
+        return tagCounts
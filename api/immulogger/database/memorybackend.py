@@ -0,0 +1,737 @@
+import bisect
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from immudb import htree, store
+from immudb.constants import PLAIN_VALUE_PREFIX, SET_KEY_PREFIX
+from immudb.datatypes import SafeGetResponse, SetResponse
+from immudb.grpc import schema_pb2
+from immudb.rootService import RootService
+
+from ..config.config import IMMUDB_MEMORY_LATENCY
+from .backend import StorageBackend
+
+
+class InMemoryBackendError(Exception):
+    pass
+
+
+@dataclass
+class InMemoryBatchElement:
+    tx: int
+    key: bytes
+    value: bytes
+
+
+_TOKENIZER = re.compile(r"\s*(?:(?P<number>\d+)|(?P<param>@\w+)|(?P<string>'[^']*')|(?P<op><=|>=|!=|<>|[=<>(),;\[\]*.])|(?P<word>\w+))")
+
+
+def _tokenize(sql: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    sql = sql.rstrip()
+    while position < len(sql):
+        match = _TOKENIZER.match(sql, position)
+        if(not match):
+            raise InMemoryBackendError(f"Cannot tokenize SQL near: {sql[position:position + 20]}")
+        position = match.end()
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+class _Table:
+    def __init__(self, name: str, columns: List[str], primaryKey: List[str], autoIncrement: Optional[str]):
+        self.name = name
+        self.columns = columns
+        self.primaryKey = primaryKey
+        self.autoIncrement = autoIncrement
+        self.sequence = 0
+        self.rows: Dict[tuple, Dict[str, Any]] = dict()
+        self.sortedKeys: List[tuple] = []
+        self.uniqueIndexes: List[Tuple[str, ...]] = []
+        self.indexes: List[Tuple[str, ...]] = []
+
+        self.lookups: Dict[str, Dict[Any, List[tuple]]] = dict()
+
+    def keyOf(self, row: Dict[str, Any]) -> tuple:
+        return tuple(row[column] for column in self.primaryKey)
+
+    def add(self, key: tuple, row: Dict[str, Any]):
+        self.rows[key] = row
+        bisect.insort(self.sortedKeys, key)
+        for column, lookup in self.lookups.items():
+            lookup.setdefault(row[column], []).append(key)
+
+    def replace(self, key: tuple, row: Dict[str, Any]):
+        self.rows[key] = row
+        self.lookups.clear()
+
+    def lookup(self, column: str) -> Dict[Any, List[tuple]]:
+        if(column not in self.lookups):
+            lookup = dict()
+            for key in self.sortedKeys:
+                lookup.setdefault(self.rows[key][column], []).append(key)
+            self.lookups[column] = lookup
+        return self.lookups[column]
+
+    def scan(self):
+        for key in self.sortedKeys:
+            yield self.rows[key]
+
+    def scanValues(self, column: str, values) -> List[Dict[str, Any]]:
+        lookup = self.lookup(column)
+        keys = []
+        for value in values:
+            keys.extend(lookup.get(value, []))
+        return [self.rows[key] for key in sorted(set(keys))]
+
+
+class _Parser:
+    def __init__(self, sql: str, params: Dict[str, Any]):
+        self.tokens = _tokenize(sql)
+        self.position = 0
+        self.params = params
+
+    def peek(self, offset: int = 0) -> Optional[Tuple[str, str]]:
+        index = self.position + offset
+        if(index < len(self.tokens)):
+            return self.tokens[index]
+        return None
+
+    def peekWord(self, offset: int = 0) -> Optional[str]:
+        token = self.peek(offset)
+        if(token and token[0] == "word"):
+            return token[1].upper()
+        return None
+
+    def next(self) -> Tuple[str, str]:
+        token = self.peek()
+        if(token is None):
+            raise InMemoryBackendError("Unexpected end of statement")
+        self.position += 1
+        return token
+
+    def accept(self, value: str) -> bool:
+        token = self.peek()
+        if(token and token[1].upper() == value):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, value: str):
+        token = self.next()
+        if(token[1].upper() != value):
+            raise InMemoryBackendError(f"Expected {value}, got {token[1]}")
+
+    def identifier(self) -> str:
+        kind, value = self.next()
+        if(kind != "word"):
+            raise InMemoryBackendError(f"Expected identifier, got {value}")
+        return value.lower()
+
+    def qualifiedName(self) -> str:
+        name = self.identifier()
+        if(self.accept(".")):
+            name = name + "." + self.identifier()
+        return name
+
+    def atEnd(self) -> bool:
+        return self.peek() is None
+
+
+class InMemoryStorage:
+    def __init__(self, latency: float = 0):
+        # Simulated network round trip in seconds, slept outside of the storage lock
+        self.latency = latency
+        self.tables: Dict[str, _Table] = dict()
+        self.kv: Dict[bytes, List[Tuple[int, bytes]]] = dict()
+        self.txId = 0
+        # Linear chain of TXs (no binary linking), enough to serve real dual proofs
+        self.txs: List[schema_pb2.Tx] = []
+        self.innerHashes: List[bytes] = []
+        self.alhs: List[bytes] = []
+        self.calls = Counter()
+        self.lock = threading.RLock()
+        # Like a fresh immudb database, the first TX is already there
+        self.appendTx([(b"\x02genesis", hashlib.sha256(b"").digest())])
+
+    def appendTx(self, entries: List[Tuple[bytes, bytes]]) -> int:
+        # entries are (encoded key, hashed value)
+        tree = htree.HTree(len(entries))
+        tree.BuildWith([hashlib.sha256(key + hValue).digest() for key, hValue in entries])
+        metadata = schema_pb2.TxMetadata(id = self.txId + 1, prevAlh = self.alhs[-1] if self.alhs else bytes(32), ts = int(time.time()),
+                                         nentries = len(entries), eH = tree.root, blTxId = 0, blRoot = bytes(32))
+        tx = schema_pb2.Tx(metadata = metadata, entries = [schema_pb2.TxEntry(key = key, hValue = hValue, vOff = 0, vLen = 0) for key, hValue in entries])
+        built = store.TxFrom(tx)
+        self.txs.append(tx)
+        self.innerHashes.append(built.InnerHash)
+        self.alhs.append(built.Alh)
+        self.txId = metadata.id
+        return self.txId
+
+    def state(self, txId: int = None) -> schema_pb2.ImmutableState:
+        txId = txId if txId else self.txId
+        return schema_pb2.ImmutableState(db = "defaultdb", txId = txId, txHash = self.alhs[txId - 1], signature = schema_pb2.Signature())
+
+    def verifiableTx(self, txId: int, proveSinceTx: int) -> schema_pb2.VerifiableTx:
+        if(txId < 1 or txId > self.txId or proveSinceTx > self.txId):
+            raise InMemoryBackendError("tx not found")
+        sourceId = min(txId, proveSinceTx) if proveSinceTx > 0 else txId
+        targetId = max(txId, proveSinceTx)
+        terms = [self.alhs[sourceId - 1]] + self.innerHashes[sourceId:targetId]
+        dualProof = schema_pb2.DualProof(sourceTxMetadata = self.txs[sourceId - 1].metadata, targetTxMetadata = self.txs[targetId - 1].metadata,
+                                         linearProof = schema_pb2.LinearProof(sourceTxId = sourceId, TargetTxId = targetId, terms = terms))
+        return schema_pb2.VerifiableTx(tx = self.txs[txId - 1], dualProof = dualProof, signature = schema_pb2.Signature())
+
+
+class InMemoryStub:
+    # The raw gRPC calls ImmudbConfirmer makes through ImmudbClient.stub
+    def __init__(self, client: "InMemoryBackend"):
+        self.client = client
+
+    def CurrentState(self, request):
+        self.client._call("CurrentState")
+        with self.client.lock:
+            return self.client.storage.state()
+
+    def VerifiableTxById(self, request):
+        self.client._call("VerifiableTxById")
+        with self.client.lock:
+            return self.client.storage.verifiableTx(request.tx, request.proveSinceTx)
+
+
+class InMemoryBackend(StorageBackend):
+    """In-process stand-in for immudb covering the calls ImmudbConfirmer makes.
+
+    It understands the subset of immudb SQL produced by the query builders, serves real
+    dual proofs and counts every call as one round trip, with optional simulated latency.
+    Backends created with the same storage behave like sessions of one immudb server.
+    """
+
+    def __init__(self, storage: InMemoryStorage = None, rs: RootService = None):
+        self.storage = storage if storage else InMemoryStorage()
+        self.tables = self.storage.tables
+        self.kv = self.storage.kv
+        self.lock = self.storage.lock
+        self.rootService = rs if rs else RootService()
+        self._stub = InMemoryStub(self)
+
+    @property
+    def stub(self):
+        return self._stub
+
+    @property
+    def calls(self) -> Counter:
+        return self.storage.calls
+
+    @property
+    def roundTrips(self) -> int:
+        return sum(self.calls.values())
+
+    def resetCounters(self):
+        self.storage.calls.clear()
+
+    def _call(self, name: str):
+        with self.lock:
+            self.storage.calls[name] += 1
+        if(self.storage.latency > 0):
+            time.sleep(self.storage.latency)
+
+    def login(self, username, password, database=b"defaultdb"):
+        self._call("login")
+        self.rootService.init(database, self._stub)
+        return True
+
+    def logout(self):
+        self._call("logout")
+
+    def healthCheck(self):
+        self._call("healthCheck")
+        return True
+
+    def _nextTx(self, kv: Dict[bytes, bytes]) -> int:
+        return self.storage.appendTx([(SET_KEY_PREFIX + key, hashlib.sha256(PLAIN_VALUE_PREFIX + value).digest()) for key, value in kv.items()])
+
+    def setAll(self, kv: dict):
+        self._call("setAll")
+        with self.lock:
+            tx = self._nextTx(kv)
+            for key, value in kv.items():
+                self.kv.setdefault(key, []).append((tx, value))
+            return SetResponse(id = tx, verified = False)
+
+    def verifiedSet(self, key: bytes, value: bytes):
+        self._call("verifiedSet")
+        with self.lock:
+            tx = self._nextTx({key: value})
+            self.kv.setdefault(key, []).append((tx, value))
+            self._advanceState(tx)
+            return SetResponse(id = tx, verified = True)
+
+    def _getAt(self, key: bytes, atTx: Optional[int]) -> Tuple[int, bytes]:
+        history = self.kv.get(key)
+        if(not history):
+            raise InMemoryBackendError("key not found")
+        if(atTx is None):
+            return history[-1]
+        for tx, value in history:
+            if(tx == atTx):
+                return tx, value
+        raise InMemoryBackendError("key not found")
+
+    def _advanceState(self, txId: int):
+        # Verified calls move the client's trusted state up to the TX they proved
+        if(txId > self.rootService.get().txId):
+            self.rootService.set(self.storage.state(txId))
+
+    def verifiedGet(self, key: bytes):
+        self._call("verifiedGet")
+        with self.lock:
+            tx, value = self._getAt(key, None)
+            self._advanceState(tx)
+            return SafeGetResponse(id = tx, key = key, value = value, timestamp = 0, verified = True, refkey = None)
+
+    def verifiedGetAt(self, key: bytes, atTx: int):
+        self._call("verifiedGetAt")
+        with self.lock:
+            tx, value = self._getAt(key, atTx)
+            self._advanceState(tx)
+            return SafeGetResponse(id = tx, key = key, value = value, timestamp = 0, verified = True, refkey = None)
+
+    def getAllValues(self, keys: list):
+        self._call("getAllValues")
+        with self.lock:
+            result = dict()
+            for key in keys:
+                history = self.kv.get(key)
+                if(history):
+                    tx, value = history[-1]
+                    result[key] = InMemoryBatchElement(tx = tx, key = key, value = value)
+            return result
+
+    def getAll(self, keys: list):
+        return {key: value.value for key, value in self.getAllValues(keys).items()}
+
+    def sqlExec(self, stmt, params={}, noWait=False):
+        self._call("sqlExec")
+        with self.lock:
+            parser = _Parser(stmt, params)
+            staged = []
+            while not parser.atEnd():
+                if(parser.accept(";")):
+                    continue
+                word = parser.peekWord()
+                if(word == "BEGIN"):
+                    parser.next()
+                    parser.expect("TRANSACTION")
+                elif(word == "COMMIT"):
+                    parser.next()
+                elif(word == "CREATE"):
+                    self._create(parser)
+                elif(word in ("INSERT", "UPSERT")):
+                    staged.append(self._insert(parser))
+                else:
+                    raise InMemoryBackendError(f"Unsupported statement: {word}")
+            self._applyInserts(staged)
+            # SQL rows are KV entries in immudb too, one digest of the statement stands in for them
+            tx = self.storage.appendTx([(b"\x02sql", hashlib.sha256(stmt.encode("utf-8")).digest())])
+            return SetResponse(id = tx, verified = False)
+
+    def sqlQuery(self, query, params={}):
+        self._call("sqlQuery")
+        with self.lock:
+            parser = _Parser(query, params)
+            result = self._select(parser)
+            parser.accept(";")
+            if(not parser.atEnd()):
+                raise InMemoryBackendError(f"Unexpected token {parser.peek()[1]}")
+            return result
+
+    def _table(self, name: str) -> _Table:
+        table = self.tables.get(name)
+        if(table is None):
+            raise InMemoryBackendError(f"table does not exist ({name})")
+        return table
+
+    def _create(self, parser: _Parser):
+        parser.expect("CREATE")
+        unique = parser.accept("UNIQUE")
+        if(parser.accept("INDEX")):
+            ifNotExists = self._ifNotExists(parser)
+            parser.expect("ON")
+            table = self._table(parser.identifier())
+            parser.expect("(")
+            columns = [parser.identifier()]
+            while parser.accept(","):
+                columns.append(parser.identifier())
+            parser.expect(")")
+            index = tuple(columns)
+            if(index in table.indexes or index in table.uniqueIndexes or list(index) == table.primaryKey):
+                if(not ifNotExists):
+                    raise InMemoryBackendError("index already exists")
+                return
+            if(unique):
+                table.uniqueIndexes.append(index)
+            else:
+                table.indexes.append(index)
+            return
+        parser.expect("TABLE")
+        ifNotExists = self._ifNotExists(parser)
+        name = parser.identifier()
+        columns = []
+        primaryKey = []
+        autoIncrement = None
+        parser.expect("(")
+        while True:
+            if(parser.accept("PRIMARY")):
+                parser.expect("KEY")
+                if(parser.accept("(")):
+                    primaryKey.append(parser.identifier())
+                    while parser.accept(","):
+                        primaryKey.append(parser.identifier())
+                    parser.expect(")")
+                else:
+                    primaryKey.append(parser.identifier())
+            else:
+                column = parser.identifier()
+                columns.append(column)
+                parser.identifier()
+                if(parser.accept("[")):
+                    parser.next()
+                    parser.expect("]")
+                while parser.peekWord() in ("AUTO_INCREMENT", "NOT", "NULL"):
+                    if(parser.next()[1].upper() == "AUTO_INCREMENT"):
+                        autoIncrement = column
+            if(parser.accept(")")):
+                break
+            parser.expect(",")
+        if(name in self.tables):
+            if(not ifNotExists):
+                raise InMemoryBackendError("table already exists")
+            return
+        self.tables[name] = _Table(name, columns, primaryKey, autoIncrement)
+
+    def _ifNotExists(self, parser: _Parser) -> bool:
+        if(parser.accept("IF")):
+            parser.expect("NOT")
+            parser.expect("EXISTS")
+            return True
+        return False
+
+    def _insert(self, parser: _Parser):
+        upsert = parser.accept("UPSERT")
+        if(not upsert):
+            parser.expect("INSERT")
+        parser.expect("INTO")
+        table = self._table(parser.identifier())
+        parser.expect("(")
+        columns = [parser.identifier()]
+        while parser.accept(","):
+            columns.append(parser.identifier())
+        parser.expect(")")
+        parser.expect("VALUES")
+        rows = []
+        while True:
+            parser.expect("(")
+            values = [self._value(parser)]
+            while parser.accept(","):
+                values.append(self._value(parser))
+            parser.expect(")")
+            rows.append(dict(zip(columns, values)))
+            if(not parser.accept(",")):
+                break
+        return table, rows, upsert
+
+    def _applyInserts(self, staged):
+        pending = dict()
+        sequences = dict()
+        replaced = dict()
+        for table, rows, upsert in staged:
+            sequence = sequences.get(table.name, table.sequence)
+            for row in rows:
+                if(table.autoIncrement and table.autoIncrement not in row):
+                    sequence += 1
+                    row[table.autoIncrement] = sequence
+                for column in table.columns:
+                    row.setdefault(column, None)
+                key = table.keyOf(row)
+                tableKey = (table.name, key)
+                if(upsert and key in table.rows):
+                    replaced[tableKey] = (table, row)
+                    continue
+                if((key in table.rows or tableKey in pending) and not upsert):
+                    raise InMemoryBackendError("duplicate primary key")
+                pending[tableKey] = (table, row)
+            sequences[table.name] = sequence
+        for table in set(table for table, _, _ in staged):
+            for index in table.uniqueIndexes:
+                seen = set(tuple(row[column] for column in index) for row in table.rows.values())
+                for (tableName, _), (_, row) in pending.items():
+                    if(tableName != table.name):
+                        continue
+                    value = tuple(row[column] for column in index)
+                    if(value in seen):
+                        raise InMemoryBackendError("unique index violation")
+                    seen.add(value)
+        for (tableName, key), (table, row) in pending.items():
+            table.add(key, row)
+        for (tableName, key), (table, row) in replaced.items():
+            table.replace(key, row)
+        for tableName, sequence in sequences.items():
+            self.tables[tableName].sequence = sequence
+
+    def _value(self, parser: _Parser):
+        kind, value = parser.next()
+        if(kind == "param"):
+            name = value[1:]
+            if(name not in parser.params):
+                raise InMemoryBackendError(f"missing parameter {name}")
+            return parser.params[name]
+        if(kind == "number"):
+            return int(value)
+        if(kind == "string"):
+            return value[1:-1]
+        if(kind == "word" and value.upper() in ("TRUE", "FALSE")):
+            return value.upper() == "TRUE"
+        if(kind == "word" and value.upper() == "NULL"):
+            return None
+        raise InMemoryBackendError(f"Unexpected value {value}")
+
+    def _select(self, parser: _Parser):
+        parser.expect("SELECT")
+        selected = []
+        while True:
+            if(parser.accept("*")):
+                selected.append(("*", None))
+            elif(parser.peekWord() == "COUNT" and parser.peek(1) and parser.peek(1)[1] == "("):
+                parser.next()
+                parser.expect("(")
+                parser.accept("*")
+                parser.expect(")")
+                selected.append(("count", None))
+            else:
+                selected.append(("column", parser.qualifiedName()))
+            if(not parser.accept(",")):
+                break
+        parser.expect("FROM")
+        sources = [self._source(parser)]
+        joins = []
+        while parser.accept("INNER"):
+            parser.expect("JOIN")
+            source = self._source(parser)
+            parser.expect("ON")
+            left = parser.qualifiedName()
+            parser.expect("=")
+            right = parser.qualifiedName()
+            joins.append((source, left, right))
+            sources.append(source)
+        condition = None
+        if(parser.accept("WHERE")):
+            condition = self._simplify(self._condition(parser))
+        orderBy = None
+        if(parser.accept("ORDER")):
+            parser.expect("BY")
+            column = parser.qualifiedName()
+            descending = parser.accept("DESC")
+            if(not descending):
+                parser.accept("ASC")
+            orderBy = (column, descending)
+        limit = None
+        if(parser.accept("LIMIT")):
+            limit = self._value(parser)
+
+        rows = self._rows(sources, joins, condition)
+        if(condition):
+            rows = [row for row in rows if self._evaluate(condition, row, sources)]
+        if(orderBy):
+            column, descending = orderBy
+            # immudb walks an index in (column, primary key) order, equal values keep the scan direction
+            if(descending):
+                rows.reverse()
+            rows.sort(key = lambda row: self._resolve(row, column, sources), reverse = descending)
+        if(any(kind == "count" for kind, _ in selected)):
+            return [(len(rows),)]
+        if(limit is not None):
+            rows = rows[:limit]
+        result = []
+        for row in rows:
+            values = []
+            for kind, column in selected:
+                if(kind == "*"):
+                    for alias, table in sources:
+                        values.extend(row[alias][name] for name in table.columns)
+                else:
+                    values.append(self._resolve(row, column, sources))
+            result.append(tuple(values))
+        return result
+
+    def _source(self, parser: _Parser):
+        table = self._table(parser.identifier())
+        alias = table.name
+        if(parser.accept("AS")):
+            alias = parser.identifier()
+        return alias, table
+
+    def _lookupValues(self, condition, alias: str, table: _Table):
+        # Finds an equality (or IN) on a column of the scanned table which narrows the scan
+        kind = condition[0]
+        if(kind == "AND"):
+            found = self._lookupValues(condition[1], alias, table)
+            if(found is None):
+                found = self._lookupValues(condition[2], alias, table)
+            return found
+        if(kind == "IN" or (kind == "CMP" and condition[1] == "=")):
+            operand = condition[1] if kind == "IN" else condition[2]
+            other = condition[2] if kind == "IN" else condition[3]
+            if(operand[0] != "column" or (kind == "CMP" and other[0] != "value")):
+                return None
+            column = operand[1]
+            if("." in column):
+                columnAlias, column = column.split(".", 1)
+                if(columnAlias != alias):
+                    return None
+            if(column not in table.columns):
+                return None
+            return column, other if kind == "IN" else [other[1]]
+        return None
+
+    def _rows(self, sources, joins, condition):
+        alias, table = sources[0]
+        found = None
+        if(condition and len(joins) == 0):
+            found = self._lookupValues(condition, alias, table)
+        if(found):
+            rows = [{alias: row} for row in table.scanValues(*found)]
+        else:
+            rows = [{alias: row} for row in table.scan()]
+        for (joinAlias, joinTable), left, right in joins:
+            if(right.split(".")[0] == joinAlias):
+                own, other = right, left
+            else:
+                own, other = left, right
+            lookup = joinTable.lookup(own.split(".")[-1])
+            joined = []
+            for row in rows:
+                value = self._resolve(row, other, sources)
+                for key in lookup.get(value, []):
+                    newRow = dict(row)
+                    newRow[joinAlias] = joinTable.rows[key]
+                    joined.append(newRow)
+            rows = joined
+        return rows
+
+    def _resolve(self, row, column: str, sources):
+        if("." in column):
+            alias, name = column.split(".", 1)
+            if(alias in row):
+                return row[alias][name]
+            raise InMemoryBackendError(f"unknown column {column}")
+        for alias, table in sources:
+            if(alias in row and column in table.columns):
+                return row[alias][column]
+        raise InMemoryBackendError(f"unknown column {column}")
+
+    def _condition(self, parser: _Parser):
+        left = self._conjunction(parser)
+        while parser.accept("OR"):
+            left = ("OR", left, self._conjunction(parser))
+        return left
+
+    def _conjunction(self, parser: _Parser):
+        left = self._comparison(parser)
+        while parser.accept("AND"):
+            left = ("AND", left, self._comparison(parser))
+        return left
+
+    def _comparison(self, parser: _Parser):
+        if(parser.accept("(")):
+            inner = self._condition(parser)
+            parser.expect(")")
+            return inner
+        if(parser.accept("NOT")):
+            return ("NOT", self._comparison(parser))
+        left = self._operand(parser)
+        operator = parser.next()[1]
+        if(operator not in ("=", "<", ">", "<=", ">=", "!=", "<>")):
+            raise InMemoryBackendError(f"Unsupported operator {operator}")
+        right = self._operand(parser)
+        return ("CMP", operator, left, right)
+
+    def _flatten(self, kind: str, condition) -> list:
+        if(condition[0] != kind):
+            return [condition]
+        return self._flatten(kind, condition[1]) + self._flatten(kind, condition[2])
+
+    def _simplify(self, condition):
+        # Long OR chains of equalities on one column become a single set lookup
+        if(condition[0] != "OR"):
+            return condition
+        terms = self._flatten("OR", condition)
+        columns = set()
+        for term in terms:
+            if(term[0] != "CMP" or term[1] != "=" or term[2][0] != "column" or term[3][0] != "value"):
+                return condition
+            columns.add(term[2][1])
+        if(len(columns) != 1):
+            return condition
+        return ("IN", ("column", columns.pop()), set(term[3][1] for term in terms))
+
+    def _operand(self, parser: _Parser):
+        kind, value = parser.peek()
+        if(kind == "word" and value.upper() not in ("TRUE", "FALSE", "NULL")):
+            return ("column", parser.qualifiedName())
+        return ("value", self._value(parser))
+
+    def _operandValue(self, operand, row, sources):
+        if(operand[0] == "column"):
+            return self._resolve(row, operand[1], sources)
+        return operand[1]
+
+    def _evaluate(self, condition, row, sources) -> bool:
+        kind = condition[0]
+        if(kind == "OR"):
+            return self._evaluate(condition[1], row, sources) or self._evaluate(condition[2], row, sources)
+        if(kind == "AND"):
+            return self._evaluate(condition[1], row, sources) and self._evaluate(condition[2], row, sources)
+        if(kind == "NOT"):
+            return not self._evaluate(condition[1], row, sources)
+        if(kind == "IN"):
+            return self._operandValue(condition[1], row, sources) in condition[2]
+        _, operator, left, right = condition
+        leftValue = self._operandValue(left, row, sources)
+        rightValue = self._operandValue(right, row, sources)
+        if(operator == "="):
+            return leftValue == rightValue
+        if(operator in ("!=", "<>")):
+            return leftValue != rightValue
+        if(leftValue is None or rightValue is None):
+            return False
+        if(operator == "<"):
+            return leftValue < rightValue
+        if(operator == ">"):
+            return leftValue > rightValue
+        if(operator == "<="):
+            return leftValue <= rightValue
+        return leftValue >= rightValue
+
+
+_storages: Dict[str, InMemoryStorage] = dict()
+_storagesLock = threading.Lock()
+
+
+def getMemoryStorage(name: str) -> InMemoryStorage:
+    with _storagesLock:
+        if(name not in _storages):
+            _storages[name] = InMemoryStorage(IMMUDB_MEMORY_LATENCY)
+        return _storages[name]
+
+
+def dropMemoryStorage(name: str):
+    with _storagesLock:
+        _storages.pop(name, None)
@@ -0,0 +1,96 @@
+import hashlib
+import uuid
+from typing import List, Optional, Tuple
+
+from ..config.config import CONFIRMATION_MODE
+
+# "merkle" commits one root per TX of logs instead of one confirmation per log
+confirmationMode = CONFIRMATION_MODE
+
+# Identifiers of logs confirmed through a root, entry identifiers start with a uuid4 and never with it
+MERKLE_IDENTIFIER_PREFIX = "m"
+SHA_LENGTH = 32
+
+
+def newBatchId() -> str:
+    return uuid.uuid4().hex
+
+
+def merkleIdentifier(batchId: str, index: int, shaHex: str) -> str:
+    # m<batch>-<leaf index><start of the SHA>, 48 characters
+    return f"{MERKLE_IDENTIFIER_PREFIX}{batchId}-{index:04x}{shaHex[0:10]}"
+
+
+def parseMerkleIdentifier(identifier: str) -> Optional[Tuple[str, int]]:
+    # (batch id, leaf index) of a merkle identifier, None for entry identifiers
+    if(len(identifier) != 48 or not identifier.startswith(MERKLE_IDENTIFIER_PREFIX) or identifier[33] != "-"):
+        return None
+    try:
+        return identifier[1:33], int(identifier[34:38], 16)
+    except ValueError:
+        return None
+
+
+def rootKey(batchId: str) -> str:
+    # Verified KV entry holding the root
+    return f"merkle:{batchId}"
+
+
+def leavesKey(batchId: str) -> str:
+    # KV entry holding the leaves, read without proof, every path built from it is checked against the root
+    return f"merkle:{batchId}:leaves"
+
+
+def _leafHash(sha: bytes) -> bytes:
+    return hashlib.sha256(b"\x00" + sha).digest()
+
+
+def _nodeHash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def _levels(shas: List[bytes]) -> List[List[bytes]]:
+    # Leaves are the SHA256 of the log contents in TX order. The last node of an odd level moves up unchanged,
+    # leaf and inner hashes are prefixed differently so one can not pass for the other
+    level = [_leafHash(sha) for sha in shas]
+    levels = [level]
+    while(len(level) > 1):
+        level = [_nodeHash(level[index], level[index + 1]) if index + 1 < len(level) else level[index] for index in range(0, len(level), 2)]
+        levels.append(level)
+    return levels
+
+
+def merkleRoot(shas: List[bytes]) -> bytes:
+    return _levels(shas)[-1][0]
+
+
+def inclusionPath(shas: List[bytes], index: int) -> List[bytes]:
+    path = []
+    for level in _levels(shas)[0:-1]:
+        sibling = index ^ 1
+        if(sibling < len(level)):
+            path.append(level[sibling])
+        index = index // 2
+    return path
+
+
+def rootFromPath(sha: bytes, index: int, size: int, path: List[bytes]) -> Optional[bytes]:
+    # Root of a tree of size leaves that has sha at index, None when the path does not fit that shape
+    if(index >= size):
+        return None
+    node = _leafHash(sha)
+    used = 0
+    while(size > 1):
+        sibling = index ^ 1
+        if(sibling < size):
+            if(used >= len(path)):
+                return None
+            node = _nodeHash(path[used], node) if index & 1 else _nodeHash(node, path[used])
+            used += 1
+        index = index // 2
+        size = (size + 1) // 2
+    return node if used == len(path) else None
+
+
+def splitLeaves(leaves: bytes) -> List[bytes]:
+    return [leaves[start:start + SHA_LENGTH] for start in range(0, len(leaves), SHA_LENGTH)]
@@ -0,0 +1,144 @@
+import contextvars
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Optional, Tuple, Union
+
+import grpc
+
+from .immudb import ImmudbConfirmer, PreparedLogs
+from . import merkle
+from .knowncontents import KnownContents
+from .logcounters import LogCounters
+from .preprocess import LogDigester
+from .searchindex import SearchIndex
+from .verifiedcache import VerifiedCache
+from ..metrics import BATCH_CHUNKS, BATCH_LOGS
+from ..routers.models.logmodel import AddLogsRequest, ChunkError, parseLogLines
+
+FAILED_IDENTIFIER = "FAILED"
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class ImmudbConfirmerPool:
+    def __init__(self, url: str, username: str, password: str, keyPath: Union[str, None], size: int = 4, sessionTTL: int = 30 * 60, checkoutTimeout: float = 30, healthCheckInterval: float = 60, batchParallelism: int = 2, verifiedCacheSize: int = 65536, countsReconcileInterval: float = 60, knownContentsSize: int = 65536, preprocessWorkers: int = 0, preprocessMinLogs: int = 2048, countsMaxTags: int = 1024, searchIndexMaxPostings: int = 16777216, searchIndexRefreshInterval: float = 1):
+        self.url = url
+        self.username = username
+        self.password = password
+        self.keyPath = keyPath
+        self.size = size
+        self.sessionTTL = sessionTTL
+        self.checkoutTimeout = checkoutTimeout
+        self.healthCheckInterval = healthCheckInterval
+        # Shared, a log proven through one session is a cache hit for all of them
+        self.verifiedCache = VerifiedCache(verifiedCacheSize)
+        self.searchIndex = SearchIndex(searchIndexMaxPostings, searchIndexRefreshInterval)
+        self.logCounters = LogCounters(countsReconcileInterval, maxTags = countsMaxTags)
+        self.knownContents = KnownContents(knownContentsSize)
+        self.digester = LogDigester(preprocessWorkers, preprocessMinLogs)
+        self.sessions: List[ImmudbConfirmer] = [self._createSession() for _ in range(0, size)]
+        self.idle = queue.LifoQueue()
+        for confirmer in self.sessions:
+            self.idle.put(confirmer)
+        self.lastHealthCheck = dict()
+        self.batchParallelism = max(1, min(batchParallelism, size))
+        self.submitter: Optional[ThreadPoolExecutor] = None
+
+    def _createSession(self) -> ImmudbConfirmer:
+        return ImmudbConfirmer(self.url, self.username, self.password, self.keyPath, self.verifiedCache, self.searchIndex, self.logCounters, self.knownContents)
+
+    def _prepare(self, confirmer: ImmudbConfirmer):
+        now = time.time()
+        if(confirmer.logged and now > self.lastHealthCheck.get(id(confirmer), 0) + self.healthCheckInterval):
+            if(not confirmer.isHealthy()):
+                confirmer.logged = False
+            self.lastHealthCheck[id(confirmer)] = now
+        confirmer.ensureLogged(self.sessionTTL)
+
+    def checkout(self) -> ImmudbConfirmer:
+        try:
+            confirmer = self.idle.get(timeout = self.checkoutTimeout)
+        except queue.Empty:
+            raise PoolExhausted(f"No immudb session available after {self.checkoutTimeout}s")
+        try:
+            self._prepare(confirmer)
+        except Exception:
+            confirmer.logged = False
+            self.idle.put(confirmer)
+            raise
+        return confirmer
+
+    def checkin(self, confirmer: ImmudbConfirmer, broken: bool = False):
+        if(broken):
+            # Forces a fresh login the next time this session is checked out
+            confirmer.logged = False
+        self.idle.put(confirmer)
+
+    @contextmanager
+    def session(self):
+        confirmer = self.checkout()
+        broken = False
+        try:
+            yield confirmer
+        except grpc.RpcError:
+            broken = True
+            raise
+        finally:
+            self.checkin(confirmer, broken)
+
+    def available(self) -> int:
+        return self.idle.qsize()
+
+    def healthCheck(self) -> bool:
+        with self.session() as confirmer:
+            return confirmer.isHealthy()
+
+    def _submitPrepared(self, prepared: PreparedLogs) -> List[str]:
+        with self.session() as client:
+            return client.submitPreparedLogs(prepared)
+
+    def processLogsRequest(self, newLogs: AddLogsRequest) -> Tuple[List[str], List[ChunkError]]:
+        # Chunk N+1 is built while chunk N is in flight, up to batchParallelism chunks run on separate sessions.
+        # Identifiers keep the input order, logs of a failed chunk get FAILED_IDENTIFIER
+        if(self.submitter is None):
+            self.submitter = ThreadPoolExecutor(max_workers = self.batchParallelism, thread_name_prefix = "immudb-batch")
+        chunkSize = ImmudbConfirmer.chunkSize(newLogs.tags)
+        contents = newLogs.contents()
+        submitted = []
+        chunks = [contents[start:start + chunkSize] for start in range(0, len(contents), chunkSize)]
+        # Hashes and identifiers of big batches are computed on worker processes, chunk by chunk as they come back
+        digestedChunks = self.digester.digestChunks(chunks, merkle.confirmationMode != "merkle")
+        for start, chunk, digests in zip(range(0, len(contents), chunkSize), chunks, digestedChunks):
+            prepared = ImmudbConfirmer.prepareLogEntries([(content, int(time.time() * 1000), newLogs.tags) for content in chunk], self.knownContents, digests)
+            submitted.append((start, len(chunk), self.submitter.submit(contextvars.copy_context().run, self._submitPrepared, prepared)))
+        BATCH_LOGS.observe(len(contents))
+        BATCH_CHUNKS.observe(len(submitted))
+
+        identifiers = []
+        failedChunks = []
+        firstError = None
+        for start, count, future in submitted:
+            try:
+                identifiers.extend(future.result())
+            except Exception as e:
+                firstError = firstError or e
+                identifiers.extend([FAILED_IDENTIFIER] * count)
+                failedChunks.append(ChunkError(start = start, end = start + count, error = str(e)))
+        if(len(failedChunks) == len(submitted) and firstError is not None):
+            raise firstError
+        return identifiers, failedChunks
+
+    def processLogLines(self, lines: List[Optional[bytes]], start: int, tags: List[str]) -> Tuple[List[str], List[ChunkError]]:
+        # One chunk of an NDJSON ingest body, at most chunkSize(tags) lines. Parsed here so the event loop only splits lines.
+        # Invalid lines get FAILED_IDENTIFIER, the others share one TX. Raises when that TX fails
+        contents, failedChunks = parseLogLines(lines, start)
+        valid = [content for content in contents if content is not None]
+        if(len(valid) == 0):
+            return [FAILED_IDENTIFIER] * len(contents), failedChunks
+        with self.session() as client:
+            stored = iter(client.processLogs(valid, int(time.time() * 1000), tags))
+        return [next(stored) if content is not None else FAILED_IDENTIFIER for content in contents], failedChunks
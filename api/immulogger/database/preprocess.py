@@ -0,0 +1,56 @@
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+# Imported by spawned workers, keep it to the standard library
+
+
+def digestLogs(contents: List[str], withIdentifiers: bool = True) -> List[Tuple[Optional[str], bytes]]:
+    # (identifier, SHA256) of every content. One hash per log serves the confirmation and the identifier suffix,
+    # the uuid4 parts come from one urandom call for the whole list
+    randomBytes = os.urandom(16 * len(contents)) if withIdentifiers else b""
+    digests = []
+    for index, content in enumerate(contents):
+        sha = hashlib.sha256(content.encode("utf-8")).digest()
+        if(not withIdentifiers):
+            digests.append((None, sha))
+            continue
+        # Same text as str(uuid.uuid4()): version 4 and the RFC 4122 variant
+        random = randomBytes[index * 16:index * 16 + 16].hex()
+        variant = "89ab"[int(random[16], 16) & 3]
+        identifier = f"{random[0:8]}-{random[8:12]}-4{random[13:16]}-{variant}{random[17:20]}-{random[20:32]}" + sha.hex()[0:10]
+        digests.append((identifier, sha))
+    return digests
+
+
+class LogDigester:
+    # Runs digestLogs of big batches on worker processes, so hashing uses more cores than the one holding the GIL.
+    # Smaller batches, or workers = 0, are digested in the calling thread where process round trips would cost more
+    def __init__(self, workers: int = 0, minLogs: int = 2048):
+        self.workers = workers
+        self.minLogs = minLogs
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if(self.executor is None):
+            # Spawned, forking a process that holds gRPC channels and threads is not safe
+            self.executor = ProcessPoolExecutor(max_workers = self.workers, mp_context = multiprocessing.get_context("spawn"))
+        return self.executor
+
+    def digestChunks(self, chunks: List[List[str]], withIdentifiers: bool = True) -> Iterator[List[Tuple[Optional[str], bytes]]]:
+        # Digests of every chunk in order. With workers all chunks are queued at once, the caller gets
+        # chunk N while the workers go on with the following ones
+        if(self.workers < 1 or sum(len(chunk) for chunk in chunks) < self.minLogs):
+            for chunk in chunks:
+                yield digestLogs(chunk, withIdentifiers)
+            return
+        futures: List[Future] = [self._executor().submit(digestLogs, chunk, withIdentifiers) for chunk in chunks]
+        for future in futures:
+            yield future.result()
+
+    def close(self):
+        if(self.executor is not None):
+            self.executor.shutdown()
+            self.executor = None
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from enum import Enum, auto
+from functools import lru_cache
 from typing import List, Union
 from .conditionbuilder import Condition
 from .querybuilderutils import Builder, InvalidBuildState, ComparisionOperator
@@ -124,6 +125,7 @@ class LogQueryBuilder(Builder):
 class InsertWithParamsQueryBuilder(Builder):
     def __init__(self):
         self.constructing = ""
+        self.rows = []
         self.currentState = InsertQueryState.START
         self.insertQueryPossibilities = {
             InsertQueryState.START: [InsertQueryState.INSERTINTO],
@@ -145,31 +147,48 @@ class InsertWithParamsQueryBuilder(Builder):
         self._switchToState(InsertQueryState.INSERTINTO)
         self.constructing = f"INSERT INTO {what} ({','.join(fields)})"
         return self
+
+    def UPSERT(self, what: str, *fields):
+        self._switchToState(InsertQueryState.INSERTINTO)
+        self.constructing = f"UPSERT INTO {what} ({','.join(fields)})"
+        return self
     
     def VALUES(self, index: int, *params):
-        wasState = self.currentState
         self._switchToState(InsertQueryState.VALUES)
-        paramList = []
-        for param in params:
-            paramList.append("@" + param + str(index))
-        if(wasState == InsertQueryState.VALUES):
-            self.constructing = self.constructing + f", ({','.join(paramList)})"
-        else:
-            self.constructing = self.constructing + f" VALUES({','.join(paramList)})"
+        self.rows.append("(" + ",".join(["@" + param + str(index) for param in params]) + ")")
         return self
 
     def VALUES_DIFFERENT_INDEXES(self, params: dict):
-        wasState = self.currentState
         self._switchToState(InsertQueryState.VALUES)
-        paramList = []
-        for key, value in params.items():
-            paramList.append("@" + key + str(value))
-        if(wasState == InsertQueryState.VALUES):
-            self.constructing = self.constructing + f", ({','.join(paramList)})"
-        else:
-            self.constructing = self.constructing + f" VALUES({','.join(paramList)})"
+        self.rows.append("(" + ",".join(["@" + key + str(value) for key, value in params.items()]) + ")")
         return self
 
     def build(self):
         self._switchToState(InsertQueryState.BUILD)
-        return self.constructing + ";"
+        # Rows are joined once here, appending them to one growing string made big inserts quadratic
+        return self.constructing + " VALUES" + ", ".join(self.rows) + ";"
+
+
+@lru_cache(maxsize = 256)
+def logsBatchTemplate(rows: int, tagRows: int, contentRows: int = 0) -> str:
+    # The batch TX text only depends on how many LOGS, TAGS and CONTENTS rows it inserts, so it is rendered once per shape.
+    # Parameters are log<i>, uniqueidentifier<i>, createdate<i> per log, tag<j>, taguniqueidentifier<j> per tag row
+    # and contentsha<k>, contentlog<k> per deduplicated content.
+    # Shared by every session and thread, which is safe: the key is the shape alone and values are always bound, never part of the text
+    batchQuery = BatchQueryBuilder()
+    if(contentRows > 0):
+        # Upserted, a content another session stored meanwhile is written again instead of failing the TX
+        contentsUpsert = InsertWithParamsQueryBuilder().UPSERT("CONTENTS", "sha", "log")
+        for index in range(0, contentRows):
+            contentsUpsert.VALUES(index, "contentsha", "contentlog")
+        batchQuery.addQuery(contentsUpsert.build())
+    logsInsert = InsertWithParamsQueryBuilder().INSERT("LOGS", "log", "uniqueidentifier", "createdate")
+    for index in range(0, rows):
+        logsInsert.VALUES(index, "log", "uniqueidentifier", "createdate")
+    batchQuery.addQuery(logsInsert.build())
+    if(tagRows > 0):
+        tagsInsert = InsertWithParamsQueryBuilder().INSERT("TAGS", "uniqueidentifier", "tag")
+        for index in range(0, tagRows):
+            tagsInsert.VALUES(index, "taguniqueidentifier", "tag")
+        batchQuery.addQuery(tagsInsert.build())
+    return batchQuery.build()
@@ -0,0 +1,177 @@
+import re
+import shlex
+import threading
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+from .logcodec import decodeLog
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Distinct tokens one query may use
+MAX_QUERY_TOKENS = 16
+
+
+class InvalidSearchQuery(Exception):
+    pass
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+@dataclass
+class SearchQuery:
+    # Every phrase has to appear in the log as consecutive tokens, a single-token phrase is a plain term
+    phrases: List[List[str]]
+
+    @classmethod
+    def parse(cls, query: str) -> "SearchQuery":
+        # Quoted parts are phrases, so are unquoted words that tokenize to several tokens (req-1234 is req 1234)
+        try:
+            parts = shlex.split(query)
+        except ValueError as e:
+            raise InvalidSearchQuery(f"Invalid query {query}") from e
+        phrases = [tokens for tokens in (tokenize(part) for part in parts) if len(tokens) > 0]
+        if(len(phrases) == 0):
+            raise InvalidSearchQuery("Query has no searchable terms")
+        if(len({token for tokens in phrases for token in tokens}) > MAX_QUERY_TOKENS):
+            raise InvalidSearchQuery(f"Query may use at most {MAX_QUERY_TOKENS} distinct terms")
+        return cls(phrases)
+
+    def tokens(self) -> List[str]:
+        return list({token for tokens in self.phrases for token in tokens})
+
+    def needsContent(self) -> bool:
+        return any(len(tokens) > 1 for tokens in self.phrases)
+
+    def matches(self, content: str) -> bool:
+        # Phrase check on the content read back from immudb, postings only tell which logs hold every token
+        logTokens = tokenize(content)
+        return all(self._containsPhrase(logTokens, tokens) for tokens in self.phrases)
+
+    @staticmethod
+    def _containsPhrase(logTokens: List[str], tokens: List[str]) -> bool:
+        if(len(tokens) == 1):
+            return tokens[0] in logTokens
+        for start in range(0, len(logTokens) - len(tokens) + 1):
+            if(logTokens[start:start + len(tokens)] == tokens):
+                return True
+        return False
+
+
+class SearchIndex:
+    # Inverted index over Logs.log held in memory: token -> ascending LOGS ids of logs containing it.
+    # A background thread builds it on startup and follows the table by reading only rows above the last indexed id,
+    # woken by commits of this process and every refreshInterval seconds for rows of other replicas. Searches do not
+    # wait for it, rows above the last indexed id are scanned with SQL. Past maxPostings ids the index is dropped and
+    # searches scan the whole table. Results are plain rows, readers verify them through immudb.
+    CATCH_UP_PAGE_SIZE = 1024
+
+    def __init__(self, maxPostings: int = 16777216, refreshInterval: float = 1):
+        self.maxPostings = maxPostings
+        self.refreshInterval = refreshInterval
+        self.postings: Dict[str, array] = dict()
+        self.postingsCount = 0
+        self.lastIndexedId = 0
+        self.indexedLogs = 0
+        self.skippedLogs = 0
+        self.dropped = False
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self, pool):
+        if(self.running):
+            return
+        self.running = True
+        self.thread = threading.Thread(target = self._run, args = (pool,), name = "immulogger-search-index", daemon = True)
+        self.thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self.running = False
+        self.wakeup.set()
+        if(self.thread):
+            self.thread.join(timeout)
+            self.thread = None
+
+    def notify(self):
+        # Called after every commit of this process
+        self.wakeup.set()
+
+    def _run(self, pool):
+        while(self.running and not self.dropped):
+            self.wakeup.clear()
+            try:
+                # A session is checked out per page, so the first build does not keep one from requests
+                read = self.CATCH_UP_PAGE_SIZE
+                while(self.running and read == self.CATCH_UP_PAGE_SIZE):
+                    with pool.session() as confirmer:
+                        read = self.catchUp(confirmer)
+            except Exception as e:
+                print("Search index catch-up failed, retrying", e)
+            self.wakeup.wait(self.refreshInterval)
+
+    def add(self, logId: int, content: str):
+        # Ids must come in ascending order, postings stay sorted by appending
+        tokens = set(tokenize(content))
+        if(self.postingsCount + len(tokens) > self.maxPostings):
+            self._drop()
+            return
+        for token in tokens:
+            posting = self.postings.get(token)
+            if(posting is None):
+                posting = self.postings[token] = array("q")
+            posting.append(logId)
+        self.postingsCount += len(tokens)
+        self.lastIndexedId = logId
+        self.indexedLogs += 1
+
+    def _drop(self):
+        print(f"Search index reached {self.maxPostings} postings and is dropped, searches scan LOGS")
+        self.dropped = True
+        # Running searches keep the postings they already hold
+        self.lastIndexedId = 0
+        self.postings = dict()
+        self.postingsCount = 0
+        self.indexedLogs = 0
+
+    def catchUp(self, confirmer) -> int:
+        # Indexes up to CATCH_UP_PAGE_SIZE LOGS rows above the last indexed id, returns how many were read
+        with self.lock:
+            if(self.dropped):
+                return 0
+            rows = confirmer.client.sqlQuery("SELECT id, log FROM LOGS WHERE id > @lastid ORDER BY id ASC LIMIT " + str(self.CATCH_UP_PAGE_SIZE), {"lastid": self.lastIndexedId})
+            for (logId, _), stored in zip(rows, confirmer.resolveReferences([row[1] for row in rows])):
+                try:
+                    self.add(logId, decodeLog(stored))
+                except Exception as e:
+                    # Left out of search results instead of stopping the index at it
+                    print(f"Search index skips log {logId}, it does not decode", e)
+                    self.skippedLogs += 1
+                    self.lastIndexedId = logId
+                if(self.dropped):
+                    return 0
+            return len(rows)
+
+    def candidates(self, tokens: List[str], belowId: int = 0) -> Iterator[int]:
+        # Ids holding every token, newest first, starting below belowId when it is set
+        postings = sorted([self.postings.get(token, array("q")) for token in tokens], key = len)
+        if(len(postings) == 0 or len(postings[0]) == 0):
+            return
+        smallest = postings[0]
+        end = bisect_left(smallest, belowId) if belowId > 0 else len(smallest)
+        for index in range(end - 1, -1, -1):
+            logId = smallest[index]
+            if(all(self._contains(posting, logId) for posting in postings[1:])):
+                yield logId
+
+    @staticmethod
+    def _contains(posting: array, logId: int) -> bool:
+        index = bisect_left(posting, logId)
+        return index < len(posting) and posting[index] == logId
+
+    def __len__(self):
+        return self.indexedLogs
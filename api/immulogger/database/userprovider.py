@@ -1,9 +1,14 @@
+import threading
+import time
+from collections import OrderedDict
 from pydantic import BaseModel, constr
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
 from abc import ABC, abstractmethod
 
 from ..authutils.authutils import AllowedScope
 from ..database.immudb import ImmudbConfirmer
+from ..database.pool import ImmudbConfirmerPool
+from ..metrics import CACHE_LOOKUPS
 
 class User(BaseModel):
     password_hash: constr(min_length=3, max_length=128)
@@ -25,6 +30,10 @@ class UserProvider(ABC):
     @abstractmethod
     def populateDefaults(self) -> bool:
         pass
+
+    def getCachedUser(self, username: str) -> Optional[User]:
+        # Answers only when no I/O is needed, None means ask getUser
+        return None
         
     
 class HardcodedUserProvider(UserProvider):
@@ -48,7 +57,7 @@ class HardcodedUserProvider(UserProvider):
         return True
 
 class ImmudbUserProvider(UserProvider):
-    def __init__(self, immuClient: ImmudbConfirmer):
+    def __init__(self, immuClient: Union[ImmudbConfirmer, ImmudbConfirmerPool]):
         self.immuClient = immuClient
 
     def _generateKeyFromUsername(self, username: str) -> str:
@@ -58,7 +67,7 @@ class ImmudbUserProvider(UserProvider):
         return self._generateKeyFromUsername(username).encode("utf-8")
     
     def getUser(self, username: str) -> Optional[User]:
-        with self.immuClient as client:
+        with self.immuClient.session() as client:
             try:
                 what = client.getVerified(self._generateKeyFromUsername(username))
                 if(what and what.value):
@@ -71,7 +80,7 @@ class ImmudbUserProvider(UserProvider):
 
     def addUser(self, user: User) -> bool:
         toJson = user.json().encode("utf-8")
-        with self.immuClient as client:
+        with self.immuClient.session() as client:
             client.cryptoSet(self._generateKeyFromUsername(user.username), toJson)
             return True
 
@@ -84,3 +93,57 @@ class ImmudbUserProvider(UserProvider):
             self.addUser(User(password_hash= "$2b$12$bL.Dm93w/6qErzSbWKKlquIMbzEpq8oXYDSQqo0RSTegna2hZ5dia", username = "admin3", privileges =[AllowedScope.READ_LOGS]))
         return True
 
+
+class CachedUserProvider(UserProvider):
+    # TTL and size bounded cache in front of any provider. Only found users are cached, so a new user
+    # is visible right away. Users changed through another replica are picked up after ttl seconds.
+    def __init__(self, provider: UserProvider, ttl: float = 60, maxSize: int = 1024):
+        self.provider = provider
+        self.ttl = ttl
+        self.maxSize = maxSize
+        self.users: "OrderedDict[str, Tuple[User, float]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def getCachedUser(self, username: str) -> Optional[User]:
+        with self.lock:
+            cached = self.users.get(username)
+            if(cached is None or cached[1] < time.monotonic()):
+                return None
+            self.users.move_to_end(username)
+            self.hits += 1
+            CACHE_LOOKUPS.labels("user", "hit").inc()
+            return cached[0]
+
+    def getUser(self, username: str) -> Optional[User]:
+        user = self.getCachedUser(username)
+        if(user is not None):
+            return user
+        with self.lock:
+            self.misses += 1
+        CACHE_LOOKUPS.labels("user", "miss").inc()
+        user = self.provider.getUser(username)
+        if(user is not None and self.maxSize > 0):
+            with self.lock:
+                self.users[username] = (user, time.monotonic() + self.ttl)
+                self.users.move_to_end(username)
+                while(len(self.users) > self.maxSize):
+                    self.users.popitem(last = False)
+        return user
+
+    def invalidate(self, username: str):
+        with self.lock:
+            self.users.pop(username, None)
+
+    def addUser(self, user: User) -> bool:
+        try:
+            return self.provider.addUser(user)
+        finally:
+            self.invalidate(user.username)
+
+    def populateDefaults(self) -> bool:
+        result = self.provider.populateDefaults()
+        with self.lock:
+            self.users.clear()
+        return result
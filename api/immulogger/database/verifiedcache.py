@@ -0,0 +1,48 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from ..metrics import CACHE_LOOKUPS
+
+VERIFIED_HITS = CACHE_LOOKUPS.labels("verified", "hit")
+VERIFIED_MISSES = CACHE_LOOKUPS.labels("verified", "miss")
+
+
+class VerifiedCache:
+    # LRU of log confirmations already proven: identifier -> (SHA256 of the content, TX it was proven at).
+    # Confirmations are written once and immudb never changes them, so a proven one stays valid
+    # for every trusted state reached after the TX it was proven at.
+    def __init__(self, maxSize: int = 65536):
+        self.maxSize = maxSize
+        self.entries: "OrderedDict[str, Tuple[bytes, int]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, identifier: str) -> Optional[Tuple[bytes, int]]:
+        with self.lock:
+            cached = self.entries.get(identifier)
+            if(cached is None):
+                self.misses += 1
+                VERIFIED_MISSES.inc()
+                return None
+            self.entries.move_to_end(identifier)
+            self.hits += 1
+            VERIFIED_HITS.inc()
+            return cached
+
+    def put(self, identifier: str, sha: bytes, txId: int):
+        if(self.maxSize < 1):
+            return
+        with self.lock:
+            self.entries[identifier] = (sha, txId)
+            self.entries.move_to_end(identifier)
+            while(len(self.entries) > self.maxSize):
+                self.entries.popitem(last = False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,16 +1,43 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from .config.config import SERVER_TIMING, TRACING_OTEL
+from .metrics import GROUP_COMMIT_PENDING, IMMUDB_SESSIONS_IDLE, INGEST_QUEUE_DEPTH, MetricsMiddleware
+from .tracing import ServerTimingMiddleware, setupOpenTelemetry
 from .routers.authrouter import router as authRouter
 from .routers.logrouter import router as logRouter
 from .routers.userrouter import router as userRouter
 from .serviceprovider import getServiceProvider
 
 app = FastAPI(title = "Immulogger")
+app.add_middleware(MetricsMiddleware)
+if(SERVER_TIMING):
+    app.add_middleware(ServerTimingMiddleware)
+if(TRACING_OTEL):
+    setupOpenTelemetry()
 
 @app.on_event("startup")
 async def onStartup():
     getServiceProvider().userProvider.populateDefaults()    
-    with getServiceProvider().immudbConfirmer as dbClient:
+    with getServiceProvider().immudbConfirmer.session() as dbClient:
         dbClient.createTables()
+    getServiceProvider().startIngestQueue()
+    getServiceProvider().startGroupCommitter()
+    getServiceProvider().startSearchIndex()
+
+@app.on_event("shutdown")
+async def onShutdown():
+    # Drains whatever is still pending, the spool covers a hard kill
+    getServiceProvider().stopIngestQueue()
+    getServiceProvider().stopSearchIndex()
+    getServiceProvider().immudbConfirmer.digester.close()
+
+@app.get("/metrics", include_in_schema = False)
+async def metrics():
+    provider = getServiceProvider()
+    INGEST_QUEUE_DEPTH.set(provider.ingestQueue.depth() if provider.ingestQueue is not None else 0)
+    GROUP_COMMIT_PENDING.set(len(provider.groupCommitter.pending) if provider.groupCommitter is not None else 0)
+    IMMUDB_SESSIONS_IDLE.set(provider.immudbConfirmer.available())
+    return Response(generate_latest(), media_type = CONTENT_TYPE_LATEST)
 
 app.include_router(authRouter, prefix="/api/v1/auth", tags=["authorization"])
 app.include_router(logRouter, prefix="/api/v1/log", tags=["logs"])
@@ -0,0 +1,87 @@
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .tracing import logSlowQuery, span
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_LATENCY = Histogram("immulogger_request_duration_seconds", "Time from request start to the last response byte", ["method", "route", "status"], buckets = LATENCY_BUCKETS)
+IMMUDB_CALL_LATENCY = Histogram("immulogger_immudb_call_duration_seconds", "Time spent in one immudb call", ["method"], buckets = LATENCY_BUCKETS)
+IMMUDB_CALL_ERRORS = Counter("immulogger_immudb_call_errors_total", "immudb calls that raised", ["method"])
+IMMUDB_LOGINS = Counter("immulogger_immudb_logins_total", "Logins to immudb, first ones and re-logins after TTL or a broken session")
+BATCH_LOGS = Histogram("immulogger_batch_logs", "Logs per /log/batchcreate request", buckets = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000))
+BATCH_CHUNKS = Histogram("immulogger_batch_chunks", "immudb transactions per /log/batchcreate request", buckets = (1, 2, 4, 8, 16, 32, 64, 128))
+CACHE_LOOKUPS = Counter("immulogger_cache_lookups_total", "Lookups in the in-process caches", ["cache", "result"])
+INGEST_DROPPED_BATCHES = Counter("immulogger_ingest_dropped_batches_total", "Fire-and-forget batches that failed while the app stopped, kept for a replay only with a spool")
+INGEST_DROPPED_LOGS = Counter("immulogger_ingest_dropped_logs_total", "Logs of dropped fire-and-forget batches")
+INGEST_REQUEUED_BATCHES = Counter("immulogger_ingest_requeued_batches_total", "Fire-and-forget batches put back on the queue after every attempt failed")
+INGEST_REJECTED_LOGS = Counter("immulogger_ingest_rejected_logs_total", "Fire-and-forget logs refused with 503 because the queue was full")
+INGEST_QUEUE_DEPTH = Gauge("immulogger_ingest_queue_depth", "Logs accepted without waiting and not committed yet")
+GROUP_COMMIT_PENDING = Gauge("immulogger_group_commit_pending", "Single-log writes waiting for their group to be flushed")
+IMMUDB_SESSIONS_IDLE = Gauge("immulogger_immudb_sessions_idle", "Pooled immudb sessions not checked out")
+
+# Backend calls that go over the wire, anything else is passed through untimed
+TIMED_METHODS = {"login", "logout", "healthCheck", "sqlExec", "sqlQuery", "setAll", "verifiedSet", "verifiedGet", "verifiedGetAt", "getAllValues"}
+
+
+def _timedCall(name: str, call):
+    histogram = IMMUDB_CALL_LATENCY.labels(name)
+    errors = IMMUDB_CALL_ERRORS.labels(name)
+
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            with span(name):
+                return call(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            histogram.observe(elapsed)
+            logSlowQuery(name, args, kwargs, elapsed)
+    return timed
+
+
+def timeBackendCalls(backend):
+    # Shadows the TIMED_METHODS of one backend instance with timed and traced versions, the backend keeps its type
+    for name in TIMED_METHODS:
+        setattr(backend, name, _timedCall(name, getattr(backend, name)))
+    return backend
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware, so streamed responses are timed until their last chunk.
+    # Routes are labelled by their path template, requests that matched no route share one label
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.routeTemplates = dict()
+
+    def _routeFor(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if(endpoint is None):
+            return "unmatched"
+        if(endpoint not in self.routeTemplates):
+            router = scope["app"].router
+            self.routeTemplates = {route.endpoint: route.path for route in router.routes if hasattr(route, "endpoint")}
+        return self.routeTemplates.get(endpoint, "unmatched")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if(scope["type"] != "http"):
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def sendTimed(message: Message):
+            nonlocal status
+            if(message["type"] == "http.response.start"):
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, sendTimed)
+        finally:
+            REQUEST_LATENCY.labels(scope["method"], self._routeFor(scope), str(status)).observe(time.perf_counter() - started)
@@ -3,11 +3,13 @@ from fastapi import APIRouter, Security
 from pydantic import ValidationError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm, SecurityScopes
-from jose import JWTError, jwt
+from starlette.concurrency import run_in_threadpool
+from jose import JWTError
 from datetime import timedelta
 
 from ..database.userprovider import User, UserProvider
-from ..authutils.authutils import verify_password, oauth2_scheme, SECRET_KEY, ALGORITHM, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, AllowedScope
+from ..database.asyncconfirmer import AsyncImmudbConfirmer
+from ..authutils.authutils import verify_password, oauth2_scheme, token_cache, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, AllowedScope
 from ..serviceprovider import getServiceProvider
 from .models.authmodel import Token, TokenData
 
@@ -16,11 +18,15 @@ router = APIRouter()
 async def getUserProvider():
     return getServiceProvider().userProvider
 
-async def authenticate_user(userProvider: UserProvider, username: str, password: str):
-    user = userProvider.getUser(username)
+async def getAsyncConfirmer() -> AsyncImmudbConfirmer:
+    return getServiceProvider().getAsyncConfirmer()
+
+async def authenticate_user(userProvider: UserProvider, username: str, password: str, confirmer: AsyncImmudbConfirmer):
+    user = await confirmer.run(userProvider.getUser, username)
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    # bcrypt is deliberately slow, keep it off the event loop as well
+    if not await run_in_threadpool(verify_password, password, user.password_hash):
         return False
     return user
 
@@ -32,7 +38,7 @@ async def user_has_privileges(user: User, form_data_scopes: List[str]):
             return False
     return True
 
-async def get_current_user(security_scopes: SecurityScopes, userProvider: UserProvider = Depends(getUserProvider), token: str = Depends(oauth2_scheme)):
+async def get_current_user(security_scopes: SecurityScopes, userProvider: UserProvider = Depends(getUserProvider), confirmer: AsyncImmudbConfirmer = Depends(getAsyncConfirmer), token: str = Depends(oauth2_scheme)):
     if security_scopes.scopes:
         authenticate_value = f'Bearer scope="{security_scopes.scope_str}"'
     else:
@@ -43,7 +49,7 @@ async def get_current_user(security_scopes: SecurityScopes, userProvider: UserPr
         headers={"WWW-Authenticate": authenticate_value},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = token_cache.decode(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
@@ -51,7 +57,9 @@ async def get_current_user(security_scopes: SecurityScopes, userProvider: UserPr
         token_data = TokenData(scopes=token_scopes, username=username)
     except (JWTError, ValidationError):
         raise credentials_exception
-    user = userProvider.getUser(token_data.username)
+    user = userProvider.getCachedUser(token_data.username)
+    if user is None:
+        user = await confirmer.run(userProvider.getUser, token_data.username)
     if user is None:
         raise credentials_exception
     for scope in security_scopes.scopes:
@@ -65,8 +73,8 @@ async def get_current_user(security_scopes: SecurityScopes, userProvider: UserPr
 
 
 @router.post("/token", response_model=Token, summary="Generate access token")
-async def login_for_access_token(userProvider = Depends(getUserProvider), form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await authenticate_user(userProvider, form_data.username, form_data.password)
+async def login_for_access_token(userProvider = Depends(getUserProvider), confirmer: AsyncImmudbConfirmer = Depends(getAsyncConfirmer), form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await authenticate_user(userProvider, form_data.username, form_data.password, confirmer)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
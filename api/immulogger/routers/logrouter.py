@@ -1,57 +1,184 @@
-from typing import List
-from fastapi import APIRouter, BackgroundTasks, Query, Security
-from fastapi import Depends
-from pydantic import conint
+from collections import deque
+from typing import List, Optional
+import asyncio
+import time
+from fastapi import APIRouter, Query, Request, Security
+from fastapi import Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import orjson
+from starlette.concurrency import run_in_threadpool
+from pydantic import conint, constr
 
 from ..authutils.authutils import AllowedScope
+from ..config.config import LOG_MAX_LENGTH
 from .authrouter import get_current_user
 from ..database.immudb import ImmudbConfirmer
-from .models.logmodel import AddLogRequest, AddLogResponse, AddLogsRequest, AddLogsResponse, CountResponse, LogsResponse, VerifyRequest, VerifyResponse, VerifySHARequest
+from ..database.pool import FAILED_IDENTIFIER, ImmudbConfirmerPool
+from ..database.asyncconfirmer import AsyncImmudbConfirmer
+from ..database.ingestqueue import IngestQueue, IngestQueueFull
+from ..database.groupcommit import GroupCommitter
+from ..database.cursor import InvalidCursor, decodeCursor, encodeCursor
+from ..database.searchindex import InvalidSearchQuery, SearchQuery
+from .models.logmodel import AddLogRequest, AddLogResponse, AddLogsRequest, AddLogsResponse, ChunkError, CountResponse, LogRecord, LogsResponse, VerifyBatchRequest, VerifyBatchResponse, VerifyBatchResult, VerifyRequest, VerifyResponse, VerifySHARequest, tagConstraint
+from .ndjson import readLines
 from ..serviceprovider import getServiceProvider
 router = APIRouter()
 
-async def getImmudbClient() -> ImmudbConfirmer:
-    return getServiceProvider().immudbConfirmer
+# A log of LOG_MAX_LENGTH characters all escaped as \uXXXX inside {"logContent": ...}
+MAX_LINE_BYTES = LOG_MAX_LENGTH * 6 + 64
 
-async def withWrapper(withWhat, callWhat, withWhatParam):
-    with withWhat as withWhatOpened:
-        func = getattr(withWhatOpened, callWhat)
-        print("Background wrapper task ended", func(withWhatParam))
+async def getImmudbClient() -> AsyncImmudbConfirmer:
+    return getServiceProvider().getAsyncConfirmer()
+
+async def getIngestQueue() -> IngestQueue:
+    return getServiceProvider().ingestQueue
+
+async def getGroupCommitter() -> GroupCommitter:
+    return getServiceProvider().groupCommitter
+
+async def queueLogs(ingestQueue: IngestQueue, logs: List[str], tags: List[str]):
+    try:
+        await run_in_threadpool(ingestQueue.put, logs, tags, int(time.time() * 1000))
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "1"})
 
 @router.put("/create", summary="Add log", response_model=AddLogResponse)
-async def addLog(logRequest: AddLogRequest, background_tasks: BackgroundTasks, confirmer: ImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.SEND_LOGS.value])):
+async def addLog(logRequest: AddLogRequest, groupCommitter: GroupCommitter = Depends(getGroupCommitter), ingestQueue: IngestQueue = Depends(getIngestQueue), current_user = Security(get_current_user, scopes=[AllowedScope.SEND_LOGS.value])):
     if(logRequest.waitForIdentifier):
-        with confirmer as client:
-            return AddLogResponse(logId = client.processLogRequest(logRequest))
+        return AddLogResponse(logId = await groupCommitter.submit(logRequest.logContent, int(time.time() * 1000), logRequest.tags))
     else:
-        background_tasks.add_task(withWrapper, confirmer, "processLogRequest", logRequest)
+        await queueLogs(ingestQueue, [logRequest.logContent], logRequest.tags)
         return AddLogResponse(logId = "NOT_WAITING")
 
 @router.put("/batchcreate", summary="Add logs", response_model=AddLogsResponse)
-async def addLogs(logRequest: AddLogsRequest, background_tasks: BackgroundTasks, confirmer: ImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.SEND_LOGS.value])):
+async def addLogs(logRequest: AddLogsRequest, confirmer: AsyncImmudbConfirmer = Depends(getImmudbClient), ingestQueue: IngestQueue = Depends(getIngestQueue), current_user = Security(get_current_user, scopes=[AllowedScope.SEND_LOGS.value])):
     if(logRequest.waitForIdentifier):
-        with confirmer as client:   
-            return AddLogsResponse(logIds = client.processLogsRequest(logRequest))
+        logIds, failedChunks = await confirmer.run(confirmer.pool.processLogsRequest, logRequest)
+        return AddLogsResponse(logIds = logIds, failedChunks = failedChunks)
     else:
-        background_tasks.add_task(withWrapper, confirmer, "processLogsRequest", logRequest)
+        await queueLogs(ingestQueue, logRequest.contents(), logRequest.tags)
         return AddLogsResponse(logIds = ["NOT_WAITING"])
 
+@router.put("/streamcreate", summary="Add logs from an NDJSON body", response_model=AddLogsResponse)
+async def addLogsStream(request: Request, tags: List[tagConstraint] = Query([]), waitForIdentifier: bool = True, confirmer: AsyncImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.SEND_LOGS.value])):
+    # One log per line, a JSON string or {"logContent": ...}. Lines are stored chunk by chunk while the body arrives,
+    # so memory is bounded by the chunks in flight and not by the body, which has no limit on the number of logs.
+    # Invalid lines are listed in failedChunks and skipped, the lines before them may already be stored.
+    # waitForIdentifier=false only leaves out the identifiers, chunks are still committed here and not queued:
+    # a body without a limit would only fill the ingest queue up to its bound and then fail halfway
+    if(len(tags) > 16):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="At most 16 tags")
+    chunkSize = ImmudbConfirmer.chunkSize(tags)
+    inFlight = deque()
+    identifiers = []
+    failedChunks = []
+    errors = []
+
+    def submit(lines: List[Optional[bytes]], start: int):
+        inFlight.append((start, len(lines), asyncio.ensure_future(confirmer.run(confirmer.pool.processLogLines, lines, start, tags))))
+
+    async def collect():
+        start, count, task = inFlight.popleft()
+        try:
+            chunkIdentifiers, chunkFailures = await task
+        except Exception as e:
+            errors.append(e)
+            chunkIdentifiers, chunkFailures = [FAILED_IDENTIFIER] * count, [ChunkError(start = start, end = start + count, error = str(e))]
+        identifiers.extend(chunkIdentifiers)
+        failedChunks.extend(chunkFailures)
+
+    lines = []
+    position = 0
+    async for line in readLines(request.stream(), MAX_LINE_BYTES):
+        lines.append(line)
+        if(len(lines) == chunkSize):
+            submit(lines, position)
+            position += len(lines)
+            lines = []
+            # Up to IMMUDB_BATCH_PARALLELISM chunks are stored while the next one is read
+            if(len(inFlight) >= confirmer.pool.batchParallelism):
+                await collect()
+    if(len(lines) > 0):
+        submit(lines, position)
+        position += len(lines)
+    while(len(inFlight) > 0):
+        await collect()
+    if(position == 0):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No logs in body")
+    # Like /batchcreate, a request of which no chunk could be stored fails as a whole
+    if(len(errors) == (position + chunkSize - 1) // chunkSize):
+        raise errors[0]
+    return AddLogsResponse(logIds = identifiers if waitForIdentifier else ["NOT_WAITING"], failedChunks = failedChunks)
+
+def logsPageResponse(logs: List[LogRecord], nextLastId: int, nextLastCreated: int = 0) -> ORJSONResponse:
+    # Written straight from the records, response_model only documents the shape. Validating and encoding
+    # a model per row cost more than reading the page from immudb
+    return ORJSONResponse({"logs": logs, "nextCursor": encodeCursor(nextLastId, nextLastCreated)})
+
+def streamLogs(confirmer: ImmudbConfirmerPool, limit: int, verify: bool, tags: List[str], lastId: int, createdFrom: int, createdTo: int, lastCreated: int):
+    # One log per line, the last line carries the cursor to continue from.
+    # Starlette iterates sync generators in its threadpool, so pages are fetched off the event loop.
+    # A session is checked out per page and given back before its rows are written, a slow reader holds none
+    remaining = limit
+    while True:
+        pageLimit = ImmudbConfirmer.PAGE_SIZE if limit < 1 else min(ImmudbConfirmer.PAGE_SIZE, remaining)
+        with confirmer.session() as client:
+            logs, lastId, lastCreated = client.getLogsPage(pageLimit, verify, tags, lastId, createdFrom, createdTo, lastCreated)
+        for log in logs:
+            yield orjson.dumps(log) + b"\n"
+        remaining = remaining - len(logs)
+        if(lastId == 0 or (limit >= 1 and remaining <= 0)):
+            break
+    yield orjson.dumps({"nextCursor": encodeCursor(lastId, lastCreated)}) + b"\n"
+
 @router.get("/get", summary="Get logs", response_model=LogsResponse)
-async def getLogs(limit: conint(le = 1000) = -1, verify: bool = False, tags: List[str] = Query([]), confirmer: ImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.READ_LOGS.value])):
-    with confirmer as client:
-        return LogsResponse(logs = client.getLastLogs(limit, verify, tags))
+async def getLogs(limit: conint(le = 1000) = -1, verify: bool = False, tags: List[str] = Query([]), cursor: Optional[str] = None, stream: bool = False, createdFrom: conint(ge = 0) = Query(0, alias = "from", description = "Only logs received at or after this time, milliseconds since epoch"), createdTo: conint(ge = 0) = Query(0, alias = "to", description = "Only logs received before this time, milliseconds since epoch"), confirmer: AsyncImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.READ_LOGS.value])):
+    try:
+        lastId, lastCreated = decodeCursor(cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if(createdFrom > 0 and createdTo > 0 and createdFrom >= createdTo):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from must be lower than to")
+    # Reads with a range are ordered by createdate and their cursors carry it, the others by id alone
+    if(lastId > 0 and (lastCreated > 0) != (createdFrom > 0 or createdTo > 0)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor does not belong to this from/to")
+    if(stream):
+        return StreamingResponse(streamLogs(confirmer.pool, limit, verify, tags, lastId, createdFrom, createdTo, lastCreated), media_type="application/x-ndjson")
+    logs, nextLastId, nextLastCreated = await confirmer.call("getLogsPage", limit, verify, tags, lastId, createdFrom, createdTo, lastCreated)
+    return logsPageResponse(logs, nextLastId, nextLastCreated)
+
+@router.get("/search", summary="Search logs by content", response_model=LogsResponse)
+async def searchLogs(q: constr(min_length = 1, max_length = 1024) = Query(..., description = 'Terms and "quoted phrases", a log has to contain all of them'), limit: conint(ge = 1, le = 1000) = 100, verify: bool = False, cursor: Optional[str] = None, confirmer: AsyncImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.READ_LOGS.value])):
+    try:
+        lastId, lastCreated = decodeCursor(cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if(lastCreated > 0):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    try:
+        query = SearchQuery.parse(q)
+    except InvalidSearchQuery as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    logs, nextLastId = await confirmer.call("searchLogsPage", query, limit, verify, lastId)
+    return logsPageResponse(logs, nextLastId)
 
 @router.get("/count", summary="Count logs", response_model=CountResponse)
-async def countLogs(confirmer: ImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.READ_LOGS.value])):
-    with confirmer as client:
-        return CountResponse(count = client.getLogCount())
+async def countLogs(tags: List[str] = Query([]), confirmer: AsyncImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.READ_LOGS.value])):
+    if(len(tags) > 16):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="At most 16 tags")
+    total, tagCounts = await confirmer.call("getLogCounts", tags)
+    return CountResponse(count = total, tags = tagCounts)
 
 @router.post("/verify", summary="Log content verify", response_model=VerifyResponse)
-async def verifyLogContent(body: VerifyRequest, confirmer: ImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.READ_LOGS.value])):
-    with confirmer as client:
-        return VerifyResponse(verified = client.verifyLogContent(body.logContent, body.identifier))
+async def verifyLogContent(body: VerifyRequest, confirmer: AsyncImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.READ_LOGS.value])):
+    return VerifyResponse(verified = await confirmer.call("verifyLogContent", body.logContent, body.identifier))
 
 @router.post("/verifySha", summary="Log SHA256 verify", response_model=VerifyResponse)
-async def verifyLogContent(body: VerifySHARequest, confirmer: ImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.READ_LOGS.value])):
-    with confirmer as client:
-        return VerifyResponse(verified = client.verifyLogSha(body.logSHA, body.identifier))
\ No newline at end of file
+async def verifyLogContent(body: VerifySHARequest, confirmer: AsyncImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.READ_LOGS.value])):
+    return VerifyResponse(verified = await confirmer.call("verifyLogSha", body.logSHA, body.identifier))
+
+@router.post("/verifyBatch", summary="Verify many logs at once", response_model=VerifyBatchResponse)
+async def verifyBatch(body: VerifyBatchRequest, confirmer: AsyncImmudbConfirmer = Depends(getImmudbClient), current_user = Security(get_current_user, scopes=[AllowedScope.READ_LOGS.value])):
+    items = [(item.identifier, item.logSHA if item.logSHA is not None else ImmudbConfirmer.makeStrSha256(item.logContent.encode("utf-8"))) for item in body.items]
+    verified = await confirmer.call("verifyBatch", items)
+    return VerifyBatchResponse(results = [VerifyBatchResult(identifier = item.identifier, verified = itemVerified) for item, itemVerified in zip(body.items, verified)])
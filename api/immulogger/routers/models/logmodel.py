@@ -1,8 +1,12 @@
 
-from pydantic import BaseModel, conlist, constr
-from typing import Optional, List, Union
+from dataclasses import dataclass
+import orjson
+from pydantic import BaseModel, conlist, constr, root_validator, validator
+from typing import Dict, Optional, List, Tuple, Union
+from ...config.config import LOG_MAX_LENGTH
+from ...database.logcodec import CODEC_MARKER, STORED_LOG_LENGTH, encodingEnabled, fitsStorage
     
-logConstraint = constr(max_length=4096, min_length=1)
+logConstraint = constr(max_length=LOG_MAX_LENGTH, min_length=1)
 tagConstraint = constr(max_length=64, min_length=1)
 identifierConstraint = constr(max_length=64, min_length=1)
 shaConstraint = constr(max_length=64, min_length=1)
@@ -18,24 +22,105 @@ class VerifySHARequest(BaseModel):
 class VerifyResponse(BaseModel):
     verified: bool
 
+class VerifyBatchItem(BaseModel):
+    identifier: identifierConstraint
+    logContent: Optional[logConstraint] = None
+    logSHA: Optional[shaConstraint] = None
+
+    @root_validator(skip_on_failure=True)
+    def contentOrSha(cls, values):
+        if((values.get("logContent") is None) == (values.get("logSHA") is None)):
+            raise ValueError("Exactly one of logContent and logSHA is required")
+        return values
+
+class VerifyBatchRequest(BaseModel):
+    items: conlist(item_type = VerifyBatchItem, min_items = 1, max_items = 1024)
+
+class VerifyBatchResult(BaseModel):
+    identifier: str
+    verified: bool
+
+class VerifyBatchResponse(BaseModel):
+    results: List[VerifyBatchResult]
+
+def checkStorable(content: str) -> str:
+    # With compression or dedup on the codec marker would make a sent log look encoded
+    if(content.startswith(CODEC_MARKER) and encodingEnabled()):
+        raise ValueError("Log may not start with \\x01 while LOG_COMPRESSION or LOG_DEDUP is on")
+    if(not fitsStorage(content)):
+        raise ValueError(f"Log does not fit in {STORED_LOG_LENGTH} characters after compression")
+    return content
+
 class AddLogBody(BaseModel):
     logContent: logConstraint
 
+    _storable = validator("logContent", allow_reuse=True)(checkStorable)
+
 class AddLogRequest(AddLogBody):
     tags: conlist(item_type = tagConstraint, min_items = 0, max_items = 16) = []
     waitForIdentifier: bool = True
 
 class AddLogsRequest(BaseModel):
-    logs: conlist(item_type = Union[AddLogBody, logConstraint], min_items=1, max_items=10240)
+    # Plain strings first, most batches send them and a failed AddLogBody attempt per item doubled validation time
+    logs: conlist(item_type = Union[logConstraint, AddLogBody], min_items=1, max_items=10240)
     tags: conlist(item_type = tagConstraint, min_items = 0, max_items = 16) = []
     waitForIdentifier: bool = True
 
+    @validator("logs", each_item=True)
+    def storable(cls, log):
+        if(type(log) != AddLogBody):
+            checkStorable(log)
+        return log
+
+    def contents(self) -> List[str]:
+        return [log.logContent if type(log) == AddLogBody else log for log in self.logs]
+
 class AddLogResponse(BaseModel):
     logId: str
     
+class ChunkError(BaseModel):
+    # Input positions [start, end) were not stored
+    start: int
+    end: int
+    error: str
+
 class AddLogsResponse(BaseModel):
     logIds: List[str]
+    failedChunks: List[ChunkError] = []
+
+def parseLogLine(line: Optional[bytes]) -> str:
+    # One line of an NDJSON ingest body, a JSON string or {"logContent": ...} checked like an AddLogsRequest item.
+    # None is a line the reader dropped for being too long
+    if(line is None):
+        raise ValueError("Line too long")
+    try:
+        item = orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    return (AddLogBody(logContent = item) if type(item) == str else AddLogBody.parse_obj(item)).logContent
+
+def parseLogLines(lines: List[Optional[bytes]], start: int) -> Tuple[List[Optional[str]], List[ChunkError]]:
+    # Contents by position, None where a line was invalid. Positions count from start, the first line of the body is 0
+    contents = []
+    failedChunks = []
+    for index, line in enumerate(lines):
+        try:
+            contents.append(parseLogLine(line))
+        except ValueError as e:
+            contents.append(None)
+            failedChunks.append(ChunkError(start = start + index, end = start + index + 1, error = str(e)))
+    return contents, failedChunks
+
 
+@dataclass
+class LogRecord:
+    # A log as the read path carries it, fields of LogResponse without a model per row. Routes write it with orjson
+    __slots__ = ("log", "uniqueidentifier", "createdate", "tags", "verified")
+    log: str
+    uniqueidentifier: str
+    createdate: int
+    tags: List[str]
+    verified: bool
 
 class LogResponse(BaseModel):
     log: str
@@ -46,6 +131,9 @@ class LogResponse(BaseModel):
     
 class LogsResponse(BaseModel):
     logs: List[LogResponse]
+    nextCursor: Optional[str] = None
 
 class CountResponse(BaseModel):
-    count: int
\ No newline at end of file
+    count: int
+    # Logs carrying each requested tag
+    tags: Dict[str, int] = {}
\ No newline at end of file
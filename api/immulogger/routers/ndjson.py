@@ -0,0 +1,31 @@
+from typing import AsyncIterator, Optional
+
+
+async def readLines(stream: AsyncIterator[bytes], maxLineBytes: int) -> AsyncIterator[Optional[bytes]]:
+    # Lines of a newline-delimited body as its pieces arrive, blank lines are skipped.
+    # A line longer than maxLineBytes comes out as None and its bytes are dropped, one line never holds more in memory
+    buffer = bytearray()
+    overlong = False
+    async for piece in stream:
+        start = 0
+        end = piece.find(b"\n")
+        while(end >= 0):
+            if(not overlong):
+                buffer += piece[start:end]
+            if(overlong or len(buffer) > maxLineBytes):
+                yield None
+            elif(buffer.strip()):
+                yield bytes(buffer)
+            buffer.clear()
+            overlong = False
+            start = end + 1
+            end = piece.find(b"\n", start)
+        if(not overlong):
+            buffer += piece[start:]
+            if(len(buffer) > maxLineBytes):
+                overlong = True
+                buffer.clear()
+    if(overlong or len(buffer) > maxLineBytes):
+        yield None
+    elif(buffer.strip()):
+        yield bytes(buffer)
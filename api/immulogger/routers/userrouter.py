@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Security
 from fastapi import Depends
+from starlette.concurrency import run_in_threadpool
 from ..authutils.authutils import AllowedScope, get_password_hash
 from ..database.userprovider import User, UserProvider
-from .authrouter import get_current_user
+from .authrouter import get_current_user, getAsyncConfirmer
+from ..database.asyncconfirmer import AsyncImmudbConfirmer
 from .models.usermodel import CreateUserResponse, CreateUserRequest
 from ..serviceprovider import getServiceProvider
 router = APIRouter()
@@ -11,8 +13,8 @@ async def getUserProvider() -> UserProvider:
     return getServiceProvider().userProvider
 
 @router.put("/create", summary="Creates User", response_model=CreateUserResponse)
-async def createUser(userRequest: CreateUserRequest, userProvider: UserProvider = Depends(getUserProvider), current_user = Security(get_current_user, scopes=[AllowedScope.USER_ADMIN.value])):
-    password_hashed = get_password_hash(userRequest.password)
+async def createUser(userRequest: CreateUserRequest, userProvider: UserProvider = Depends(getUserProvider), confirmer: AsyncImmudbConfirmer = Depends(getAsyncConfirmer), current_user = Security(get_current_user, scopes=[AllowedScope.USER_ADMIN.value])):
+    password_hashed = await run_in_threadpool(get_password_hash, userRequest.password)
     newUser = User(password_hash = password_hashed, username = userRequest.username, privileges = userRequest.privileges)
-    return CreateUserResponse(status = userProvider.addUser(newUser))
+    return CreateUserResponse(status = await confirmer.run(userProvider.addUser, newUser))
     
@@ -1,14 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
-from .config.config import IMMUDB_URL, IMMUDB_LOGIN, IMMUDB_PASSWORD, IMMUDB_KEY_PATH
-from .database.immudb import ImmudbConfirmer
-from .database.userprovider import ImmudbUserProvider, UserProvider
+from typing import Optional
+from .config.config import IMMUDB_URL, IMMUDB_LOGIN, IMMUDB_PASSWORD, IMMUDB_KEY_PATH, IMMUDB_POOL_SIZE, IMMUDB_SESSION_TTL, IMMUDB_POOL_TIMEOUT, IMMUDB_HEALTHCHECK_INTERVAL, IMMUDB_BATCH_PARALLELISM, VERIFIED_CACHE_SIZE, LOG_COUNTS_RECONCILE_INTERVAL, LOG_DEDUP_CACHE_SIZE, PREPROCESS_WORKERS, PREPROCESS_MIN_LOGS, LOG_COUNTS_MAX_TAGS, SEARCH_INDEX_MAX_POSTINGS, SEARCH_INDEX_REFRESH_INTERVAL, IMMUDB_WORKERS, INGEST_SPOOL_PATH, INGEST_SPOOL_FSYNC, INGEST_MAX_BATCH_LINES, INGEST_MAX_LINGER, INGEST_MAX_PENDING_LOGS, INGEST_SPOOL_COMPACT_BYTES, GROUP_COMMIT_MAX_WAIT, GROUP_COMMIT_MAX_SIZE, USER_CACHE_TTL, USER_CACHE_SIZE
+from .database.pool import ImmudbConfirmerPool
+from .database.asyncconfirmer import AsyncImmudbConfirmer
+from .database.ingestqueue import IngestQueue
+from .database.groupcommit import GroupCommitter
+from .database.userprovider import CachedUserProvider, ImmudbUserProvider, UserProvider
 
 
 
 class ServiceProvider:
     def __init__(self):
-        self.immudbConfirmer = ImmudbConfirmer(IMMUDB_URL, IMMUDB_LOGIN, IMMUDB_PASSWORD, IMMUDB_KEY_PATH)
-        self.userProvider = ImmudbUserProvider(self.immudbConfirmer)
+        self.immudbConfirmer = ImmudbConfirmerPool(IMMUDB_URL, IMMUDB_LOGIN, IMMUDB_PASSWORD, IMMUDB_KEY_PATH, IMMUDB_POOL_SIZE, IMMUDB_SESSION_TTL, IMMUDB_POOL_TIMEOUT, IMMUDB_HEALTHCHECK_INTERVAL, IMMUDB_BATCH_PARALLELISM, VERIFIED_CACHE_SIZE, LOG_COUNTS_RECONCILE_INTERVAL, LOG_DEDUP_CACHE_SIZE, PREPROCESS_WORKERS, PREPROCESS_MIN_LOGS, LOG_COUNTS_MAX_TAGS, SEARCH_INDEX_MAX_POSTINGS, SEARCH_INDEX_REFRESH_INTERVAL)
+        self.userProvider = CachedUserProvider(ImmudbUserProvider(self.immudbConfirmer), USER_CACHE_TTL, USER_CACHE_SIZE)
+        self.executor = ThreadPoolExecutor(max_workers = IMMUDB_WORKERS, thread_name_prefix = "immudb")
+        self.ingestQueue: Optional[IngestQueue] = None
+        self.groupCommitter: Optional[GroupCommitter] = None
+
+    def getAsyncConfirmer(self) -> AsyncImmudbConfirmer:
+        return AsyncImmudbConfirmer(self.immudbConfirmer, self.executor)
+
+    def startIngestQueue(self):
+        # Started on app startup, so it flushes into whatever pool is configured by then
+        if(self.ingestQueue is None):
+            self.ingestQueue = IngestQueue(self.immudbConfirmer, INGEST_SPOOL_PATH, INGEST_MAX_BATCH_LINES, INGEST_MAX_LINGER, INGEST_SPOOL_FSYNC, maxPendingLogs = INGEST_MAX_PENDING_LOGS, spoolCompactBytes = INGEST_SPOOL_COMPACT_BYTES)
+            self.ingestQueue.start()
+
+    def stopIngestQueue(self):
+        if(self.ingestQueue is not None):
+            self.ingestQueue.stop()
+            self.ingestQueue = None
+
+    def startSearchIndex(self):
+        self.immudbConfirmer.searchIndex.start(self.immudbConfirmer)
+
+    def stopSearchIndex(self):
+        self.immudbConfirmer.searchIndex.stop()
+
+    def startGroupCommitter(self):
+        self.groupCommitter = GroupCommitter(self.getAsyncConfirmer(), GROUP_COMMIT_MAX_WAIT, GROUP_COMMIT_MAX_SIZE)
 
     def setUserProvider(self, userProvider: UserProvider):
         self.userProvider = userProvider
@@ -0,0 +1,111 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config.config import SLOW_QUERY_THRESHOLD
+
+# Statements longer than this are cut in the slow-query log
+SLOW_QUERY_MAX_LENGTH = 4096
+SLOW_QUERY_METHODS = {"sqlExec", "sqlQuery"}
+
+slowQueryThreshold = SLOW_QUERY_THRESHOLD
+tracer = None
+
+
+class RequestTimings:
+    # Total time and count per span name for one request. Spans may end on executor threads, hence the lock
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans: Dict[str, List[float]] = dict()
+
+    def add(self, name: str, elapsed: float):
+        with self.lock:
+            entry = self.spans.setdefault(name, [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += 1
+
+    def serverTiming(self, total: float) -> str:
+        with self.lock:
+            parts = [f'{name};desc="{count} calls";dur={elapsed * 1000:.2f}' for name, (elapsed, count) in self.spans.items()]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+currentTimings: ContextVar[Optional[RequestTimings]] = ContextVar("currentTimings", default = None)
+
+
+@contextmanager
+def span(name: str):
+    # Adds the time of the block to the current request, if any, and to OpenTelemetry when it is set up
+    timings = currentTimings.get()
+    otelSpan = tracer.start_as_current_span(name) if tracer is not None else nullcontext()
+    with otelSpan:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if(timings is not None):
+                timings.add(name, time.perf_counter() - started)
+
+
+def logSlowQuery(method: str, args, kwargs, elapsed: float):
+    if(slowQueryThreshold <= 0 or elapsed < slowQueryThreshold or method not in SLOW_QUERY_METHODS):
+        return
+    statement = args[0] if len(args) > 0 else kwargs.get("stmt", kwargs.get("query", ""))
+    params = args[1] if len(args) > 1 else kwargs.get("params", None)
+    rendered = " ".join(str(statement).split())[0:SLOW_QUERY_MAX_LENGTH]
+    print(f"Slow {method} took {elapsed * 1000:.1f}ms with {len(params or {})} params: {rendered}")
+
+
+def setupOpenTelemetry():
+    # opentelemetry is optional. With the SDK and the OTLP exporter installed spans go to OTEL_EXPORTER_OTLP_ENDPOINT,
+    # with only the API installed they go to whatever provider was set up outside, e.g. by opentelemetry-instrument
+    global tracer
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        print("TRACING_OTEL is set but opentelemetry-api is not installed, spans are not exported")
+        return
+    try:
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        provider = TracerProvider()
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+    except ImportError:
+        pass
+    tracer = trace.get_tracer("immulogger")
+
+
+class ServerTimingMiddleware:
+    # Collects the spans of one request and returns them in the Server-Timing header.
+    # Streamed responses only report what happened before their first chunk
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if(scope["type"] != "http"):
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = currentTimings.set(timings)
+        started = time.perf_counter()
+
+        async def sendWithTiming(message: Message):
+            if(message["type"] == "http.response.start"):
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.serverTiming(time.perf_counter() - started).encode("latin-1")))
+                message = dict(message, headers = headers)
+            await send(message)
+
+        requestSpan = tracer.start_as_current_span(f"{scope['method']} {scope['path']}") if tracer is not None else nullcontext()
+        try:
+            with requestSpan:
+                await self.app(scope, receive, sendWithTiming)
+        finally:
+            currentTimings.reset(token)
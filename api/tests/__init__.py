@@ -1,9 +1,14 @@
-
+import os
+import uuid
 import pytest
 from pytest_docker.plugin import get_docker_services
 from immulogger.database.immudb import ImmudbConfirmer
+from immulogger.database.memorybackend import dropMemoryStorage
 import requests
 
+# "memory" runs the suites against the in-process backend, no docker needed
+TEST_BACKEND = os.environ.get("IMMULOGGER_TEST_BACKEND", "docker")
+
 def is_responsive(url):
     try:
         response = requests.get(url, timeout=0.2)
@@ -20,11 +25,18 @@ def docker_services_each(docker_compose_file, docker_compose_project_name, docke
         yield docker_service
 
 @pytest.fixture(scope="function")
-def immudb_service(docker_ip, docker_services_each):
+def immudb_service(request):
+    if(TEST_BACKEND == "memory"):
+        name = f"test-{uuid.uuid4()}"
+        yield ImmudbConfirmer(f"memory://{name}", "immudb", "immudb", "/certs/public_signing_key.pem")
+        dropMemoryStorage(name)
+        return
+    docker_ip = request.getfixturevalue("docker_ip")
+    docker_services_each = request.getfixturevalue("docker_services_each")
     clientPort = docker_services_each.port_for("immudb", 3322)
     port = docker_services_each.port_for("immudb", 8080)
     url = "http://{}:{}".format(docker_ip, port)
     docker_services_each.wait_until_responsive(
         timeout=30.0, pause=0.1, check=lambda: is_responsive(url)
     )
-    return ImmudbConfirmer(f"{docker_ip}:{clientPort}", "immudb", "immudb", "/certs/public_signing_key.pem")
\ No newline at end of file
+    yield ImmudbConfirmer(f"{docker_ip}:{clientPort}", "immudb", "immudb", "/certs/public_signing_key.pem")
@@ -1,4 +1,5 @@
-from typing import List
+import json
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -46,6 +47,15 @@ class HelperClient:
         assert "logIds" in unJsoned
         return unJsoned["logIds"]
 
+    def sendStreamLog(self, body, tags: List[str] = [], waitForIdentifier: bool = True):
+        # body is bytes or an iterator of bytes, the latter is sent chunked
+        params = {"tags": tags, "waitForIdentifier": waitForIdentifier}
+        headers = dict(self.authorizationHeaders)
+        headers["Content-Type"] = "application/x-ndjson"
+        response = self.client.put("/api/v1/log/streamcreate", data = body, params = params, headers = headers)
+        assert response.status_code == 200
+        return response.json()
+
     def readLogs(self, limit: int, verify: bool = False, tags: List[str] = []):
         params = {
             "limit": limit,
@@ -59,6 +69,53 @@ class HelperClient:
         assert "logs" in unJsoned
         return unJsoned["logs"]
 
+    def readLogsTiming(self, limit: int, verify: bool = False, tags: List[str] = []) -> Dict[str, float]:
+        params = {
+            "limit": limit,
+            "verify": verify,
+            "tags": tags
+        }
+        response = self.client.get("/api/v1/log/get", params = params, headers = self.authorizationHeaders)
+        assert response.status_code == 200
+        timings = dict()
+        for entry in response.headers["server-timing"].split(", "):
+            parts = entry.split(";")
+            timings[parts[0]] = float(parts[-1][len("dur="):])
+        return timings
+
+    def readLogsPage(self, limit: int, cursor: Optional[str] = None, tags: List[str] = [], createdFrom: int = 0, createdTo: int = 0):
+        params = {
+            "limit": limit,
+            "from": createdFrom,
+            "to": createdTo
+        }
+        if(cursor):
+            params["cursor"] = cursor
+        if(len(tags) > 0):
+            params["tags"] = tags
+        response = self.client.get("/api/v1/log/get", params = params, headers = self.authorizationHeaders)
+        unJsoned = response.json()
+        assert response.status_code == 200
+        assert "logs" in unJsoned
+        assert "nextCursor" in unJsoned
+        return unJsoned["logs"], unJsoned["nextCursor"]
+
+    def readLogsStream(self, limit: int, cursor: Optional[str] = None, tags: List[str] = []):
+        params = {
+            "limit": limit,
+            "stream": True
+        }
+        if(cursor):
+            params["cursor"] = cursor
+        if(len(tags) > 0):
+            params["tags"] = tags
+        response = self.client.get("/api/v1/log/get", params = params, headers = self.authorizationHeaders)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines() if line]
+        assert "nextCursor" in lines[-1]
+        return lines[:-1], lines[-1]["nextCursor"]
+
     def count(self):
         response = self.client.get("/api/v1/log/count", headers = self.authorizationHeaders)
         unJsoned = response.json()
@@ -66,6 +123,12 @@ class HelperClient:
         assert "count" in unJsoned
         return unJsoned["count"]
 
+    def countTags(self, tags: List[str]):
+        response = self.client.get("/api/v1/log/count", params = {"tags": tags}, headers = self.authorizationHeaders)
+        unJsoned = response.json()
+        assert response.status_code == 200
+        return unJsoned["count"], unJsoned["tags"]
+
     def verifyLogContent(self, content: str, identifier: str):
         jsoned = {
             "logContent": content,
@@ -88,6 +151,34 @@ class HelperClient:
         assert "verified" in unJsoned
         return unJsoned["verified"]
 
+    def verifyBatch(self, items: List[dict]):
+        jsoned = {
+            "items": items
+        }
+        response = self.client.post("/api/v1/log/verifyBatch", json = jsoned, headers = self.authorizationHeaders)
+        unJsoned = response.json()
+        assert response.status_code == 200
+        assert "results" in unJsoned
+        return [result["verified"] for result in unJsoned["results"]]
+
+    def search(self, query: str, limit: int = 100, cursor: Optional[str] = None, verify: bool = False):
+        params = {
+            "q": query,
+            "limit": limit,
+            "verify": verify
+        }
+        if(cursor):
+            params["cursor"] = cursor
+        response = self.client.get("/api/v1/log/search", params = params, headers = self.authorizationHeaders)
+        unJsoned = response.json()
+        assert response.status_code == 200
+        return unJsoned["logs"], unJsoned["nextCursor"]
+
+    def metrics(self) -> str:
+        response = self.client.get("/metrics")
+        assert response.status_code == 200
+        return response.text
+
     def addUser(self, username: str, password: str, privileges: List[str]):
         jsoned = {
             "username": username,
@@ -1,5 +1,6 @@
 import pytest
 from immulogger.database.immudb import ImmudbConfirmer
+from immulogger.database.pool import ImmudbConfirmerPool
 from immulogger.serviceprovider import ServiceProvider
 from fastapi.testclient import TestClient
 import immulogger.main as main
@@ -15,7 +16,8 @@ def mockedClient(immudb_service: ImmudbConfirmer):
     configToSet.IMMUDB_KEY_PATH = "/certs/public_signing_key.pem"
     serviceProviderClass.IMMUDB_URL = immudb_service.url
     serviceProviderClass.IMMUDB_KEY_PATH = "/certs/public_signing_key.pem"
-    serviceProviderClass.getServiceProvider().immudbConfirmer = immudb_service
-    serviceProviderClass.getServiceProvider().userProvider = ImmudbUserProvider(immudb_service)
+    pool = ImmudbConfirmerPool(immudb_service.url, "immudb", "immudb", "/certs/public_signing_key.pem", 2)
+    serviceProviderClass.getServiceProvider().immudbConfirmer = pool
+    serviceProviderClass.getServiceProvider().userProvider = ImmudbUserProvider(pool)
     with TestClient(app) as client:
         yield HelperClient(client)
\ No newline at end of file
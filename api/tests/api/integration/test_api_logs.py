@@ -2,7 +2,11 @@
 from . import mockedClient
 from ... import immudb_service, docker_services_each
 from ..helperclient import HelperClient
+from immulogger.database.ingestqueue import IngestQueueFull
+from immulogger.routers.models.logmodel import LogResponse, LogsResponse
+from immulogger.serviceprovider import getServiceProvider
 import pytest
+import immulogger.tracing as tracing
 import hashlib
 import time
 
@@ -179,7 +183,7 @@ def test_big_batch_small_logs(mockedClient: HelperClient):
     assert(len(logs) == 1024 + 512)
 
 
-def test_add_logs_in_background(mockedClient: HelperClient):
+def test_add_logs_in_background(mockedClient: HelperClient, monkeypatch):
     logged = mockedClient.login("admin", "admin", ["SEND_LOGS", "READ_LOGS"])
     assert logged == True
     addedLog = mockedClient.sendBatchLog(["test", "test2", "test3"], ["x"], False)
@@ -204,6 +208,46 @@ def test_add_logs_in_background(mockedClient: HelperClient):
     assert logs[0]["log"] == "TEST123"
     assert logs[0]["verified"] == False
 
+    # A full queue refuses instead of growing
+    def full(logs, tags, timeReceived):
+        raise IngestQueueFull("queue is full")
+    monkeypatch.setattr(getServiceProvider().ingestQueue, "put", full)
+    response = mockedClient.client.put("/api/v1/log/create", json = {"logContent": "refused", "waitForIdentifier": False}, headers = mockedClient.authorizationHeaders)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_add_logs_stream(mockedClient: HelperClient):
+    logged = mockedClient.login("admin", "admin", ["SEND_LOGS", "READ_LOGS"])
+    assert logged == True
+    # More logs than /batchcreate accepts, sent in pieces that split lines
+    lines = [f'"stream{index}"' for index in range(0, 10300)]
+    lines[5] = '{"logContent": "object line"}'
+    lines[300] = '{"logContent": '
+    lines[301] = '""'
+    body = ("\n".join(lines) + "\n\n").encode("utf-8")
+    response = mockedClient.sendStreamLog((body[start:start + 1000] for start in range(0, len(body), 1000)), ["x"])
+    assert len(response["logIds"]) == 10300
+    assert response["logIds"][300] == "FAILED" and response["logIds"][301] == "FAILED"
+    assert [(failed["start"], failed["end"]) for failed in response["failedChunks"]] == [(300, 301), (301, 302)]
+    assert mockedClient.countTags(["x"])[1]["x"] == 10298
+
+    # Chunks commit in parallel, so ids do not follow line order across chunks
+    logs = mockedClient.readLogs(-1, True, ["x"])
+    assert logs[0]["log"].startswith("stream") and all(log["verified"] for log in logs)
+    assert mockedClient.verifyLogContent("stream10299", response["logIds"][10299])
+    assert mockedClient.verifyLogContent("object line", response["logIds"][5])
+    assert mockedClient.verifyLogContent("stream0", response["logIds"][0])
+    assert mockedClient.verifyLogContent("stream299", response["logIds"][299])
+
+    # Bigger than any log, the line is dropped without being buffered whole
+    response = mockedClient.sendStreamLog(b'"a' + b"b" * 500000 + b'"\n"after"', ["y"], False)
+    assert response["logIds"] == ["NOT_WAITING"]
+    assert [(failed["start"], failed["end"], failed["error"]) for failed in response["failedChunks"]] == [(0, 1, "Line too long")]
+    # Committed before the response, not left in the ingest queue
+    logs = mockedClient.readLogs(-1, False, ["y"])
+    assert [log["log"] for log in logs] == ["after"]
+
 
 def test_verify_log_content(mockedClient: HelperClient):
     logged = mockedClient.login("admin", "admin", ["SEND_LOGS", "READ_LOGS"])
@@ -225,6 +269,10 @@ def test_count_logs(mockedClient: HelperClient):
     assert len(addedLog) == 3
 
     assert mockedClient.count() == 6
+    mockedClient.sendLog("tagged", ["x", "y"])
+    assert mockedClient.countTags(["x", "y", "z"]) == (7, {"x": 7, "y": 1, "z": 0})
+    response = mockedClient.client.get("/api/v1/log/count", params = {"tags": [str(index) for index in range(0, 17)]}, headers = mockedClient.authorizationHeaders)
+    assert response.status_code == 422
 
     
 
@@ -246,3 +294,171 @@ def test_verify_log_sha(mockedClient: HelperClient):
     # Too small hash, no 200 code
     with pytest.raises(AssertionError):
         mockedClient.verifyLogBySha("", identifier)
+
+
+def test_verify_batch(mockedClient: HelperClient):
+    logged = mockedClient.login("admin", "admin", ["SEND_LOGS", "READ_LOGS"])
+    assert logged == True
+    identifiers = mockedClient.sendBatchLog([f"log{index}" for index in range(0, 5)], ["x"])
+    single = mockedClient.sendLog("single")
+    stringified = hashlib.sha256("log1".encode("utf-8")).hexdigest()
+    verified = mockedClient.verifyBatch([
+        {"identifier": identifiers[0], "logContent": "log0"},
+        {"identifier": identifiers[1], "logSHA": stringified},
+        {"identifier": single, "logContent": "single"},
+        {"identifier": identifiers[2], "logContent": "log3"},
+        {"identifier": "notexisting", "logContent": "log4"},
+    ])
+    assert verified == [True, True, True, False, False]
+
+    # Content and SHA together, no 200 code
+    with pytest.raises(AssertionError):
+        mockedClient.verifyBatch([{"identifier": single, "logContent": "single", "logSHA": stringified}])
+
+
+def test_read_logs_with_cursor(mockedClient: HelperClient):
+    logged = mockedClient.login("admin", "admin", ["SEND_LOGS", "READ_LOGS"])
+    assert logged == True
+    mockedClient.sendBatchLog([f"log{index}" for index in range(0, 5)], ["x"])
+
+    logs, cursor = mockedClient.readLogsPage(2)
+    assert [log["log"] for log in logs] == ["log4", "log3"]
+    assert cursor != None
+
+    logs, cursor = mockedClient.readLogsPage(2, cursor)
+    assert [log["log"] for log in logs] == ["log2", "log1"]
+    assert cursor != None
+
+    logs, cursor = mockedClient.readLogsPage(2, cursor)
+    assert [log["log"] for log in logs] == ["log0"]
+    assert cursor == None
+
+    logs, cursor = mockedClient.readLogsPage(-1)
+    assert len(logs) == 5
+    assert cursor == None
+
+    with pytest.raises(AssertionError):
+        mockedClient.readLogsPage(2, "notacursor")
+
+def test_read_logs_stream(mockedClient: HelperClient):
+    logged = mockedClient.login("admin", "admin", ["SEND_LOGS", "READ_LOGS"])
+    assert logged == True
+    mockedClient.sendBatchLog([f"log{index}" for index in range(0, 300)], ["x"])
+    mockedClient.sendBatchLog(["other"], ["y"])
+
+    logs, cursor = mockedClient.readLogsStream(-1)
+    assert len(logs) == 301
+    assert logs[0]["log"] == "other"
+    assert cursor == None
+
+    logs, cursor = mockedClient.readLogsStream(-1, tags = ["x"])
+    assert len(logs) == 300
+    assert logs[-1]["log"] == "log0"
+
+    logs, cursor = mockedClient.readLogsStream(1)
+    assert len(logs) == 1
+    assert cursor != None
+    logs, cursor = mockedClient.readLogsStream(-1, cursor)
+    assert len(logs) == 300
+    assert logs[0]["log"] == "log299"
+    assert cursor == None
+
+def test_metrics(mockedClient: HelperClient):
+    logged = mockedClient.login("admin", "admin", ["SEND_LOGS", "READ_LOGS"])
+    assert logged == True
+    mockedClient.sendBatchLog([f"log{index}" for index in range(0, 600)], ["a", "b"])
+    mockedClient.readLogs(10, True, [])
+    metrics = mockedClient.metrics()
+    assert 'immulogger_request_duration_seconds_count{method="PUT",route="/api/v1/log/batchcreate",status="200"}' in metrics
+    assert 'immulogger_request_duration_seconds_count{method="GET",route="/api/v1/log/get",status="200"}' in metrics
+    assert 'immulogger_immudb_call_duration_seconds_count{method="sqlExec"}' in metrics
+    assert 'immulogger_immudb_call_duration_seconds_count{method="sqlQuery"}' in metrics
+    # 3 lines per log, 341 logs per TX
+    assert 'immulogger_batch_chunks_bucket{le="2.0"}' in metrics
+    assert "immulogger_immudb_logins_total" in metrics
+    assert "immulogger_ingest_queue_depth" in metrics
+
+def test_server_timing(mockedClient: HelperClient):
+    logged = mockedClient.login("admin", "admin", ["SEND_LOGS", "READ_LOGS"])
+    assert logged == True
+    mockedClient.sendBatchLog([f"log{index}" for index in range(0, 10)], ["x"])
+    timings = mockedClient.readLogsTiming(10, True, ["x"])
+    for name in ["logQuery", "tagsQuery", "verify", "sqlQuery", "getAllValues", "verifiableTxById", "total"]:
+        assert name in timings
+    assert timings["total"] >= timings["logQuery"]
+
+def test_slow_query_log(mockedClient: HelperClient, capsys):
+    logged = mockedClient.login("admin", "admin", ["SEND_LOGS", "READ_LOGS"])
+    assert logged == True
+    mockedClient.sendLog("slow", ["x"])
+    tracing.slowQueryThreshold = 0.000001
+    try:
+        mockedClient.readLogs(10, False, ["x"])
+    finally:
+        tracing.slowQueryThreshold = 1
+    printed = capsys.readouterr().out
+    assert "Slow sqlQuery took" in printed
+    assert "with 1 params: SELECT LOGS.log,LOGS.uniqueidentifier,LOGS.createdate,LOGS.id FROM LOGS INNER JOIN TAGS AS tags0" in printed
+
+def test_read_logs_created_range(mockedClient: HelperClient):
+    logged = mockedClient.login("admin", "admin", ["SEND_LOGS", "READ_LOGS"])
+    assert logged == True
+    before = int(time.time() * 1000)
+    mockedClient.sendLog("old", ["x"])
+    time.sleep(0.01)
+    middle = int(time.time() * 1000)
+    mockedClient.sendBatchLog(["new1", "new2", "new3"], ["x"])
+    mockedClient.sendLog("untagged", [])
+    logs, cursor = mockedClient.readLogsPage(2, None, ["x"], middle)
+    assert [log["log"] for log in logs] == ["new3", "new2"]
+    # The cursor continues a createdate ordered read, not an id ordered one
+    with pytest.raises(AssertionError):
+        mockedClient.readLogsPage(2, cursor, ["x"])
+    logs, cursor = mockedClient.readLogsPage(2, cursor, ["x"], middle)
+    assert [log["log"] for log in logs] == ["new1"]
+    assert cursor is None
+    logs, cursor = mockedClient.readLogsPage(10, None, [], before, middle)
+    assert [log["log"] for log in logs] == ["old"]
+
+    with pytest.raises(AssertionError):
+        mockedClient.readLogsPage(10, None, [], middle, before)
+
+def test_search_logs(mockedClient: HelperClient):
+    logged = mockedClient.login("admin", "admin", ["SEND_LOGS", "READ_LOGS"])
+    assert logged == True
+    mockedClient.sendBatchLog([f"GET /orders id=abc-{index} status=500" if index % 2 == 0 else f"GET /orders id=abc-{index} status=200" for index in range(0, 6)], ["http"])
+    mockedClient.sendLog("timeout talking to payments", [])
+    logs, cursor = mockedClient.search("abc-3", verify = True)
+    assert [log["log"] for log in logs] == ["GET /orders id=abc-3 status=200"]
+    assert logs[0]["verified"] == True
+    assert mockedClient.verifyLogContent(logs[0]["log"], logs[0]["uniqueidentifier"]) == True
+    logs, cursor = mockedClient.search('orders "status=500"', 2)
+    assert [log["log"] for log in logs] == ["GET /orders id=abc-4 status=500", "GET /orders id=abc-2 status=500"]
+    logs, cursor = mockedClient.search('orders "status=500"', 2, cursor)
+    assert [log["log"] for log in logs] == ["GET /orders id=abc-0 status=500"]
+    assert cursor is None
+    logs, cursor = mockedClient.search("PAYMENTS")
+    assert len(logs) == 1
+
+    with pytest.raises(AssertionError):
+        mockedClient.search("!!")
+
+    # A full page of term-only candidates is read in several id queries
+    mockedClient.sendBatchLog([f"bulk {index}" for index in range(0, 1001)], [])
+    logs, cursor = mockedClient.search("bulk", 1000)
+    assert len(logs) == 1000 and cursor is not None
+    assert logs[0]["log"] == "bulk 1000" and logs[-1]["log"] == "bulk 1"
+
+def test_read_logs_schema(mockedClient: HelperClient):
+    # Pages are written without response_model validation, the schema and the payload still have to agree
+    mockedClient.login("admin", "admin", ["SEND_LOGS", "READ_LOGS"])
+    mockedClient.sendBatchLog(["zażółć", "b"], ["x"])
+    schema = mockedClient.client.get("/openapi.json").json()
+    for path in ["/api/v1/log/get", "/api/v1/log/search"]:
+        assert schema["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]["$ref"] == "#/components/schemas/LogsResponse"
+    response = mockedClient.client.get("/api/v1/log/get", params = {"limit": 2, "verify": True}, headers = mockedClient.authorizationHeaders)
+    assert response.headers["content-type"] == "application/json"
+    page = LogsResponse.parse_raw(response.content)
+    assert [(log.log, log.tags, log.verified) for log in page.logs] == [("b", ["x"], True), ("zażółć", ["x"], True)]
+    assert set(response.json()["logs"][0].keys()) == set(LogResponse.__fields__.keys())
+    assert page.nextCursor is not None
@@ -1,6 +1,9 @@
 from fastapi.testclient import TestClient
 from jose import JWTError, jwt
-from immulogger.database.userprovider import HardcodedUserProvider
+from prometheus_client import REGISTRY
+from datetime import timedelta
+from immulogger.authutils.authutils import TokenCache, create_access_token
+from immulogger.database.userprovider import CachedUserProvider, HardcodedUserProvider, User
 import pytest
 from immulogger.main import app, getServiceProvider
 
@@ -107,4 +110,54 @@ def test_not_full_access_to_scopes(hardcoded_user_provider):
     assert response.status_code == 401
 
     response = client.post("/api/v1/auth/token", {"username": user2login, "password": user2password, "scope": " ".join(["READ_LOGS", "SEND_LOGS"])})
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+def test_cached_user_provider():
+    provider = HardcodedUserProvider()
+    provider.populateDefaults()
+    cached = CachedUserProvider(provider, ttl = 60)
+    assert cached.getCachedUser("admin") is None
+    assert cached.getUser("admin").username == "admin"
+    assert cached.getUser("admin").username == "admin"
+    assert cached.getCachedUser("admin").username == "admin"
+    assert cached.hits == 2 and cached.misses == 1
+    assert REGISTRY.get_sample_value("immulogger_cache_lookups_total", {"cache": "user", "result": "miss"}) >= 1
+
+    # Not found users are not cached
+    assert cached.getUser("notexisting") is None
+    provider.addUser(User(username = "notexisting", password_hash = "xxx", privileges = []))
+    assert cached.getUser("notexisting").username == "notexisting"
+
+    cached.addUser(User(username = "admin", password_hash = "changed", privileges = []))
+    assert cached.getCachedUser("admin") is None
+    assert cached.getUser("admin").password_hash == "changed"
+
+    expiring = CachedUserProvider(provider, ttl = 0)
+    expiring.getUser("admin")
+    assert expiring.getCachedUser("admin") is None
+
+def test_token_cache():
+    tokenCache = TokenCache()
+    token = create_access_token({"sub": "admin", "scopes": ["READ_LOGS"]})
+    assert tokenCache.decode(token)["sub"] == "admin"
+    assert tokenCache.decode(token)["scopes"] == ["READ_LOGS"]
+    assert tokenCache.hits == 1 and tokenCache.misses == 1
+    assert REGISTRY.get_sample_value("immulogger_cache_lookups_total", {"cache": "token", "result": "hit"}) >= 1
+
+    expired = create_access_token({"sub": "admin"}, timedelta(seconds = -1))
+    with pytest.raises(JWTError):
+        tokenCache.decode(expired)
+    with pytest.raises(JWTError):
+        tokenCache.decode(token + "x")
+    assert len(tokenCache.tokens) == 1
+
+def test_authorized_requests_use_user_cache(hardcoded_user_provider):
+    cached = CachedUserProvider(getServiceProvider().userProvider)
+    getServiceProvider().userProvider = cached
+    response = client.post("/api/v1/auth/token", {"username": "admin", "password": "admin", "scope": "USER_ADMIN"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    for index in range(0, 3):
+        response = client.put("/api/v1/user/create", json = {"username": f"cached{index}", "password": "cached", "privileges": []}, headers = headers)
+        assert response.status_code == 200
+    assert cached.misses == 1
+    assert cached.hits == 3
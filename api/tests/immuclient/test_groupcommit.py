@@ -0,0 +1,42 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from immulogger.database.asyncconfirmer import AsyncImmudbConfirmer
+from immulogger.database.groupcommit import GroupCommitter
+from immulogger.database.pool import ImmudbConfirmerPool
+from .. import immudb_service, docker_services_each, ImmudbConfirmer
+
+
+def createConfirmer(immudb_service: ImmudbConfirmer) -> AsyncImmudbConfirmer:
+    pool = ImmudbConfirmerPool(immudb_service.url, "immudb", "immudb", "/certs/public_signing_key.pem", 2)
+    with pool.session() as client:
+        client.createTables()
+    return AsyncImmudbConfirmer(pool, ThreadPoolExecutor(2))
+
+def test_group_commit_single_transaction(immudb_service: ImmudbConfirmer):
+    confirmer = createConfirmer(immudb_service)
+    groupCommitter = GroupCommitter(confirmer, maxWait = 0.05, maxSize = 256)
+
+    async def sendAll():
+        return await asyncio.gather(*[groupCommitter.submit(f"log{index}", index, ["x"] if index % 2 == 0 else []) for index in range(0, 50)])
+
+    identifiers = asyncio.run(sendAll())
+    assert groupCommitter.groups == 1
+    assert len(set(identifiers)) == 50
+    with confirmer.pool.session() as client:
+        for index in range(0, 50):
+            assert client.verifyLogContent(f"log{index}", identifiers[index]) == True
+        assert len(client.getLastLogs(-1, False, ["x"])) == 25
+
+def test_group_commit_max_size(immudb_service: ImmudbConfirmer):
+    confirmer = createConfirmer(immudb_service)
+    groupCommitter = GroupCommitter(confirmer, maxWait = 0.05, maxSize = 8)
+
+    async def sendAll():
+        return await asyncio.gather(*[groupCommitter.submit(f"log{index}", index, []) for index in range(0, 20)])
+
+    identifiers = asyncio.run(sendAll())
+    assert groupCommitter.groups == 3
+    with confirmer.pool.session() as client:
+        assert client.getLogCount() == 20
+        assert client.verifyLogContent("log19", identifiers[19]) == True
@@ -0,0 +1,143 @@
+import json
+import time
+
+from prometheus_client import REGISTRY
+
+import pytest
+from immulogger.database.ingestqueue import IngestQueue, IngestQueueFull
+from immulogger.database.pool import ImmudbConfirmerPool
+from .. import immudb_service, docker_services_each, ImmudbConfirmer
+
+
+def createPool(immudb_service: ImmudbConfirmer) -> ImmudbConfirmerPool:
+    pool = ImmudbConfirmerPool(immudb_service.url, "immudb", "immudb", "/certs/public_signing_key.pem", 2)
+    with pool.session() as client:
+        client.createTables()
+    return pool
+
+def test_ingest_queue_groups_requests(immudb_service: ImmudbConfirmer):
+    pool = createPool(immudb_service)
+    ingestQueue = IngestQueue(pool, maxLinger = 0.5)
+    ingestQueue.start()
+    for index in range(0, 20):
+        ingestQueue.put([f"log{index}"], ["x", f"tag{index}"], int(time.time() * 1000))
+    ingestQueue.put([f"batch{index}" for index in range(0, 100)], [], int(time.time() * 1000))
+    ingestQueue.stop()
+    assert ingestQueue.committedLogs == 120
+    assert ingestQueue.committedBatches == 1
+    with pool.session() as client:
+        assert client.getLogCount() == 120
+        logs = client.getLastLogs(-1, True, ["tag7"])
+        assert len(logs) == 1
+        assert logs[0].log == "log7"
+        assert logs[0].verified == True
+
+def test_ingest_queue_respects_line_budget(immudb_service: ImmudbConfirmer):
+    pool = createPool(immudb_service)
+    ingestQueue = IngestQueue(pool, maxBatchLines = 30, maxLinger = 0.5)
+    ingestQueue.start()
+    # 3 lines per log, so at most 10 logs per TX
+    ingestQueue.put([f"log{index}" for index in range(0, 25)], ["a", "b"], int(time.time() * 1000))
+    ingestQueue.stop()
+    assert ingestQueue.committedBatches == 3
+    with pool.session() as client:
+        assert client.getLogCount() == 25
+
+def test_ingest_queue_replays_spool(immudb_service: ImmudbConfirmer, tmp_path):
+    pool = createPool(immudb_service)
+    spoolPath = str(tmp_path / "spool.ndjson")
+    with open(spoolPath, "w") as spool:
+        spool.write(json.dumps({"seq": 1, "time": 1, "tags": ["x"], "logs": ["acked"]}) + "\n")
+        spool.write(json.dumps({"ack": 1}) + "\n")
+        spool.write(json.dumps({"seq": 2, "time": 2, "tags": ["x"], "logs": ["lost1", "lost2"]}) + "\n")
+        spool.write('{"seq": 3, "time": 3, "ta')
+    ingestQueue = IngestQueue(pool, spoolPath)
+    ingestQueue.start()
+    ingestQueue.put(["fresh"], [], int(time.time() * 1000))
+    ingestQueue.stop()
+    with pool.session() as client:
+        logs = client.getLastLogs(-1, False, [])
+        assert sorted([log.log for log in logs]) == ["fresh", "lost1", "lost2"]
+    with open(spoolPath, "r") as spool:
+        assert spool.read() == ""
+
+def test_ingest_queue_counts_dropped_batches(immudb_service: ImmudbConfirmer, tmp_path, monkeypatch):
+    pool = createPool(immudb_service)
+    spoolPath = str(tmp_path / "missing" / "spool.ndjson")
+    ingestQueue = IngestQueue(pool, spoolPath, maxLinger = 0, maxAttempts = 2, retryDelay = 0)
+    ingestQueue.start()
+    dropped = REGISTRY.get_sample_value("immulogger_ingest_dropped_logs_total") or 0
+
+    def failingSession():
+        raise RuntimeError("immudb down")
+    monkeypatch.setattr(pool, "session", failingSession)
+    ingestQueue.put(["lost1", "lost2"], [], int(time.time() * 1000))
+    ingestQueue.stop()
+    assert ingestQueue.droppedBatches == 1 and ingestQueue.droppedLogs == 2
+    assert REGISTRY.get_sample_value("immulogger_ingest_dropped_logs_total") == dropped + 2
+
+    # Still in the spool, the next start commits them
+    monkeypatch.undo()
+    ingestQueue = IngestQueue(pool, spoolPath)
+    ingestQueue.start()
+    ingestQueue.stop()
+    with pool.session() as client:
+        assert sorted([log.log for log in client.getLastLogs(-1, False, [])]) == ["lost1", "lost2"]
+
+def test_ingest_queue_requeues_failed_batches_and_bounds_pending(immudb_service: ImmudbConfirmer, monkeypatch):
+    pool = createPool(immudb_service)
+    ingestQueue = IngestQueue(pool, maxLinger = 0, maxAttempts = 1, retryDelay = 3600, maxPendingLogs = 3)
+    ingestQueue.start()
+    def failingSession():
+        raise RuntimeError("immudb down")
+    monkeypatch.setattr(pool, "session", failingSession)
+    ingestQueue.put(["log1", "log2"], [], int(time.time() * 1000))
+    waitFor(lambda: ingestQueue.requeuedBatches == 1)
+    # Back in the queue and paused, not dropped
+    assert ingestQueue.depth() == 2
+    assert ingestQueue.droppedBatches == 0
+    ingestQueue.put(["log3"], [], int(time.time() * 1000))
+    with pytest.raises(IngestQueueFull):
+        ingestQueue.put(["log4"], [], int(time.time() * 1000))
+    assert ingestQueue.rejectedLogs == 1
+    # immudb is back, the stop flushes without waiting out the pause
+    monkeypatch.undo()
+    ingestQueue.stop()
+    assert ingestQueue.committedLogs == 3
+    with pool.session() as client:
+        assert sorted([log.log for log in client.getLastLogs(-1, False, [])]) == ["log1", "log2", "log3"]
+
+def test_ingest_queue_compacts_spool(immudb_service: ImmudbConfirmer, tmp_path, monkeypatch):
+    pool = createPool(immudb_service)
+    spoolPath = str(tmp_path / "spool.ndjson")
+    # One log per TX, the spool is compacted after every commit that leaves logs outstanding
+    ingestQueue = IngestQueue(pool, spoolPath, maxBatchLines = 1, maxLinger = 0, maxAttempts = 1, retryDelay = 3600, spoolCompactBytes = 0)
+    processLogEntries = ImmudbConfirmer.processLogEntries
+    commits = []
+    def failingAfterFirst(client, entries):
+        if(len(commits) > 0):
+            raise RuntimeError("immudb down")
+        commits.append(entries)
+        return processLogEntries(client, entries)
+    monkeypatch.setattr(ImmudbConfirmer, "processLogEntries", failingAfterFirst)
+    ingestQueue.start()
+    ingestQueue.put(["log1", "log2", "log3"], ["x"], 1)
+    waitFor(lambda: ingestQueue.requeuedBatches == 1)
+    assert ingestQueue.compactions == 1
+    # The committed log and the ack are gone, the record keeps the logs still waiting
+    with open(spoolPath, "r") as spool:
+        assert [json.loads(line) for line in spool] == [{"seq": 1, "time": 1, "tags": ["x"], "logs": ["log2", "log3"]}]
+    ingestQueue.stop()
+
+    monkeypatch.undo()
+    ingestQueue = IngestQueue(pool, spoolPath)
+    ingestQueue.start()
+    ingestQueue.stop()
+    with pool.session() as client:
+        assert sorted([log.log for log in client.getLastLogs(-1, False, [])]) == ["log1", "log2", "log3"]
+
+def waitFor(condition, timeout: float = 5):
+    deadline = time.time() + timeout
+    while(not condition()):
+        assert time.time() < deadline
+        time.sleep(0.01)
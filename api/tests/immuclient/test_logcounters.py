@@ -0,0 +1,92 @@
+import threading
+import time
+from immulogger.database.immudb import ImmudbConfirmer
+from immulogger.database.logcounters import LogCounters
+from immulogger.routers.models.logmodel import AddLogRequest, AddLogsRequest
+from .. import immudb_service, docker_services_each
+
+
+def test_counts_served_from_memory(immudb_service: ImmudbConfirmer, monkeypatch):
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        dbClient.processLogsRequest(AddLogsRequest(logs = ["a1", "a2", "a3"], tags = ["a", "shared"]))
+        assert dbClient.getLogCounts(["a", "b"]) == (3, {"a": 3, "b": 0})
+
+        queries = []
+        monkeypatch.setattr(dbClient, "countLogsInTable", lambda: queries.append("total"))
+        monkeypatch.setattr(dbClient, "countTagInTable", lambda tag: queries.append(tag))
+        dbClient.processLogsRequest(AddLogsRequest(logs = ["b1", "b2"], tags = ["b", "shared", "b"]))
+        dbClient.processLogEntries([("c1", 1, []), ("a4", 2, ["a"])])
+        dbClient.processLogRequest(AddLogRequest(logContent = "b3", tags = ["b"]))
+        assert dbClient.getLogCounts(["a", "b"]) == (8, {"a": 4, "b": 3})
+        assert dbClient.getLogCount() == 8
+        assert queries == []
+
+def test_counts_reconciled_with_table(immudb_service: ImmudbConfirmer):
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        dbClient.logCounters = LogCounters(reconcileInterval = 3600)
+        dbClient.processLogsRequest(AddLogsRequest(logs = ["x1", "x2"], tags = ["x"]))
+        assert dbClient.getLogCounts(["x"]) == (2, {"x": 2})
+        # Written by another replica, invisible until the next check
+        other = ImmudbConfirmer(immudb_service.url, "immudb", "immudb", immudb_service.keyPath)
+        with other as otherClient:
+            otherClient.processLogsRequest(AddLogsRequest(logs = ["x3", "y1"], tags = ["x"]))
+        assert dbClient.getLogCounts(["x"]) == (2, {"x": 2})
+        dbClient.logCounters.reconcileInterval = 0
+        assert dbClient.getLogCounts(["x"]) == (4, {"x": 4})
+        assert dbClient.logCounters.drifts == 1
+        assert dbClient.countLogsInTable() == 4
+
+def test_counts_reconcile_backs_off_during_commits(immudb_service: ImmudbConfirmer, monkeypatch):
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        dbClient.logCounters = LogCounters(reconcileInterval = 0.05, retryDelay = 3600)
+        dbClient.processLogsRequest(AddLogsRequest(logs = ["x1", "x2"], tags = ["x"]))
+        assert dbClient.getLogCounts(["x"]) == (2, {"x": 2})
+        queries = []
+        countLogs = dbClient.countLogsInTable
+        monkeypatch.setattr(dbClient, "countLogsInTable", lambda: queries.append("total") or countLogs())
+        # A commit stays in flight while the interval passes, one check is tried and then put off
+        dbClient.logCounters.begin()
+        time.sleep(0.1)
+        for _ in range(0, 5):
+            assert dbClient.getLogCounts(["x"]) == (2, {"x": 2})
+        assert queries == ["total"]
+        dbClient.logCounters.end()
+
+def test_counts_forget_least_recent_tags(immudb_service: ImmudbConfirmer, monkeypatch):
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        dbClient.logCounters = LogCounters(reconcileInterval = 3600, maxTags = 2)
+        dbClient.processLogsRequest(AddLogsRequest(logs = ["a1", "a2"], tags = ["a", "b", "c"]))
+        assert dbClient.getLogCounts(["a", "b"]) == (2, {"a": 2, "b": 2})
+        assert dbClient.getLogCounts(["a"]) == (2, {"a": 2})
+        assert dbClient.getLogCounts(["c"]) == (2, {"c": 2})
+        assert list(dbClient.logCounters.tags.keys()) == ["a", "c"]
+        # A check only counts the tags still tracked
+        queries = []
+        countTag = dbClient.countTagInTable
+        monkeypatch.setattr(dbClient, "countTagInTable", lambda tag: queries.append(tag) or countTag(tag))
+        dbClient.logCounters.reconcileInterval = 0
+        assert dbClient.getLogCounts(["a"]) == (2, {"a": 2})
+        assert sorted(queries) == ["a", "c"]
+
+def test_counts_first_load_runs_once(immudb_service: ImmudbConfirmer, monkeypatch):
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        dbClient.logCounters = LogCounters(reconcileInterval = 3600)
+        dbClient.processLogsRequest(AddLogsRequest(logs = ["a1"], tags = ["a"]))
+        queries = []
+        countLogs = dbClient.countLogsInTable
+        countTag = dbClient.countTagInTable
+        monkeypatch.setattr(dbClient, "countLogsInTable", lambda: queries.append("total") or time.sleep(0.05) or countLogs())
+        monkeypatch.setattr(dbClient, "countTagInTable", lambda tag: queries.append(tag) or time.sleep(0.05) or countTag(tag))
+        results = []
+        threads = [threading.Thread(target = lambda: results.append(dbClient.getLogCounts(["a"]))) for _ in range(0, 4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == [(1, {"a": 1})] * 4
+        assert queries == ["total", "a"]
@@ -2,6 +2,9 @@ import pydantic
 import pytest
 
 from immulogger.routers.models.logmodel import AddLogRequest, AddLogsRequest
+from immulogger.database import logcodec
+from immulogger.database.querybuilder import InsertWithParamsQueryBuilder, logsBatchTemplate
+from immulogger.database.searchindex import SearchQuery
 from .. import immudb_service, docker_services_each
 
 
@@ -112,3 +115,138 @@ def test_batch_add_logs(immudb_service):
         assert all(log in logs for log in batchLogsToAdd * 2)
         assert result[0].tags == ["x"] or ["x2"]
 
+def test_batch_template_per_shape(immudb_service):
+    builder = InsertWithParamsQueryBuilder().INSERT("TAGS", "uniqueidentifier", "tag").VALUES(0, "taguniqueidentifier", "tag").VALUES(1, "taguniqueidentifier", "tag")
+    assert builder.build() == "INSERT INTO TAGS (uniqueidentifier,tag) VALUES(@taguniqueidentifier0,@tag0), (@taguniqueidentifier1,@tag1);"
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        logsBatchTemplate.cache_clear()
+        # Mixed tags, 4 tag rows either way, so both batches share one template
+        first = dbClient.processLogEntries([("a", 1, ["x", "y"]), ("b", 2, []), ("c", 3, ["x", "x", "z"])])
+        second = dbClient.processLogEntries([("d", 4, []), ("e", 5, ["x"]), ("f", 6, ["x", "y", "z"])])
+        assert logsBatchTemplate.cache_info().misses == 1
+        assert logsBatchTemplate.cache_info().hits == 1
+        result = {log.log: log for log in dbClient.getLastLogs(limit = -1)}
+        assert sorted(result["a"].tags) == ["x", "y"]
+        assert result["b"].tags == []
+        assert sorted(result["c"].tags) == ["x", "z"]
+        assert result["c"].createdate == 3
+        assert sorted(result["f"].tags) == ["x", "y", "z"]
+        assert result["e"].uniqueidentifier == second[1]
+        assert dbClient.verifyLogContent("a", first[0]) == True
+
+def test_tags_filter_honors_limit(immudb_service):
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        dbClient.processLogsRequest(AddLogsRequest(logs = [f"both{index}" for index in range(0, 5)], tags = ["a", "b"]))
+        dbClient.processLogsRequest(AddLogsRequest(logs = [f"only{index}" for index in range(0, 20)], tags = ["a", "c"]))
+        # The 20 newest logs carry "a" but not "b", they must not eat into the limit
+        result = dbClient.getLastLogs(3, False, ["a", "b"])
+        assert [log.log for log in result] == ["both4", "both3", "both2"]
+        assert all(sorted(log.tags) == ["a", "b"] for log in result)
+        logs, lastId, _ = dbClient.getLogsPage(2, False, ["b", "a", "b"])
+        assert [log.log for log in logs] == ["both4", "both3"]
+        logs, lastId, _ = dbClient.getLogsPage(10, False, ["a", "b"], lastId)
+        assert [log.log for log in logs] == ["both2", "both1", "both0"]
+        assert len(dbClient.getLastLogs(-1, False, ["a"])) == 25
+        assert len(dbClient.getLastLogs(-1, False, ["b", "c"])) == 0
+
+def test_created_range(immudb_service):
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        dbClient.processLogEntries([(f"log{index}", 1000 + index * 10, ["even"] if index % 2 == 0 else ["odd"]) for index in range(0, 20)])
+        result = dbClient.getLastLogs(-1, False, [], 1050, 1100)
+        assert [log.log for log in result] == ["log9", "log8", "log7", "log6", "log5"]
+        result = dbClient.getLastLogs(-1, False, ["even"], 1050)
+        assert [log.log for log in result] == [f"log{index}" for index in range(18, 5, -2)]
+        logs, lastId, lastCreated = dbClient.getLogsPage(2, False, ["odd"], 0, 0, 1100)
+        assert [log.log for log in logs] == ["log9", "log7"]
+        assert lastCreated == 1070
+        logs, lastId, lastCreated = dbClient.getLogsPage(10, False, ["odd"], lastId, 0, 1100, lastCreated)
+        assert [log.log for log in logs] == ["log5", "log3", "log1"]
+        assert lastId == 0
+
+        # Ranges are read in createdate order, a late commit of an early log takes its place and equal
+        # createdates continue by id across pages
+        dbClient.processLogEntries([("late", 1065, []), ("same1", 1030, []), ("same2", 1030, [])])
+        logs, lastId, lastCreated = dbClient.getLogsPage(3, False, [], 0, 1020, 1070)
+        assert [log.log for log in logs] == ["late", "log6", "log5"]
+        logs, lastId, lastCreated = dbClient.getLogsPage(3, False, [], lastId, 1020, 1070, lastCreated)
+        assert [log.log for log in logs] == ["log4", "same2", "same1"]
+        logs, lastId, lastCreated = dbClient.getLogsPage(3, False, [], lastId, 1020, 1070, lastCreated)
+        assert [log.log for log in logs] == ["log3", "log2"]
+        assert lastId == 0
+
+def test_compressed_logs(immudb_service, monkeypatch):
+    trace = "\n".join(f'  File "/srv/app/handlers/orders.py", line {index}, in handle\n    result = service.process(order)' for index in range(0, 200))
+    assert len(trace) > 4096
+    assert logcodec.fitsStorage(trace) == False
+    # The marker is an ordinary character while nothing is encoded
+    legacy = ["\x01zabc", "\x01s" + "a" * 64, "\x01q legacy"]
+    assert AddLogsRequest(logs = legacy).contents() == legacy
+    monkeypatch.setattr(logcodec, "compression", "zlib")
+    with pytest.raises(pydantic.error_wrappers.ValidationError):
+        AddLogsRequest(logs = ["\x01zabc"])
+    assert logcodec.fitsStorage(trace) == True
+    # Short and incompressible logs are stored as sent
+    assert logcodec.encodeLog("short log") == "short log"
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        identifiers = dbClient.processLogs([trace, "short log"], 1000, ["trace"])
+        dbClient.addLog(dbClient.generateIdentifier(trace), trace, 1001, [])
+        stored = dbClient.client.sqlQuery("SELECT log FROM LOGS ORDER BY id ASC", {})
+        assert stored[0][0].startswith(logcodec.CODEC_MARKER + logcodec.ZLIB_CODEC) and len(stored[0][0]) <= logcodec.STORED_LOG_LENGTH
+        assert stored[1][0] == "short log"
+        result = dbClient.getLastLogs(-1, True, ["trace"])
+        assert [log.log for log in result] == ["short log", trace]
+        assert all(log.verified for log in result)
+        assert dbClient.verifyLogContent(trace, identifiers[0]) == True
+        logs, _ = dbClient.searchLogsPage(SearchQuery.parse('"service process"'), 10)
+        assert [log.log for log in logs] == [trace, trace]
+        # Turning compression off keeps compressed rows readable
+        monkeypatch.setattr(logcodec, "compression", "none")
+        assert [log.log for log in dbClient.getLastLogs(1, False, ["trace"])] == ["short log"]
+        assert dbClient.getLastLogs(-1)[0].log == trace
+
+        # Rows sent with the marker while nothing was encoded read back as sent once compression and dedup are on
+        dbClient.processLogs(legacy, 1002, ["legacy"])
+        monkeypatch.setattr(logcodec, "compression", "zlib")
+        monkeypatch.setattr(logcodec, "dedup", True)
+        assert sorted(log.log for log in dbClient.getLastLogs(-1, False, ["legacy"])) == sorted(legacy)
+
+def test_dedup_logs(immudb_service, monkeypatch):
+    monkeypatch.setattr(logcodec, "dedup", True)
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        health = "GET /health 200 ok upstream=payments-eu-west-1 latency_budget=250ms policy=exponential"
+        logs = [health if index % 10 != 0 else f"request {index} failed: upstream payments-eu-west-1 timed out after 3 retries, giving up" for index in range(0, 100)]
+        identifiers = dbClient.processLogs(logs, 1000, ["health"])
+        assert len(set(identifiers)) == 100
+        assert dbClient.countLogsInTable() == 100
+        assert len(dbClient.client.sqlQuery("SELECT sha FROM CONTENTS", {})) == 11
+        stored = dbClient.client.sqlQuery("SELECT log FROM LOGS", {})
+        assert all(logcodec.referencedSha(row[0]) is not None for row in stored)
+
+        # Known contents only get reference rows, logs as short as a reference stay inline
+        dbClient.processLogs([health] * 50 + ["short"], 2000, [])
+        assert len(dbClient.client.sqlQuery("SELECT sha FROM CONTENTS", {})) == 11
+
+        assert dbClient.client.sqlQuery("SELECT log FROM LOGS ORDER BY id DESC LIMIT 1", {})[0][0] == "short"
+        result = dbClient.getLastLogs(60, True, ["health"])
+        assert [log.log for log in result] == list(reversed(logs))[0:60]
+        assert all(log.verified for log in result)
+        assert dbClient.verifyLogContent(health, identifiers[1]) == True
+        assert dbClient.verifyLogContent(health + " ", identifiers[1]) == False
+        found, _ = dbClient.searchLogsPage(SearchQuery.parse('"request 90"'), 10)
+        assert [log.log for log in found] == [logs[90]]
+
+        # Another session without the known contents upserts them again instead of failing
+        dbClient.knownContents.clear()
+        newLine = "new line " * 10
+        dbClient.processLogs([health, newLine], 3000, [])
+        assert len(dbClient.client.sqlQuery("SELECT sha FROM CONTENTS", {})) == 12
+        assert [log.log for log in dbClient.getLastLogs(3)] == [newLine, health, "short"]
+        # Rows written before dedup was turned off stay readable
+        monkeypatch.setattr(logcodec, "dedup", False)
+        dbClient.processLogs(["inline"], 4000, [])
+        assert [log.log for log in dbClient.getLastLogs(2)] == ["inline", newLine]
@@ -0,0 +1,45 @@
+import time
+
+from immulogger.database.backend import ImmudbClientBackend, StorageBackend, createBackend
+from immulogger.database.immudb import ImmudbConfirmer
+from immulogger.database.memorybackend import InMemoryBackend, dropMemoryStorage, getMemoryStorage
+from immulogger.routers.models.logmodel import AddLogRequest
+
+
+def test_backend_selected_by_url():
+    memoryConfirmer = ImmudbConfirmer("memory://selected", "immudb", "immudb", None)
+    assert isinstance(memoryConfirmer.client, InMemoryBackend)
+    immudbConfirmer = ImmudbConfirmer("localhost:3322", "immudb", "immudb", None)
+    assert isinstance(immudbConfirmer.client, ImmudbClientBackend)
+    assert isinstance(immudbConfirmer.client, StorageBackend)
+    dropMemoryStorage("selected")
+
+def test_memory_sessions_share_storage():
+    first = ImmudbConfirmer("memory://shared", "immudb", "immudb", None)
+    second = ImmudbConfirmer("memory://shared", "immudb", "immudb", None)
+    isolated = ImmudbConfirmer("memory://isolated", "immudb", "immudb", None)
+    with first as client:
+        client.createTables()
+        identifier = client.processLogRequest(AddLogRequest(logContent = "shared"))
+    with second as client:
+        assert client.getLogCount() == 1
+        assert client.verifyLogContent("shared", identifier) == True
+        logs = client.getLastLogs(-1, True)
+        assert logs[0].verified == True
+    with isolated as client:
+        client.createTables()
+        assert client.getLogCount() == 0
+    dropMemoryStorage("shared")
+    dropMemoryStorage("isolated")
+
+def test_memory_latency():
+    storage = getMemoryStorage("slow")
+    storage.latency = 0.05
+    confirmer = ImmudbConfirmer("memory://slow", "immudb", "immudb", None)
+    started = time.perf_counter()
+    with confirmer as client:
+        client.createTables()
+    # login and the CREATE TABLE batch
+    assert time.perf_counter() - started >= 0.1
+    assert confirmer.client.calls["login"] == 1
+    dropMemoryStorage("slow")
@@ -0,0 +1,131 @@
+import threading
+import uuid
+import pytest
+
+from immulogger.database.pool import FAILED_IDENTIFIER, ImmudbConfirmerPool, PoolExhausted
+from immulogger.database.preprocess import digestLogs
+from immulogger.routers.models.logmodel import AddLogRequest, AddLogsRequest
+from immulogger.routers.logrouter import streamLogs
+from .. import immudb_service, docker_services_each, ImmudbConfirmer
+
+
+def test_pool_checkout_checkin(immudb_service: ImmudbConfirmer):
+    pool = ImmudbConfirmerPool(immudb_service.url, "immudb", "immudb", "/certs/public_signing_key.pem", 2, checkoutTimeout = 0.1)
+    with pool.session() as client:
+        client.createTables()
+    assert pool.available() == 2
+
+    first = pool.checkout()
+    second = pool.checkout()
+    assert first is not second
+    assert first.logged == True and second.logged == True
+    assert pool.available() == 0
+    with pytest.raises(PoolExhausted):
+        pool.checkout()
+    pool.checkin(first)
+    pool.checkin(second)
+    assert pool.available() == 2
+    assert pool.healthCheck() == True
+
+def test_pool_stream_reader_holds_no_session(immudb_service: ImmudbConfirmer):
+    pool = ImmudbConfirmerPool(immudb_service.url, "immudb", "immudb", "/certs/public_signing_key.pem", 1, checkoutTimeout = 0.1)
+    with pool.session() as client:
+        client.createTables()
+        client.processLogs([f"log {index}" for index in range(0, 600)], 1000, [])
+    lines = streamLogs(pool, -1, False, [], 0, 0, 0, 0)
+    assert next(lines).startswith(b'{"log":"log 599"')
+    # Between pages the only session is free for other requests
+    assert pool.available() == 1
+    with pool.session() as client:
+        assert client.getLogCount() == 600
+    rest = list(lines)
+    assert len(rest) == 600 and rest[-1] == b'{"nextCursor":null}\n'
+    assert pool.available() == 1
+
+def test_pool_relogin(immudb_service: ImmudbConfirmer):
+    pool = ImmudbConfirmerPool(immudb_service.url, "immudb", "immudb", "/certs/public_signing_key.pem", 1, sessionTTL = 0)
+    with pool.session() as client:
+        firstLogin = client.lastLogged
+    with pool.session() as client:
+        assert client.lastLogged > firstLogin
+
+    confirmer = pool.checkout()
+    pool.checkin(confirmer, broken = True)
+    assert confirmer.logged == False
+    with pool.session() as client:
+        assert client.logged == True
+
+def test_pool_concurrent_sessions(immudb_service: ImmudbConfirmer):
+    pool = ImmudbConfirmerPool(immudb_service.url, "immudb", "immudb", "/certs/public_signing_key.pem", 4)
+    with pool.session() as client:
+        client.createTables()
+
+    def addLogs(prefix: str):
+        for index in range(0, 10):
+            with pool.session() as client:
+                client.processLogRequest(AddLogRequest(tags = [prefix], logContent = f"{prefix}{index}"))
+
+    threads = [threading.Thread(target = addLogs, args = (f"t{index}",)) for index in range(0, 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with pool.session() as client:
+        assert client.getLogCount() == 40
+    assert pool.available() == 4
+
+def test_pool_batch_keeps_input_order(immudb_service: ImmudbConfirmer):
+    pool = ImmudbConfirmerPool(immudb_service.url, "immudb", "immudb", "/certs/public_signing_key.pem", 2, batchParallelism = 2)
+    with pool.session() as client:
+        client.createTables()
+    logs = [f"log{index}" for index in range(0, 1500)]
+    identifiers, failedChunks = pool.processLogsRequest(AddLogsRequest(logs = logs, tags = ["x"]))
+    assert failedChunks == []
+    assert len(identifiers) == 1500
+    with pool.session() as client:
+        assert client.getLogCount() == 1500
+        for index in [0, 511, 512, 1023, 1024, 1499]:
+            assert client.verifyLogContent(logs[index], identifiers[index]) == True
+
+def test_pool_batch_reports_failed_chunks(immudb_service: ImmudbConfirmer, monkeypatch):
+    pool = ImmudbConfirmerPool(immudb_service.url, "immudb", "immudb", "/certs/public_signing_key.pem", 2)
+    with pool.session() as client:
+        client.createTables()
+    submit = ImmudbConfirmer.submitPreparedLogs
+
+    def failSecondChunk(self, prepared):
+        if(prepared.params["log0"] == "log512"):
+            raise RuntimeError("chunk rejected")
+        return submit(self, prepared)
+
+    monkeypatch.setattr(ImmudbConfirmer, "submitPreparedLogs", failSecondChunk)
+    logs = [f"log{index}" for index in range(0, 1200)]
+    identifiers, failedChunks = pool.processLogsRequest(AddLogsRequest(logs = logs, tags = ["x"]))
+    assert len(identifiers) == 1200
+    assert identifiers[512:1024] == [FAILED_IDENTIFIER] * 512
+    assert FAILED_IDENTIFIER not in identifiers[:512] + identifiers[1024:]
+    assert len(failedChunks) == 1
+    assert failedChunks[0].start == 512 and failedChunks[0].end == 1024
+    assert "chunk rejected" in failedChunks[0].error
+    with pool.session() as client:
+        assert client.getLogCount() == 1200 - 512
+
+def test_pool_batch_digested_on_workers(immudb_service: ImmudbConfirmer):
+    identifier, sha = digestLogs(["x"])[0]
+    assert uuid.UUID(identifier[0:36]).version == 4 and str(uuid.UUID(identifier[0:36])) == identifier[0:36]
+    assert sha == ImmudbConfirmer.makeSha256(b"x") and identifier[36:] == ImmudbConfirmer.makeStrSha256(b"x")[0:10]
+
+    pool = ImmudbConfirmerPool(immudb_service.url, "immudb", "immudb", "/certs/public_signing_key.pem", 2, preprocessWorkers = 2, preprocessMinLogs = 10)
+    try:
+        with pool.session() as client:
+            client.createTables()
+        logs = [f"log {index}" for index in range(0, 1500)]
+        identifiers, failedChunks = pool.processLogsRequest(AddLogsRequest(logs = logs, tags = ["a"]))
+        assert failedChunks == [] and len(set(identifiers)) == 1500
+        assert pool.digester.executor is not None
+        with pool.session() as client:
+            assert client.verifyBatch([(identifiers[index], client.makeStrSha256(logs[index].encode("utf-8"))) for index in range(0, 1500, 7)]) == [True] * len(range(0, 1500, 7))
+            assert [log.log for log in client.getLastLogs(2)] == ["log 1499", "log 1498"]
+    finally:
+        pool.digester.close()
@@ -0,0 +1,115 @@
+import time
+import pytest
+
+from immulogger.database import searchindex
+from immulogger.database.pool import ImmudbConfirmerPool
+from immulogger.database.searchindex import InvalidSearchQuery, SearchIndex, SearchQuery
+from immulogger.routers.models.logmodel import AddLogsRequest
+from .. import immudb_service, docker_services_each, ImmudbConfirmer
+
+
+def test_search_query_parse():
+    query = SearchQuery.parse('error "Connection refused" req-42')
+    assert query.phrases == [["error"], ["connection", "refused"], ["req", "42"]]
+    assert sorted(query.tokens()) == ["42", "connection", "error", "refused", "req"]
+    assert query.matches("ERROR: connection refused for req-42") == True
+    assert query.matches("error: refused connection for req-42") == False
+    with pytest.raises(InvalidSearchQuery):
+        SearchQuery.parse('"unterminated')
+    with pytest.raises(InvalidSearchQuery):
+        SearchQuery.parse("-- !!")
+
+def test_search_logs(immudb_service: ImmudbConfirmer):
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        identifiers = dbClient.processLogsRequest(AddLogsRequest(logs = [f"request req-{index} failed: connection refused" if index % 3 == 0 else f"request req-{index} ok" for index in range(0, 30)], tags = ["api"]))
+        assert len(dbClient.searchIndex) == 0
+
+        # Not indexed yet, the rows are scanned
+        logs, lastId = dbClient.searchLogsPage(SearchQuery.parse("req-7"), 10, True)
+        assert [log.log for log in logs] == ["request req-7 ok"]
+        assert len(dbClient.searchIndex) == 0
+        assert dbClient.searchIndex.catchUp(dbClient) == 30
+        assert len(dbClient.searchIndex) == 30
+
+        logs, lastId = dbClient.searchLogsPage(SearchQuery.parse("req-7"), 10, True)
+        assert [log.log for log in logs] == ["request req-7 ok"]
+        assert logs[0].verified == True
+        assert logs[0].tags == ["api"]
+        assert logs[0].uniqueidentifier == identifiers[7]
+        assert dbClient.verifyLogContent(logs[0].log, logs[0].uniqueidentifier) == True
+
+        # Newest first, paged with the returned id
+        logs, lastId = dbClient.searchLogsPage(SearchQuery.parse('"connection refused"'), 4)
+        assert [log.log for log in logs] == [f"request req-{index} failed: connection refused" for index in [27, 24, 21, 18]]
+        logs, lastId = dbClient.searchLogsPage(SearchQuery.parse('"connection refused"'), 10, False, lastId)
+        assert len(logs) == 6
+        assert lastId == 0
+        logs, lastId = dbClient.searchLogsPage(SearchQuery.parse('"refused connection"'), 10)
+        assert logs == []
+
+        # Logs committed after the last catch-up are scanned, then merged with the indexed ones
+        dbClient.processLogsRequest(AddLogsRequest(logs = ["late connection refused"]))
+        logs, lastId = dbClient.searchLogsPage(SearchQuery.parse("refused late"), 10)
+        assert [log.log for log in logs] == ["late connection refused"]
+        logs, lastId = dbClient.searchLogsPage(SearchQuery.parse("refused"), 2)
+        assert [log.log for log in logs] == ["late connection refused", "request req-27 failed: connection refused"]
+        logs, lastId = dbClient.searchLogsPage(SearchQuery.parse("refused"), 10, False, lastId)
+        assert len(logs) == 9
+        assert dbClient.searchIndex.catchUp(dbClient) == 1
+        assert len(dbClient.searchIndex) == 31
+
+def test_search_index_dropped_past_max_postings(immudb_service: ImmudbConfirmer):
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        dbClient.searchIndex = SearchIndex(maxPostings = 20)
+        dbClient.processLogsRequest(AddLogsRequest(logs = [f"request {index} ok" for index in range(0, 10)]))
+        dbClient.searchIndex.catchUp(dbClient)
+        assert dbClient.searchIndex.dropped == True
+        assert len(dbClient.searchIndex.postings) == 0
+        assert dbClient.searchIndex.catchUp(dbClient) == 0
+        logs, lastId = dbClient.searchLogsPage(SearchQuery.parse("request ok"), 3)
+        assert [log.log for log in logs] == [f"request {index} ok" for index in [9, 8, 7]]
+        logs, lastId = dbClient.searchLogsPage(SearchQuery.parse("request ok"), 10, False, lastId)
+        assert len(logs) == 7
+        assert lastId == 0
+
+def test_search_index_skips_undecodable_logs(immudb_service: ImmudbConfirmer, monkeypatch):
+    with immudb_service as dbClient:
+        dbClient.createTables()
+        dbClient.processLogsRequest(AddLogsRequest(logs = ["first ok", "broken ok", "last ok"]))
+        decodeLog = searchindex.decodeLog
+        def failing(stored: str) -> str:
+            if(stored.startswith("broken")):
+                raise ValueError("undecodable")
+            return decodeLog(stored)
+        monkeypatch.setattr(searchindex, "decodeLog", failing)
+        assert dbClient.searchIndex.catchUp(dbClient) == 3
+        assert dbClient.searchIndex.skippedLogs == 1
+        assert dbClient.searchIndex.lastIndexedId == 3
+        logs, _ = dbClient.searchLogsPage(SearchQuery.parse("ok"), 10)
+        assert [log.log for log in logs] == ["last ok", "first ok"]
+
+def test_search_index_built_in_background(immudb_service: ImmudbConfirmer):
+    pool = ImmudbConfirmerPool(immudb_service.url, "immudb", "immudb", immudb_service.keyPath, 1, searchIndexRefreshInterval = 3600)
+    with pool.session() as dbClient:
+        dbClient.createTables()
+        dbClient.processLogsRequest(AddLogsRequest(logs = [f"request {index} ok" for index in range(0, 5)]))
+    pool.searchIndex.start(pool)
+    try:
+        waitFor(lambda: len(pool.searchIndex) == 5)
+        # Commits wake it, without waiting for the refresh interval
+        with pool.session() as dbClient:
+            dbClient.processLogsRequest(AddLogsRequest(logs = ["request late ok"]))
+        waitFor(lambda: len(pool.searchIndex) == 6)
+        # The build gives its session back after every page
+        assert pool.available() == 1
+    finally:
+        pool.searchIndex.stop()
+    assert pool.searchIndex.thread is None
+
+def waitFor(condition, timeout: float = 5):
+    deadline = time.time() + timeout
+    while(not condition()):
+        assert time.time() < deadline
+        time.sleep(0.01)
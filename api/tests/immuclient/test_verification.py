@@ -1,8 +1,10 @@
 import pydantic
 import pytest
+from prometheus_client import REGISTRY
 
+from immulogger.database import merkle
 from immulogger.routers.models.logmodel import AddLogRequest, AddLogsRequest
-from .. import immudb_service, docker_services_each, ImmudbConfirmer
+from .. import immudb_service, docker_services_each, ImmudbConfirmer, TEST_BACKEND
 
 def test_get_verified_bytes(immudb_service: ImmudbConfirmer):
     with immudb_service as client:
@@ -33,4 +35,97 @@ def test_get_verified_string(immudb_service: ImmudbConfirmer):
 
         assert client.verifyLogSha(shaFromString, identifier) == True
         assert client.verifyLogSha("x", identifier) == False
-        assert client.verifyLogSha(shaFromString, "X") == False
\ No newline at end of file
+        assert client.verifyLogSha(shaFromString, "X") == False
+
+def test_verified_cache(immudb_service: ImmudbConfirmer):
+    with immudb_service as client:
+        immudb_service.createTables()
+        shaFromString = immudb_service.makeStrSha256("1".encode("utf-8"))
+        identifier = client.processLogRequest(AddLogRequest(tags = ["x"], logContent="1"))
+        assert client.verifyLogContent("1", identifier) == True
+        assert client.verifiedCache.misses == 1 and client.verifiedCache.hits == 0
+
+        assert client.verifyLogContent("1", identifier) == True
+        assert client.verifyLogContent("x", identifier) == False
+        assert client.verifyLogSha(shaFromString, identifier) == True
+        assert client.verifyBatch([(identifier, shaFromString), (identifier, "x")]) == [True, False]
+        assert client.verifiedCache.hits == 4
+        assert client.verifiedCache.misses == 1
+        # Exported on /metrics next to the other counters
+        assert REGISTRY.get_sample_value("immulogger_cache_lookups_total", {"cache": "verified", "result": "hit"}) >= 4
+
+        # Not existing identifiers are never cached
+        assert client.verifyLogContent("1", "X") == False
+        assert client.verifyLogContent("1", "X") == False
+        assert len(client.verifiedCache) == 1
+
+def test_verified_cache_shared_by_sessions(immudb_service: ImmudbConfirmer):
+    other = ImmudbConfirmer(immudb_service.url, "immudb", "immudb", "/certs/public_signing_key.pem", immudb_service.verifiedCache)
+    with other as otherClient:
+        # Logged in before the logs exist, so its trusted state is behind their TX
+        pass
+    with immudb_service as client:
+        immudb_service.createTables()
+        identifiers = client.processLogsRequest(AddLogsRequest(tags = ["x"], logs = ["1", "2"]))
+        assert client.verifyLogContent("1", identifiers[0]) == True
+    with other as otherClient:
+        assert otherClient.rootService.get().txId < client.rootService.get().txId
+        assert otherClient.verifyLogContent("1", identifiers[0]) == True
+        assert otherClient.verifyLogContent("x", identifiers[0]) == False
+        assert otherClient.verifyLogContent("2", identifiers[1]) == True
+        assert otherClient.verifiedCache.hits == 2
+
+def test_merkle_paths():
+    for size in [1, 2, 3, 5, 8, 13]:
+        shas = [ImmudbConfirmer.makeSha256(str(index).encode("utf-8")) for index in range(0, size)]
+        root = merkle.merkleRoot(shas)
+        for index in range(0, size):
+            path = merkle.inclusionPath(shas, index)
+            assert merkle.rootFromPath(shas[index], index, size, path) == root
+            assert merkle.rootFromPath(shas[(index + 1) % size], index, size, path) != root or size == 1
+            assert merkle.rootFromPath(shas[index], index, size, path + [root]) is None
+        assert merkle.rootFromPath(shas[0], size, size, []) is None
+    assert merkle.parseMerkleIdentifier(merkle.merkleIdentifier("a" * 32, 1023, "b" * 64)) == ("a" * 32, 1023)
+    assert merkle.parseMerkleIdentifier(ImmudbConfirmer.generateIdentifier("x")) is None
+
+def test_merkle_confirmations(immudb_service: ImmudbConfirmer, monkeypatch):
+    monkeypatch.setattr(merkle, "confirmationMode", "merkle")
+    with immudb_service as client:
+        client.createTables()
+        identifiers = client.processLogsRequest(AddLogsRequest(logs = [f"log {index}" for index in range(0, 100)]))
+        assert all(merkle.parseMerkleIdentifier(identifier) is not None for identifier in identifiers)
+
+        assert client.verifyLogContent("log 7", identifiers[7]) == True
+        assert client.verifyLogContent("log 8", identifiers[7]) == False
+        assert client.verifyLogSha(client.makeStrSha256(b"log 99"), identifiers[99]) == True
+        result = client.getLastLogs(50, True)
+        assert all(log.verified for log in result)
+        assert client.verifyBatch([(identifiers[0], client.makeStrSha256(b"log 0")), (identifiers[1], client.makeStrSha256(b"log 0"))]) == [True, False]
+        # Proven trees are cached
+        assert len(client.verifiedCache) >= 100
+
+        # Entry confirmations keep working next to merkle ones
+        monkeypatch.setattr(merkle, "confirmationMode", "entry")
+        identifier = client.processLogRequest(AddLogRequest(logContent = "entry"))
+        assert client.verifyLogContent("entry", identifier) == True
+        assert client.verifyBatch([(identifier, client.makeStrSha256(b"entry")), (identifiers[5], client.makeStrSha256(b"log 6"))]) == [True, False]
+
+@pytest.mark.skipif(TEST_BACKEND != "memory", reason = "edits the in-memory KV store directly")
+def test_merkle_tampered_leaves(immudb_service: ImmudbConfirmer, monkeypatch):
+    monkeypatch.setattr(merkle, "confirmationMode", "merkle")
+    with immudb_service as client:
+        client.createTables()
+        storage = client.client.storage
+        keysBefore = len(storage.kv)
+        identifiers = client.processLogsRequest(AddLogsRequest(logs = [f"log {index}" for index in range(0, 100)]))
+        # One root and one leaves entry for the TX instead of 100 confirmations
+        assert len(storage.kv) == keysBefore + 2
+
+        # Tampered leaves no longer give the verified root
+        batchId, _ = merkle.parseMerkleIdentifier(identifiers[0])
+        leavesKey = merkle.leavesKey(batchId).encode("utf-8")
+        leaves = storage.kv[leavesKey][-1][1]
+        storage.kv[leavesKey].append((storage.kv[leavesKey][-1][0], client.makeSha256(b"forged") + leaves[32:]))
+        assert client.verifyLogContent("forged", identifiers[0]) == False
+        assert client.verifyLogContent("log 1", identifiers[1]) == False
+        assert client.verifyBatch([(identifiers[0], client.makeStrSha256(b"forged")), (identifiers[5], client.makeStrSha256(b"log 5"))]) == [False, False]